@@ -1,14 +1,39 @@
-from flask import Flask, render_template, request, session, jsonify, render_template_string
+from flask import Flask, render_template, request, session, jsonify, render_template_string, url_for, redirect
+from werkzeug.datastructures import MultiDict
 from flask_session import Session
 import os
-from models import db, SleeperPlayer, UserSearch, PlayerLeagueAssociation
-import requests
+import click
+from models import db, SleeperPlayer, UserSearch, PlayerLeagueAssociation, write_with_retry
+import migrations
 import logging
+import sleeper_client
+import sleeper_cache
+import rate_limiter
+import fanout
+import player_catalog
+import player_ingest
+import availability
+import bulk_exposure
+import player_search
+import roster_fingerprints
+import exposure
+import shared_leagues
+import streaming
+import jobs
+import league_directory
+import result_store
+import roster_sync
+import metrics
+import http_cache
+import profiling
+import paging
 from config import Config
 from datetime import datetime, timedelta
 
 app = Flask(__name__)
 app.config.from_object(Config)
+logging.basicConfig(level=app.config['LOG_LEVEL'],
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 app.config.update(SESSION_COOKIE_SAMESITE='None', SESSION_COOKIE_SECURE=True)
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
 app.config['SESSION_PERMANENT'] = False
@@ -16,16 +41,32 @@ app.secret_key = 'your_secret_key'
 
 # 🔐 Use server-side session storage
 app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_FILE_DIR'] = os.path.join(
-    app.root_path, 'flask_session')  # Optional but good
+app.config['SESSION_FILE_DIR'] = os.environ.get(
+    'SESSION_FILE_DIR', os.path.join(app.root_path,
+                                     'flask_session'))  # Optional but good
 app.config['SESSION_PERMANENT'] = False  # or True if you want long sessions
 app.config['SESSION_COOKIE_NAME'] = 'session'
 Session(app)
 
 db.init_app(app)
+sleeper_client.init_app(app)
+rate_limiter.init_app(app)
+sleeper_cache.init_app(app)
+fanout.init_app(app)
+player_catalog.init_app(app)
+roster_sync.init_app(app)
+league_directory.init_app(app)
+roster_fingerprints.init_app(app)
+jobs.init_app(app)
+result_store.init_app(app)
+metrics.init_app(app)
+# After metrics, so a profile can still read the request's phase timings.
+profiling.init_app(app)
+http_cache.init_app(app)
 
 with app.app_context():
     db.create_all()
+    migrations.upgrade(db.engine)
 
 
 @app.route('/')
@@ -33,59 +74,50 @@ def home():
     return render_template('home.html')
 
 
-logging.basicConfig(level=logging.DEBUG)
+class SearchError(Exception):
+    """A user-facing problem with a search; ``page`` renders error.html."""
 
+    def __init__(self, message, page=False):
+        super().__init__(message)
+        self.page = page
 
-@app.route('/search_username', methods=['POST'])
-def search_username():
-    username = request.form['username'].strip()
-    if not username:
-        return "⚠️ No username entered."
+    def response(self):
+        if self.page:
+            return render_template('error.html', message=str(self))
+        return str(self)
 
-    user_api_url = f"https://api.sleeper.app/v1/user/{username}"
-    user_api_response = requests.get(user_api_url)
 
-    if user_api_response.status_code != 200:
-        return f"⚠️ Error fetching user data (status: {user_api_response.status_code})"
+SLEEPER_BUSY_MESSAGE = (
+    "⚠️ Sleeper is limiting how fast we can look things up right now. "
+    "Please try again in a minute.")
 
-    try:
-        user_data = user_api_response.json()
-    except Exception:
-        return f"⚠️ Invalid response received from Sleeper for '{username}'."
 
-    if not isinstance(user_data, dict) or 'user_id' not in user_data:
-        return render_template(
-            'error.html',
-            message=
-            f"⚠️ Could not find user '{username}'. Please check spelling.")
+class SleeperBusyError(Exception):
+    """Sleeper kept answering 429 even after the client's retries."""
 
-    user_id = user_data['user_id']
-    session['username'] = username
-    # Save or update user in UserSearch
-    user_search = UserSearch.query.filter_by(username=username).first()
-    if user_search:
-        user_search.user_id = user_id
-    else:
-        user_search = UserSearch(username=username, user_id=user_id)
-        db.session.add(user_search)
-    db.session.commit()
+    def __init__(self):
+        super().__init__(SLEEPER_BUSY_MESSAGE)
 
-    year = datetime.now().year
 
-    leagues_api_url = f"https://api.sleeper.app/v1/user/{user_id}/leagues/nfl/{year}"
-    leagues_api_response = requests.get(leagues_api_url)
+def get_filter_label(form):
+    if form.get('only_bestball') == "1":
+        return "Only Best Ball Leagues"
+    if form.get('exclude_bestball') == "1":
+        return "Excluding Best Ball Leagues"
+    return "All Leagues"
+
 
-    if leagues_api_response.status_code != 200:
-        logging.error(
-            f"Error fetching leagues data: {leagues_api_response.status_code}")
-        return f"Error fetching leagues data: {leagues_api_response.status_code}"
+def filter_leagues(year_leagues, form):
+    """In-season leagues matching the form's best ball filter.
 
-    year_leagues = leagues_api_response.json()
-    only_bestball = request.form.get('only_bestball') == "1"
-    exclude_bestball = request.form.get('exclude_bestball') == "1"
+    Returns a list of {'name', 'id'} dicts; raises SearchError if both
+    best ball options were picked.
+    """
+    only_bestball = form.get('only_bestball') == "1"
+    exclude_bestball = form.get('exclude_bestball') == "1"
 
     if only_bestball and exclude_bestball:
-        return "⚠️ Please select only one best ball filter option."
+        raise SearchError("⚠️ Please select only one best ball filter option.")
 
     leagues_data = []
     for league in year_leagues:
@@ -93,7 +125,6 @@ def search_username():
             continue
 
         is_best_ball = league.get('settings', {}).get('best_ball', False)
-        #print(f"✅ {league['name']} | best_ball: {is_best_ball}")
 
         if only_bestball and not is_best_ball:
             continue
@@ -104,130 +135,218 @@ def search_username():
             'name': league['name'],
             'id': league['league_id']
         })
-    session[f'{username}_league_ids'] = [
-        league['id'] for league in leagues_data
-    ]
-    session[f'{username}_league_names'] = [
-        league['name'] for league in leagues_data
-    ]
+    return leagues_data
 
-    # Clear previous league associations for the user
-    PlayerLeagueAssociation.query.filter_by(user_id=user_id).delete()
-    db.session.commit()
 
-    player_ids = []
-    associations = []
-    for league in leagues_data:
-        league_api_url = f"https://api.sleeper.app/v1/league/{league['id']}/rosters"
-        league_api_response = requests.get(league_api_url)
+def prepare_username_search(form):
+    """Resolve the user and their filtered in-season leagues.
 
-        if league_api_response.status_code != 200:
-            logging.warning(
-                f"Error fetching roster data for league {league['id']}: {league_api_response.status_code}"
-            )
-            continue
+    Records the user in UserSearch and the league list in the session, and
+    returns (username, user_id, leagues_data, filter_label). Raises
+    SearchError for anything the user needs to be told about.
+    """
+    username = form['username'].strip()
+    if not username:
+        raise SearchError("⚠️ No username entered.")
 
-        roster_data = league_api_response.json()
-        user_roster = next(
-            (roster
-             for roster in roster_data if roster['owner_id'] == user_id), None)
-
-        if user_roster and user_roster.get('players'):
-            for player_id in user_roster['players']:
-                player_ids.append(player_id)
-                associations.append(
-                    PlayerLeagueAssociation(user_id=user_id,
-                                            league_id=league['id'],
-                                            player_id=player_id))
-        else:
-            logging.warning(
-                f"No valid roster data found for user_id {user_id} in league {league['id']}"
-            )
+    user_api_response = sleeper_client.get(f"/user/{username}")
 
-    db.session.bulk_save_objects(associations)
-    db.session.commit()
+    if user_api_response.status_code == 429:
+        raise SearchError(SLEEPER_BUSY_MESSAGE)
+    if user_api_response.status_code != 200:
+        raise SearchError(
+            f"⚠️ Error fetching user data (status: {user_api_response.status_code})")
 
-    # DEBUG: check database player IDs
-    #print("🧠 First 5 player IDs in DB:", [p.id for p in SleeperPlayer.query.limit(5)])
+    try:
+        user_data = user_api_response.json()
+    except Exception:
+        raise SearchError(
+            f"⚠️ Invalid response received from Sleeper for '{username}'.")
 
-    player_map = {
-        player.id: {
-            'name': player.name,
-            'position': player.position
-        }
-        for player in SleeperPlayer.query.all()
-    }
+    if not isinstance(user_data, dict) or 'user_id' not in user_data:
+        raise SearchError(
+            f"⚠️ Could not find user '{username}'. Please check spelling.",
+            page=True)
 
-    player_leagues_count = {
-        player_id: player_ids.count(player_id)
-        for player_id in set(player_ids)
-    }
-    # Map each player to the leagues they're in
-    player_league_names = {}
-    league_id_to_name = {
-        league['id']: league['name']
-        for league in leagues_data
-    }
+    user_id = user_data['user_id']
+    session['username'] = username
 
-    for assoc in associations:
-        name = league_id_to_name.get(assoc.league_id, 'Unknown League')
-        player_league_names.setdefault(assoc.player_id, []).append(name)
+    def record_user():
+        # Save or update user in UserSearch
+        UserSearch.upsert(username, user_id)
+        db.session.commit()
+
+    write_with_retry(record_user)
+
+    year_leagues = league_directory.user_leagues(user_id, datetime.now().year)
+    if year_leagues is None:
+        raise SearchError(
+            "⚠️ Error fetching leagues data from Sleeper. Please try again.")
+
+    leagues_data = filter_leagues(year_leagues, form)
+    # Results now live in the result store; drop the copies older versions
+    # of the app kept in the session.
+    for key in ('league_ids', 'league_names', 'cached_players'):
+        session.pop(f'{username}_{key}', None)
+
+    return username, user_id, leagues_data, get_filter_label(form)
+
+
+def save_exposure(user_id, filter_label, result):
+    """Store a freshly built exposure result under its roster version.
+
+    Returns the version, or None if a league has no fingerprint; the
+    result is then stored under its own content, so the page's row API
+    can still serve it.
+    """
+    version = roster_fingerprints.roster_version(
+        user_id, [league['id'] for league in result.leagues],
+        require_fresh=False)
+    compact = result.to_compact()
+    result_store.put(user_id, filter_label,
+                     version or result_store.content_version(compact),
+                     compact)
+    return version
+
+
+def build_exposure(user_id, leagues_data, filter_label):
+    """(ExposureResult, roster version) for a user's filtered leagues."""
+    league_ids = [league['id'] for league in leagues_data]
+    # Another worker may already have built this exact result.
+    version = roster_fingerprints.roster_version(user_id, league_ids)
+    stored = version and result_store.get(user_id, filter_label, version)
+    if stored:
+        return exposure.ExposureResult.from_compact(stored), version
+    # Refetch only leagues whose roster fingerprint is stale and apply
+    # just the changed (league, player) pairs and counts.
+    players_by_league, player_leagues_count = (
+        roster_fingerprints.refresh_user_rosters(user_id, league_ids))
+    result = exposure.compute_exposure(leagues_data, players_by_league,
+                                       player_leagues_count)
+    return result, save_exposure(user_id, filter_label, result)
+
+
+def exposure_rows_url(username, filter_label):
+    """URL of the paged player rows for a search, as result.html loads them."""
+    params = {}
+    if filter_label == "Only Best Ball Leagues":
+        params['only_bestball'] = '1'
+    elif filter_label == "Excluding Best Ball Leagues":
+        params['exclude_bestball'] = '1'
+    return url_for('exposure_players_api', username=username, **params)
+
+
+def load_exposure(username):
+    """The ExposureResult the session's last search points at, or None."""
+    stored = result_store.latest(session.get(f'{username}_result'))
+    return exposure.ExposureResult.from_compact(stored) if stored else None
 
-    sorted_player_ids = sorted(player_leagues_count,
-                               key=player_leagues_count.get,
-                               reverse=True)
 
-    players = []
-    for player_id in sorted_player_ids:
-        #print(f"🔎 Looking for player_id: {player_id}")
-        player_info = player_map.get(str(player_id), {
-            'name': 'Unknown Player',
-            'position': 'Unknown Position'
-        })
-        league_count = player_leagues_count[player_id]
-        percentage = (league_count / len(leagues_data)) * 100
-        players.append({
-            'name': player_info['name'],
-            'position': player_info['position'],
-            'percentage': f"{percentage:.2f}%",
-            'leagues': player_league_names.get(player_id, [])
-        })
+@app.route('/search_username', methods=['POST'])
+def search_username():
+    if request.form.get('stream') == '1':
+        # Render the page shell; it loads results from the stream route.
+        params = {
+            key: request.form[key]
+            for key in ('username', 'only_bestball', 'exclude_bestball')
+            if request.form.get(key)
+        }
+        username = request.form['username'].strip()
+        filter_label = get_filter_label(request.form)
+        # Once the stream has built the result, rows load from the API.
+        return render_template(
+            'result.html',
+            username=username,
+            players=[],
+            all_leagues=[],
+            searched_player=None,
+            filter_label=filter_label,
+            stream_url=url_for('search_username_stream', **params),
+            rows_url=exposure_rows_url(username, filter_label))
+
+    try:
+        username, user_id, leagues_data, filter_label = (
+            prepare_username_search(request.form))
+    except SearchError as e:
+        return e.response()
 
-    filter_label = "All Leagues"
-    if only_bestball:
-        filter_label = "Only Best Ball Leagues"
-    elif exclude_bestball:
-        filter_label = "Excluding Best Ball Leagues"
+    result, _ = build_exposure(user_id, leagues_data, filter_label)
 
-    # Store players and filter label in session for later use
-    session[f'{username}_cached_players'] = players
+    # The session only keeps a reference to the stored result.
+    session[f'{username}_result'] = result_store.scope(user_id, filter_label)
     session[f'{username}_filter_label'] = filter_label
 
+    # Player rows load from the JSON API a page at a time.
     return render_template(
         'result.html',
         username=username,
-        players=players,
-        all_leagues=[league['name'] for league in leagues_data],
+        players=[],
+        all_leagues=result.league_names,
         searched_player=None,
-        filter_label=filter_label)
+        filter_label=filter_label,
+        rows_url=exposure_rows_url(username, filter_label))
+
+
+@app.route('/search_username/stream', methods=['GET'])
+def search_username_stream():
+    try:
+        username, user_id, leagues_data, filter_label = (
+            prepare_username_search(request.args))
+    except SearchError as e:
+        return streaming.error_stream(str(e))
+
+    # The session is saved before the body streams, so only what is known
+    # up front can go in it. The result itself is stored once it's built.
+    session[f'{username}_result'] = result_store.scope(user_id, filter_label)
+    session[f'{username}_filter_label'] = filter_label
+    league_names = {league['id']: league['name'] for league in leagues_data}
+    refresh = roster_fingerprints.RosterRefresh(user_id, list(league_names))
+
+    def generate():
+        yield streaming.sse('start', {'total': len(leagues_data)})
+        catalog = player_catalog.get_catalog()
+        for done, (league_id, player_ids) in enumerate(refresh, start=1):
+            players = []
+            for player_id in player_ids:
+                player = catalog.get(player_id)
+                players.append({
+                    'id': player_id,
+                    'name': player['full_name'] if player else 'Unknown Player',
+                    'position': player['position'] if player else 'Unknown Position'
+                })
+            yield streaming.sse('league', {
+                'done': done,
+                'league': league_names[league_id],
+                'players': players
+            })
+
+        players_by_league, counts = refresh.result
+        result = exposure.compute_exposure(leagues_data, players_by_league,
+                                           counts)
+        save_exposure(user_id, filter_label, result)
+        # The rows themselves are paged from the stored result.
+        yield streaming.sse('result', {'leagues': result.league_names})
+
+    return streaming.event_stream(generate())
 
 
 @app.route('/search_player', methods=['POST'])
 def search_player():
     username = session.get('username', '').strip()
-    player_name = request.form['player_name'].strip()
+    player_id = request.form.get('player_id', '').strip()
+    player_name = request.form.get('player_name', '').strip()
     user = UserSearch.query.filter_by(username=username).first()
     if not user:
         return "User not found", 404
 
     user_id = user.user_id
-    filtered_ids = session.get(f'{username}_league_ids', [])
-    filtered_names = session.get(f'{username}_league_names', [])
-    league_map = {id: name for id, name in zip(filtered_ids, filtered_names)}
+    result = load_exposure(username)
+    leagues_searched = result.leagues if result else []
+    league_map = {league['id']: league['name'] for league in leagues_searched}
 
-    searched_player_obj = SleeperPlayer.query.filter(
-        SleeperPlayer.name.ilike(player_name)).first()
+    searched_player_obj = find_player(player_id, player_name)
     if searched_player_obj:
+        player_name = searched_player_obj.name
         player_id = searched_player_obj.id
         associations = PlayerLeagueAssociation.query.filter_by(
             user_id=user_id, player_id=player_id).all()
@@ -261,15 +380,24 @@ def search_player():
                                       player_name=player_name)
 
     # Fallback for regular full page load
-    players = session.get(f'{username}_cached_players', [])
     filter_label = session.get(f'{username}_filter_label', '')
     return render_template('result.html',
                            username=username,
-                           players=players,
+                           players=[],
                            searched_player=searched_player,
                            leagues=leagues,
-                           all_leagues=filtered_names,
-                           filter_label=filter_label)
+                           all_leagues=[league['name']
+                                        for league in leagues_searched],
+                           filter_label=filter_label,
+                           rows_url=exposure_rows_url(username, filter_label)
+                           if result else None)
+
+
+@app.route('/api/players/autocomplete', methods=['GET'])
+def player_autocomplete():
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int) or 10, 50)
+    return jsonify(player_search.search(query, limit))
 
 
 @app.route('/not_rostered_setup', methods=['POST'])
@@ -279,9 +407,10 @@ def not_rostered_setup():
     if not username:
         return "⚠️ No username entered."
 
-    user_api_url = f"https://api.sleeper.app/v1/user/{username}"
-    user_api_response = requests.get(user_api_url)
+    user_api_response = sleeper_client.get(f"/user/{username}")
 
+    if user_api_response.status_code == 429:
+        return SLEEPER_BUSY_MESSAGE
     if user_api_response.status_code != 200:
         return f"⚠️ Error fetching user data (status: {user_api_response.status_code})"
 
@@ -298,38 +427,31 @@ def not_rostered_setup():
 
     user_id = user_data['user_id']
     session['username'] = username
-    year = datetime.now().year
-
-    leagues_resp = requests.get(
-        f'https://api.sleeper.app/v1/user/{user_id}/leagues/nfl/{year}')
+    year_leagues = league_directory.user_leagues(user_id, datetime.now().year)
+    if year_leagues is None:
+        return render_template(
+            'error.html',
+            message="⚠️ Error fetching leagues data from Sleeper. Please try again.")
     leagues = [{
         'id': l['league_id'],
         'name': l['name']
-    } for l in leagues_resp.json() if l.get("status") not in ("none")]
+    } for l in year_leagues if l.get("status") != "none"]
 
     session[f'{username}_nr_league_ids'] = [l['id'] for l in leagues]
     session[f'{username}_nr_league_names'] = [l['name'] for l in leagues]
 
-    # Cache full player list only once per session
-    if not session.get('cached_all_players'):
-        try:
-            resp = requests.get("https://api.sleeper.app/v1/players/nfl")
-            if resp.status_code == 200:
-                session['cached_all_players'] = resp.json()
-            else:
-                session['cached_all_players'] = {}
-        except Exception as e:
-            print(f"Error fetching full player list: {e}")
-            session['cached_all_players'] = {}
+    # The player list lives in the process-wide catalog, not the session.
+    # Drop any copy an older version of the app left behind.
+    session.pop('cached_all_players', None)
+    player_catalog.get_catalog()
 
     return render_template('not_rostered.html', username=username)
 
 
-@app.route('/search_not_rostered', methods=['POST'])
-def search_not_rostered():
+def not_rostered_request(args):
+    """Return (username, player_names, leagues) for a not-rostered search."""
     username = session.get('username', '').strip()
-
-    player_name = request.form['player_name'].strip()
+    player_names = availability.parse_player_names(args.getlist('player_name'))
 
     # Use session-stored league IDs and names
     league_ids = session.get(f'{username}_nr_league_ids', [])
@@ -338,39 +460,59 @@ def search_not_rostered():
         'id': lid,
         'name': lname
     } for lid, lname in zip(league_ids, league_names)]
+    return username, player_names, leagues
 
-    not_rostered_results = []
-
-    for league in leagues:
-        league_id = league["id"]
-        league_name = league["name"]
 
-        rosters_resp = requests.get(
-            f'https://api.sleeper.app/v1/league/{league_id}/rosters')
-        rosters = rosters_resp.json()
-        found = False
+@app.route('/search_not_rostered', methods=['POST'])
+def search_not_rostered():
+    username, player_names, leagues = not_rostered_request(request.form)
+    player_name = ', '.join(player_names)
 
-        for roster in rosters:
-            player_ids = roster.get("players", [])
-            if not player_ids:
-                continue
-            for pid in player_ids:
-                player_data = get_player_info(pid)
-                if player_data and player_data.get(
-                        'full_name', '').lower() == player_name.lower():
-                    found = True
-                    break
-            if found:
-                break
-
-        if not found:
-            not_rostered_results.append(league_name)
+    if request.form.get('stream') == '1':
+        return render_template(
+            'not_rostered.html',
+            username=username,
+            player_name=player_name,
+            total_league_count=len(leagues),
+            stream_url=url_for('search_not_rostered_stream',
+                               player_name=player_names),
+            rows_url=url_for('not_rostered_api', player_name=player_names))
+
+    result = availability.find_available(leagues, player_names)
+    not_rostered_results = []
+    if len(result.players) == 1:
+        not_rostered_results = result.available_leagues(result.players[0])
 
     return render_template('not_rostered.html',
                            username=username,
                            player_name=player_name,
                            not_rostered_results=not_rostered_results,
-                           total_league_count=len(leagues))
+                           total_league_count=len(leagues),
+                           availability=result)
+
+
+@app.route('/search_not_rostered/stream', methods=['GET'])
+def search_not_rostered_stream():
+    username, player_names, leagues = not_rostered_request(request.args)
+    check = availability.AvailabilityCheck(leagues, player_names)
+
+    def generate():
+        yield streaming.sse('start', {
+            'total': len(leagues),
+            'players': check.result.players,
+            'unknown_players': check.result.unknown_players
+        })
+        for done, (league, row) in enumerate(check, start=1):
+            yield streaming.sse('league', {
+                'done': done,
+                'league': league['name'],
+                'available': row
+            })
+        # The page then pages the final rows from /api/not_rostered.
+        yield streaming.sse('result',
+                            {'failed_leagues': check.result.failed_leagues})
+
+    return streaming.event_stream(generate())
 
 
 @app.route('/username_compare', methods=['POST'])
@@ -391,9 +533,13 @@ def username_compare():
     if not years:
         years = [datetime.now().year]
 
-    def fetch_league_names(username):
+    async def fetch_league_names(engine, username):
         try:
-            resp = requests.get(f'https://api.sleeper.app/v1/user/{username}')
+            resp = await engine.call(sleeper_client.get,
+                                     f'/user/{username}',
+                                     priority=sleeper_client.INTERACTIVE)
+            if resp.status_code == 429:
+                raise SleeperBusyError()
             if resp.status_code != 200:
                 raise ValueError(f"⚠️ Could not find user '{username}'.")
             user_data = resp.json()
@@ -402,24 +548,32 @@ def username_compare():
                 raise ValueError(
                     f"⚠️ Invalid Sleeper response for '{username}'.")
 
+            # Seasons another page already looked up aren't fetched again.
+            year_results = await league_directory.fetch_user_seasons(
+                engine, user_id, years)
+
             league_names = set()
-            for year in years:
-                league_resp = requests.get(
-                    f'https://api.sleeper.app/v1/user/{user_id}/leagues/nfl/{year}'
-                )
-                if league_resp.status_code == 200:
-                    year_leagues = league_resp.json()
+            for year_leagues in year_results.values():
+                if isinstance(year_leagues, list):
                     league_names.update(league['name']
                                         for league in year_leagues)
             return list(league_names)
+        except SleeperBusyError:
+            raise
         except Exception:
             raise ValueError(
                 f"⚠️ An error occurred while fetching leagues for '{username}'. Please check the username and try again."
             )
 
+    async def fetch_both(engine):
+        # Both users (and all of their seasons) load at the same time.
+        return await engine.gather(fetch_league_names(engine, username1),
+                                   fetch_league_names(engine, username2))
+
     try:
-        leagues1 = fetch_league_names(username1)
-        leagues2 = fetch_league_names(username2)
+        leagues1, leagues2 = fanout.run(fetch_both)
+    except SleeperBusyError as e:
+        return render_template('error.html', message=str(e))
     except ValueError as e:
         return render_template('error.html', message=str(e))
 
@@ -434,69 +588,558 @@ def username_compare():
                            shared_leagues=shared)
 
 
+def prepare_league_compare(form):
+    """Return (members, years) for a league compare, or raise SearchError.
+
+    ``members`` is a list of (display_name, user_id) for the league's users.
+    """
+    members = get_league_members(form['league_id'].strip())
+
+    years = get_selected_years(form)
+    if not years:
+        years = [datetime.now().year]
+    return members, years
+
+
+def get_league_members(league_id):
+    """(display_name, user_id) for each user in a league, or SearchError."""
+    if not league_id:
+        raise SearchError("⚠️ Please enter a valid league ID.", page=True)
+
+    user_resp = sleeper_client.get(f'/league/{league_id}/users')
+    if user_resp.status_code == 429:
+        raise SearchError(SLEEPER_BUSY_MESSAGE, page=True)
+    if user_resp.status_code != 200:
+        raise SearchError("⚠️ Could not fetch users for that league ID.",
+                          page=True)
+
+    users = user_resp.json()
+    if not isinstance(users, list) or not users:
+        raise SearchError("⚠️ No users found for that league ID.", page=True)
+
+    return [(user.get('display_name', 'Unknown'), user.get('user_id'))
+            for user in users if user.get('user_id')]
+
+
+def compare_league_members(members, years, report_progress=None):
+    """Tally the leagues shared between ``members`` across ``years``.
+
+    Seasons already in the league directory are reused and the rest of
+    the users x years matrix is fetched at once; a failed call just leaves
+    that user's season out. Results are tallied in member/year
+    order so the output doesn't depend on which call finished first.
+    """
+    total = len(members) * len(years)
+    user_leagues = {}
+    results = league_directory.iter_user_leagues(
+        [user_id for _, user_id in members], years)
+    for done, (pair, year_leagues) in enumerate(results, start=1):
+        user_leagues[pair] = year_leagues
+        if report_progress:
+            report_progress(done=done, total=total)
+
+    tally = shared_leagues.SharedLeagueTally(name for name, _ in members)
+    for name, user_id in members:
+        for year in years:
+            year_leagues = user_leagues.get((user_id, year))
+            if isinstance(year_leagues, list):
+                tally.add(name, year, year_leagues)
+    return tally
+
+
+@jobs.handler('league_compare')
+def league_compare_job(params, report_progress):
+    with sleeper_client.priority(sleeper_client.BULK):
+        return _league_compare_job(params, report_progress)
+
+
+def _league_compare_job(params, report_progress):
+    form = MultiDict([('league_id', params['league_id'])] +
+                     [('years', str(year)) for year in params['years']])
+    members, years = prepare_league_compare(form)
+    tally = compare_league_members(members, years, report_progress)
+    return {'duplicates': tally.duplicates(), 'summary': tally.summary()}
+
+
+def submit_league_compare_job(form):
+    """Queue (or join) the league_compare job for a submitted form."""
+    league_id = form.get('league_id', '').strip()
+    if not league_id:
+        raise SearchError("⚠️ Please enter a valid league ID.", page=True)
+    years = sorted(set(get_selected_years(form))) or [datetime.now().year]
+    return jobs.submit('league_compare', {
+        'league_id': league_id,
+        'years': years
+    })
+
+
 @app.route('/league_compare', methods=['POST'])
 def league_compare():
-    league_id = request.form['league_id'].strip()
+    if request.form.get('background') == '1':
+        try:
+            job = submit_league_compare_job(request.form)
+        except SearchError as e:
+            return e.response()
+        return redirect(url_for('league_compare_result', job_id=job.id),
+                        code=303)
 
-    if not league_id:
-        return render_template('error.html',
-                               message="⚠️ Please enter a valid league ID.")
+    if request.form.get('stream') == '1':
+        return render_template('league_compare.html',
+                               duplicates={},
+                               summary=[],
+                               stream_url=url_for(
+                                   'league_compare_stream',
+                                   league_id=request.form['league_id'].strip(),
+                                   years=request.form.getlist('years')))
 
     try:
-        user_resp = requests.get(
-            f'https://api.sleeper.app/v1/league/{league_id}/users')
-        if user_resp.status_code != 200:
-            raise ValueError("⚠️ Could not fetch users for that league ID.")
-
-        users = user_resp.json()
-        if not isinstance(users, list) or not users:
-            raise ValueError("⚠️ No users found for that league ID.")
-
-        user_map = {}
-        league_to_users = {}
-        years = get_selected_years(request.form)
-        if not years:
-            years = [datetime.now().year]
-
-        for user in users:
-            name = user.get('display_name', 'Unknown')
-            user_id = user.get('user_id')
-            if not user_id:
-                continue
-            league_names = set()
-            for year in years:
-                resp = requests.get(
-                    f'https://api.sleeper.app/v1/user/{user_id}/leagues/nfl/{year}'
-                )
-                if resp.status_code != 200:
-                    continue
-                year_leagues = resp.json()
-                for league in year_leagues:
-                    label = f"{league['name']} ({year})"
-                    league_names.add(label)
-                    league_to_users.setdefault(label, set()).add(name)
-            user_map[name] = league_names
-
-        duplicates = {}
-        user_league_counts = {name: set() for name in user_map}
-
-        for league, shared_users in league_to_users.items():
-            if len(shared_users) > 1:
-                duplicates[league] = list(shared_users)
-                for name in shared_users:
-                    user_league_counts[name].add(league)
-
-        summary = sorted([(name, len(leagues))
-                          for name, leagues in user_league_counts.items()],
-                         key=lambda x: x[1],
-                         reverse=True)
+        members, years = prepare_league_compare(request.form)
+    except SearchError as e:
+        return e.response()
+
+    tally = compare_league_members(members, years)
+    return render_template('league_compare.html',
+                           duplicates=tally.duplicates(),
+                           summary=tally.summary())
+
 
+@app.route('/league_compare/result/<job_id>', methods=['GET'])
+def league_compare_result(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.kind != 'league_compare':
+        return render_template(
+            'error.html',
+            message="⚠️ That comparison has expired. Please run it again."), 404
+    if job.status == 'failed':
+        return render_template('error.html', message=job.error)
+    if job.status != 'done':
+        # The page polls the job and reloads itself once it finishes.
         return render_template('league_compare.html',
-                               duplicates=duplicates,
-                               summary=summary)
+                               duplicates={},
+                               summary=[],
+                               job_url=url_for('job_status', job_id=job.id))
+
+    # Shared leagues load from the JSON API a page at a time.
+    result = jobs.describe(job)['result']
+    return render_template('league_compare.html',
+                           duplicates={},
+                           summary=result['summary'],
+                           rows_url=url_for('league_compare_shared_api',
+                                            job_id=job.id))
 
-    except ValueError as e:
-        return render_template('error.html', message=str(e))
+
+@app.route('/jobs/league_compare', methods=['POST'])
+def league_compare_job_submit():
+    try:
+        job = submit_league_compare_job(request.form)
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(jobs.describe(job),
+                        status_url=url_for('job_status', job_id=job.id))), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(jobs.describe(job))
+
+
+@app.route('/league_compare/stream', methods=['GET'])
+def league_compare_stream():
+    try:
+        members, years = prepare_league_compare(request.args)
+    except SearchError as e:
+        return streaming.error_stream(str(e))
+
+    names = {user_id: name for name, user_id in members}
+    tally = shared_leagues.SharedLeagueTally(name for name, _ in members)
+
+    def generate():
+        yield streaming.sse('start', {'total': len(members) * len(years)})
+        results = league_directory.iter_user_leagues(list(names), years)
+        for done, ((user_id, year), year_leagues) in enumerate(results,
+                                                               start=1):
+            yield streaming.sse('progress', {'done': done})
+            if not isinstance(year_leagues, list):
+                continue
+            for label in tally.add(names[user_id], year, year_leagues):
+                yield streaming.sse('shared', {
+                    'league': label,
+                    'users': sorted(tally.users_sharing(label))
+                })
+        yield streaming.sse('result', {
+            'summary': tally.summary(),
+            'duplicates': tally.duplicates()
+        })
+
+    return streaming.event_stream(generate())
+
+
+def prepare_bulk_exposure(args):
+    """Resolve a bulk exposure request to the users and their leagues.
+
+    ``args`` names either a ``league_id`` (all of its managers) or one or
+    more ``usernames`` (repeated and/or comma-separated). Returns
+    (members, leagues_by_user, not_found, filter_label) where members is a
+    list of (name, user_id). Raises SearchError for bad requests.
+    """
+    league_id = (args.get('league_id') or '').strip()
+    usernames = []
+    for value in args.getlist('usernames'):
+        for name in value.split(','):
+            name = name.strip()
+            if name and name not in usernames:
+                usernames.append(name)
+
+    not_found = []
+    if league_id:
+        members = get_league_members(league_id)
+    elif usernames:
+        if len(usernames) > app.config['BULK_EXPOSURE_MAX_USERS']:
+            raise SearchError(
+                f"⚠️ At most {app.config['BULK_EXPOSURE_MAX_USERS']} "
+                "usernames per request.")
+        found = dict(
+            fanout.iter_map(sleeper_client.get_json,
+                            [(f'/user/{name}', ) for name in usernames]))
+        members = []
+        for name in usernames:
+            user_data = found.get((f'/user/{name}', ))
+            if isinstance(user_data, dict) and user_data.get('user_id'):
+                members.append((name, user_data['user_id']))
+            else:
+                not_found.append(name)
+    else:
+        raise SearchError("⚠️ Enter a league ID or at least one username.")
+
+    filter_label = get_filter_label(args)
+    year = datetime.now().year
+    seasons = league_directory.fetch_user_leagues(
+        [user_id for _, user_id in members], [year])
+    leagues_by_user = {}
+    for name, user_id in members:
+        year_leagues = seasons.get((user_id, year))
+        if not isinstance(year_leagues, list):
+            not_found.append(name)
+            continue
+        leagues_by_user[user_id] = filter_leagues(year_leagues, args)
+    members = [(name, user_id) for name, user_id in members
+               if user_id in leagues_by_user]
+    return members, leagues_by_user, not_found, filter_label
+
+
+def user_exposure_dict(name, user_id, result):
+    return {
+        'username': name,
+        'user_id': user_id,
+        'league_count': len(result.leagues),
+        'players': result.player_dicts()
+    }
+
+
+def form_value(value):
+    """A JSON body value as the form field the filters expect.
+
+    Checkbox options compare against "1", so JSON booleans map to "1"/"".
+    """
+    if isinstance(value, bool):
+        return '1' if value else ''
+    if value is None:
+        return ''
+    return str(value)
+
+
+@app.route('/api/exposure', methods=['POST'])
+def bulk_exposure_api():
+    args = request.form
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if body is None:
+            body = {}
+        if not isinstance(body, dict):
+            return jsonify({'error': "⚠️ Send a JSON object."}), 400
+        usernames = body.get('usernames') or []
+        if isinstance(usernames, str):
+            usernames = [usernames]
+        args = MultiDict([(key, form_value(value))
+                          for key, value in body.items()
+                          if key != 'usernames'] +
+                         [('usernames', str(name)) for name in usernames])
+    try:
+        members, leagues_by_user, not_found, filter_label = (
+            prepare_bulk_exposure(args))
+    except SearchError as e:
+        return jsonify({'error': str(e)}), 400
+
+    bulk = bulk_exposure.compute_bulk_exposure(members, leagues_by_user)
+    return jsonify({
+        'filter_label': filter_label,
+        'users': [
+            user_exposure_dict(name, user_id, bulk.results[user_id])
+            for name, user_id in members
+        ],
+        'not_found': not_found,
+        'leagues_fetched': len(bulk.league_ids),
+        'failed_leagues': bulk.failed_leagues
+    })
+
+
+@app.route('/api/exposure/stream', methods=['GET'])
+def bulk_exposure_stream():
+    try:
+        members, leagues_by_user, not_found, filter_label = (
+            prepare_bulk_exposure(request.args))
+    except SearchError as e:
+        return streaming.error_stream(str(e))
+
+    bulk = bulk_exposure.BulkExposure(members, leagues_by_user)
+
+    def generate():
+        yield streaming.sse('start', {
+            'users': [name for name, _ in members],
+            'leagues': len(bulk.league_ids),
+            'not_found': not_found,
+            'filter_label': filter_label
+        })
+        done = 0
+        for league_id, finished in bulk:
+            if league_id is not None:
+                done += 1
+                yield streaming.sse('progress', {'done': done})
+            for name, user_id in finished:
+                yield streaming.sse(
+                    'user',
+                    user_exposure_dict(name, user_id, bulk.results[user_id]))
+        yield streaming.sse('result', {
+            'leagues_fetched': len(bulk.league_ids),
+            'failed_leagues': bulk.failed_leagues
+        })
+
+    return streaming.event_stream(generate())
+
+
+# ======================== Paged JSON results ========================
+EXPOSURE_SORTS = {
+    'exposure': lambda row: (-row['league_count'], row['name'], row['id']),
+    'name': lambda row: (row['name'], row['id']),
+    'position': lambda row: (row['position'], row['name'], row['id']),
+}
+
+NOT_ROSTERED_SORTS = {
+    'league': lambda row: (row['league'], row['league_id']),
+}
+
+SHARED_LEAGUE_SORTS = {
+    'shared': lambda row: (-len(row['users']), row['league']),
+    'league': lambda row: (row['league'], ),
+}
+
+
+def paged_rows(rows, sorts, default_sort):
+    """Sort and page ``rows`` per the request's sort/limit/cursor args.
+
+    Returns a dict with the page's ``rows``, ``total`` and ``next_cursor``.
+    Raises paging.PagingError for bad arguments.
+    """
+    key, descending = paging.parse_sort(request.args, sorts, default_sort)
+    page, next_cursor, total = paging.paginate(
+        rows, key, descending, request.args.get('cursor'),
+        paging.parse_limit(request.args))
+    return {'rows': page, 'total': total, 'next_cursor': next_cursor}
+
+
+def request_etag(kind, version):
+    """ETag for this request's page of a result at ``version``, or None."""
+    if not version:
+        return None
+    return http_cache.make_etag(kind, version,
+                                sorted(request.args.items(multi=True)))
+
+
+@app.route('/api/exposure/<username>/players', methods=['GET'])
+def exposure_players_api(username):
+    # Pages come from the result the search stored; reading them never
+    # calls Sleeper or writes anything. The stored result's key changes
+    # with every roster version, so it doubles as the ETag's version.
+    filter_label = get_filter_label(request.args)
+    scope_ref = session.get(f'{username}_result')
+    if session.get(f'{username}_filter_label') != filter_label:
+        scope_ref = None
+    key = result_store.latest_key(scope_ref)
+    if key is None:
+        return jsonify({'error': "⚠️ Search for this username first."}), 404
+
+    etag = request_etag('exposure', key)
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+
+    stored = result_store.load(key)
+    if stored is None:
+        return jsonify({'error': "⚠️ Search for this username first."}), 404
+    result = exposure.ExposureResult.from_compact(stored)
+
+    league_index = {}
+    for position, league in enumerate(result.leagues):
+        league_index.setdefault(league['name'], position)
+    positions = {
+        p.upper()
+        for p in paging.parse_list(request.args, 'position')
+    }
+    rows = [{
+        'id': player.id,
+        'name': player.name,
+        'position': player.position,
+        'league_count': player.league_count,
+        'percentage': round(player.percentage, 2),
+        'leagues': [league_index[name] for name in player.leagues]
+    } for player in result.players
+            if not positions or (player.position or '').upper() in positions]
+    try:
+        page = paged_rows(rows, EXPOSURE_SORTS, 'exposure')
+    except paging.PagingError as e:
+        return jsonify({'error': str(e)}), 400
+
+    payload = {
+        'username': username,
+        'filter_label': filter_label,
+        'league_count': len(result.leagues),
+        'players': page['rows'],
+        'total': page['total'],
+        'next_cursor': page['next_cursor'],
+    }
+    if not request.args.get('cursor'):
+        # Rows refer to leagues by index; the names are sent once.
+        payload['leagues'] = result.league_names
+        # The page's player search lists every player, not just the
+        # pages loaded so far, as [id, name, position] by exposure.
+        payload['all_players'] = [[player.id, player.name, player.position]
+                                  for player in result.players]
+    return http_cache.json_response(payload, etag)
+
+
+@app.route('/api/not_rostered', methods=['GET'])
+def not_rostered_api():
+    username, player_names, leagues = not_rostered_request(request.args)
+    if not leagues:
+        return jsonify({'error': "⚠️ Look up a username first."}), 400
+    if not player_names:
+        return jsonify({'error': "⚠️ Enter at least one player name."}), 400
+
+    result = availability.find_available(leagues, player_names)
+    etag = request_etag('not_rostered',
+                        roster_sync.version(result.matrix))
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+
+    only_available = request.args.get('available') == '1'
+    rows = [{
+        'league_id': league['id'],
+        'league': league['name'],
+        'available': result.matrix[league['id']]
+    } for league in result.leagues if league['id'] in result.matrix and (
+        not only_available or all(result.matrix[league['id']].values()))]
+    try:
+        page = paged_rows(rows, NOT_ROSTERED_SORTS, 'league')
+    except paging.PagingError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return http_cache.json_response({
+        'players': result.players,
+        'unknown_players': result.unknown_players,
+        'failed_leagues': result.failed_leagues,
+        'leagues': page['rows'],
+        'total': page['total'],
+        'next_cursor': page['next_cursor'],
+    }, etag)
+
+
+@app.route('/api/league_compare/<job_id>/shared', methods=['GET'])
+def league_compare_shared_api(job_id):
+    job = jobs.get(job_id)
+    if job is None or job.kind != 'league_compare':
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if job.status == 'failed':
+        return jsonify(jobs.describe(job)), 500
+    if job.status != 'done':
+        return jsonify(dict(jobs.describe(job),
+                            status_url=url_for('job_status',
+                                               job_id=job.id))), 202
+
+    # A finished job's result never changes.
+    etag = request_etag('league_compare', job.id)
+    cached = http_cache.not_modified(etag)
+    if cached:
+        return cached
+
+    result = jobs.describe(job)['result']
+    user = request.args.get('user', '').strip()
+    rows = [{
+        'league': league,
+        'users': users
+    } for league, users in result['duplicates'].items()
+            if not user or user in users]
+    try:
+        page = paged_rows(rows, SHARED_LEAGUE_SORTS, 'shared')
+    except paging.PagingError as e:
+        return jsonify({'error': str(e)}), 400
+
+    payload = {
+        'shared': page['rows'],
+        'total': page['total'],
+        'next_cursor': page['next_cursor'],
+    }
+    if not request.args.get('cursor'):
+        payload['summary'] = result['summary']
+    return http_cache.json_response(payload, etag)
+
+
+@app.route('/metrics', methods=['GET'])
+@profiling.exempt
+def metrics_endpoint():
+    if not metrics.enabled():
+        return "Metrics are disabled.", 404
+    return metrics.render(), 200, {
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'
+    }
+
+
+@app.route('/profiles', methods=['GET'])
+@profiling.exempt
+def profiles_list():
+    if not profiling.enabled():
+        return "Profiling is disabled.", 404
+    if not profiling.authorized():
+        return jsonify({'error': f'Send {profiling.HEADER}'}), 403
+    return jsonify({'profiles': [
+        dict(summary, url=url_for('profile_download', profile_id=summary['id']))
+        for summary in profiling.list_profiles()
+    ]})
+
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+@profiling.exempt
+def profile_download(profile_id):
+    """One stored profile as JSON, or ?format=folded for flame graphs."""
+    if not profiling.enabled():
+        return "Profiling is disabled.", 404
+    if not profiling.authorized():
+        return jsonify({'error': f'Send {profiling.HEADER}'}), 403
+    data = profiling.load(profile_id)
+    if data is None:
+        return jsonify({'error': 'Unknown or expired profile'}), 404
+    if request.args.get('format') == 'folded':
+        return profiling.folded(data), 200, {
+            'Content-Type': 'text/plain; charset=utf-8',
+            'Content-Disposition':
+            f'attachment; filename="{profile_id}.folded"'
+        }
+    return jsonify(data), 200, {
+        'Content-Disposition': f'attachment; filename="{profile_id}.json"'
+    }
 
 
 @app.route('/league_compare_page', methods=['GET'])
@@ -530,33 +1173,55 @@ def get_selected_years(form):
     ]
 
 
-def get_player_info(player_id):
-    username = session.get('username').strip()
-    if not username:
+def _catalog_player(record):
+    """An unsaved SleeperPlayer for a catalog record the table lacks yet."""
+    if record is None:
         return None
-
-    # Cached from user session
-    cached_players = session.get(f'{username}_cached_players', [])
-    for player in cached_players:
-        if player.get('id') == player_id or player.get('name') == player_id:
-            return {
-                'full_name': player['name'],
-                'position': player['position']
-            }
-
-    # Fallback only to cached_all_players (not API)
-    all_players = session.get('cached_all_players', {})
-    player_data = all_players.get(player_id)
-    if player_data:
-        return {
-            'full_name':
-            player_data.get('full_name')
-            or player_data.get('name', 'Unknown Player'),
-            'position':
-            player_data.get('position', 'Unknown')
-        }
-
-    return None
+    return SleeperPlayer(id=record['id'],
+                         name=record['full_name'],
+                         position=record['position'])
+
+
+def find_player(player_id, player_name):
+    """Resolve a searched player by Sleeper id, falling back to exact name.
+
+    Names go through the catalog's normalized-name index, so neither path
+    scans the SleeperPlayer table. Like ``exposure.lookup_players``, it
+    falls back to the catalog for players the table doesn't have yet.
+    """
+    if player_id:
+        player = (db.session.get(SleeperPlayer, player_id)
+                  or _catalog_player(player_catalog.get_player(player_id)))
+        if player:
+            return player
+        # Older result pages posted the player's name in this field.
+        player_name = player_name or player_id
+
+    if not player_name:
+        return None
+    ids = player_catalog.get_catalog().ids_for_name(player_name)
+    if not ids:
+        return None
+    player = SleeperPlayer.query.filter(SleeperPlayer.id.in_(ids)).first()
+    return player or _catalog_player(player_catalog.get_player(min(ids)))
+
+
+# ======================== CLI ========================
+@app.cli.command('ingest-players')
+@click.option('--file', 'path', type=click.Path(exists=True, dir_okay=False),
+              help='Read a saved /players/nfl dump instead of calling Sleeper.')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Records compared and written per transaction.')
+def ingest_players_command(path, batch_size):
+    """Sync the SleeperPlayer table with Sleeper's player dump.
+
+    Run nightly, e.g. ``flask --app app ingest-players``.
+    """
+    if path:
+        report = player_ingest.ingest_from_file(path, batch_size)
+    else:
+        report = player_ingest.ingest_from_sleeper(batch_size)
+    click.echo(f"Players: {report}")
 
 
 # ======================== App Runner ========================
@@ -0,0 +1,103 @@
+import re
+from dataclasses import dataclass, field
+
+import fanout
+import player_catalog
+import roster_bits
+import roster_sync
+
+
+@dataclass
+class AvailabilityResult:
+    """League x player availability for a set of leagues.
+
+    ``matrix`` maps league id -> {player name: True if available}. Leagues
+    whose rosters could not be fetched are listed in ``failed_leagues`` and
+    left out of the matrix. Names that match no known player are listed in
+    ``unknown_players``.
+    """
+    leagues: list
+    players: list
+    matrix: dict = field(default_factory=dict)
+    unknown_players: list = field(default_factory=list)
+    failed_leagues: list = field(default_factory=list)
+
+    def available_leagues(self, player_name):
+        """Names of the leagues where ``player_name`` is not rostered."""
+        return [
+            league['name'] for league in self.leagues
+            if self.matrix.get(league['id'], {}).get(player_name)
+        ]
+
+
+def parse_player_names(values):
+    """Split form values on commas/newlines into a de-duplicated name list."""
+    names = []
+    for value in values:
+        for name in re.split(r'[,\n]', value):
+            name = name.strip()
+            if name and name not in names:
+                names.append(name)
+    return names
+
+
+def rostered_mask(rosters, wanted):
+    """Bitset of the ``wanted`` player ids on any roster in a league."""
+    mask = 0
+    for roster in rosters:
+        mask |= wanted.known_mask(roster.get('players') or ())
+    return mask
+
+
+class AvailabilityCheck:
+    """Check which of ``player_names`` are unrostered in each league.
+
+    Each name is resolved to player ids once through the catalog's name
+    index and those ids get dense bit positions; each league's rosters are
+    reduced to one bitset of the wanted ids it rosters, and every
+    (league, player) cell is then a single AND.
+
+    Iterating yields (league, {name: available}) as each league's rosters
+    arrive (None for leagues that failed) while filling in ``result``.
+    """
+
+    def __init__(self, leagues, player_names):
+        catalog = player_catalog.get_catalog()
+        self.wanted = {}
+        self.wanted_ids = roster_bits.Interner()
+        self.result = AvailabilityResult(leagues=leagues, players=[])
+        for name in player_names:
+            ids = catalog.ids_for_name(name)
+            if ids:
+                self.wanted[name] = self.wanted_ids.mask(ids)
+                self.result.players.append(name)
+            else:
+                self.result.unknown_players.append(name)
+
+    def __iter__(self):
+        if not self.wanted:
+            return
+        leagues_by_id = {league['id']: league for league in self.result.leagues}
+        fetches = fanout.iter_map(roster_sync.get_rosters,
+                                  [(league_id, ) for league_id in leagues_by_id])
+        for (league_id, ), rosters in fetches:
+            league = leagues_by_id[league_id]
+            if not isinstance(rosters, list):
+                self.result.failed_leagues.append(league['name'])
+                yield league, None
+                continue
+            taken = rostered_mask(rosters, self.wanted_ids)
+            row = {
+                name: not taken & ids
+                for name, ids in self.wanted.items()
+            }
+            self.result.matrix[league_id] = row
+            yield league, row
+
+
+def find_available(leagues, player_names):
+    """Run an AvailabilityCheck to completion and return its result."""
+    check = AvailabilityCheck(leagues, player_names)
+    for _ in check:
+        pass
+    return check.result
@@ -0,0 +1,210 @@
+"""A local stand-in for the Sleeper API, served from generated fixtures.
+
+``FakeSleeper`` is a requests transport adapter: mount it on the app's
+pooled session and every outbound call is answered in-process, with an
+optional injected latency, while counting calls per endpoint class.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+
+import sleeper_cache
+import sleeper_client
+
+FIRST_NAMES = [
+    'Aaron', 'Amon-Ra', 'Bijan', 'Brock', 'Caleb', 'CeeDee', 'Christian',
+    'Dak', 'Davante', 'Derrick', 'Garrett', 'Jahmyr', "Ja'Marr", 'Jalen',
+    'Josh', 'Justin', 'Kenneth', 'Lamar', 'Mark', 'Mike', 'Nick', 'Patrick',
+    'Puka', 'Saquon', 'Stefon', 'Travis', 'Tyreek', 'Zay'
+]
+LAST_NAMES = [
+    'Adams', 'Allen', 'Andrews', 'Barkley', 'Brown', 'Chase', 'Diggs',
+    'Evans', 'Gibbs', 'Hall', 'Henry', 'Hill', 'Hurts', 'Jackson',
+    'Jefferson', 'Kelce', 'Lamb', 'Mahomes', 'McCaffrey', 'Nacua', 'Olave',
+    'Prescott', 'Robinson', 'Smith', 'St. Brown', 'Walker', 'Waddle',
+    'Williams'
+]
+POSITIONS = ['QB', 'RB', 'WR', 'WR', 'TE', 'K', 'DEF']
+TEAMS = [
+    'ARI', 'ATL', 'BAL', 'BUF', 'CAR', 'CHI', 'CIN', 'CLE', 'DAL', 'DEN',
+    'DET', 'GB', 'HOU', 'IND', 'JAX', 'KC', 'LAC', 'LAR', 'LV', 'MIA', 'MIN',
+    'NE', 'NO', 'NYG', 'NYJ', 'PHI', 'PIT', 'SEA', 'SF', 'TB', 'TEN', 'WAS',
+    None
+]
+
+BENCH_USER = 'bench_user'
+RIVAL_USER = 'bench_rival'
+
+
+class Fixtures:
+    """Deterministic leagues, members, rosters and players for one scale.
+
+    ``BENCH_USER`` is in every league and ``RIVAL_USER`` in every other
+    one; the remaining seats are filled from a pool of generated users.
+    """
+
+    def __init__(self, leagues=50, players=3000, teams_per_league=12,
+                 roster_size=25, seed=1):
+        rng = random.Random(seed)
+        self.seasons = [datetime.now().year - offset for offset in range(3)]
+
+        self.players = {}
+        for index in range(players):
+            player_id = str(1000 + index)
+            self.players[player_id] = {
+                'player_id': player_id,
+                'full_name':
+                f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                'position': rng.choice(POSITIONS),
+                'team': rng.choice(TEAMS),
+            }
+        player_ids = list(self.players)
+        core = player_ids[:roster_size // 2]
+
+        pool_size = max(teams_per_league * 2, leagues * 2)
+        self.users = {BENCH_USER: 'u0', RIVAL_USER: 'u1'}
+        self.users.update(
+            {f"bench_member_{i}": f"u{i + 2}" for i in range(pool_size)})
+        pool = [user_id for name, user_id in self.users.items()
+                if name.startswith('bench_member_')]
+
+        self.leagues = {}
+        self.members = {}
+        self.rosters = {}
+        for index in range(leagues):
+            league_id = f"bench_league_{index}"
+            self.leagues[league_id] = {
+                'league_id': league_id,
+                'name': f"Bench League {index}",
+                'status': 'in_season',
+                'settings': {'best_ball': index % 3 == 0},
+            }
+            members = ['u0'] + (['u1'] if index % 2 == 0 else [])
+            members += rng.sample(pool, teams_per_league - len(members))
+            self.members[league_id] = members
+
+            available = player_ids[len(core):]
+            rng.shuffle(available)
+            rosters = []
+            for roster_id, owner_id in enumerate(members, start=1):
+                if owner_id == 'u0':
+                    # The bench user keeps a stable core so exposure
+                    # percentages are meaningful.
+                    players_on_roster = core + available[:roster_size -
+                                                         len(core)]
+                    available = available[roster_size - len(core):]
+                else:
+                    players_on_roster = available[:roster_size]
+                    available = available[roster_size:]
+                rosters.append({
+                    'roster_id': roster_id,
+                    'owner_id': owner_id,
+                    'players': players_on_roster,
+                })
+            self.rosters[league_id] = rosters
+
+        self.user_leagues = {user_id: [] for user_id in self.users.values()}
+        for league_id, members in self.members.items():
+            for user_id in members:
+                self.user_leagues[user_id].append(self.leagues[league_id])
+
+    def route(self, path):
+        """(status, body) for a Sleeper API path such as '/user/foo'."""
+        match = re.fullmatch(r'/user/([^/]+)', path)
+        if match:
+            name = match.group(1)
+            user_id = self.users.get(name)
+            if user_id is None and name in self.user_leagues:
+                user_id = name
+            return 200, ({'user_id': user_id, 'username': name}
+                         if user_id else None)
+
+        match = re.fullmatch(r'/user/([^/]+)/leagues/nfl/(\d+)', path)
+        if match:
+            return 200, self.user_leagues.get(match.group(1), [])
+
+        match = re.fullmatch(r'/league/([^/]+)/rosters', path)
+        if match:
+            return 200, self.rosters.get(match.group(1))
+
+        match = re.fullmatch(r'/league/([^/]+)/users', path)
+        if match:
+            names = {user_id: name for name, user_id in self.users.items()}
+            return 200, [{
+                'user_id': user_id,
+                'display_name': names[user_id]
+            } for user_id in self.members.get(match.group(1), [])]
+
+        if re.fullmatch(r'/league/([^/]+)/transactions/\d+', path):
+            return 200, []
+
+        if path == '/state/nfl':
+            return 200, {'season': str(self.seasons[0]), 'week': 1, 'leg': 1}
+
+        if path == '/players/nfl':
+            return 200, self.players
+
+        return 404, None
+
+
+class FakeSleeper(BaseAdapter):
+    """Transport adapter answering Sleeper API calls from ``Fixtures``."""
+
+    def __init__(self, fixtures, latency=0.0):
+        super().__init__()
+        self.fixtures = fixtures
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        # Encoded once; /players/nfl in particular is large.
+        self._bodies = {}
+
+    def install(self):
+        """Mount on the app's pooled session so every Sleeper call lands here."""
+        session = sleeper_client.get_session()
+        session.mount('https://', self)
+        session.mount('http://', self)
+        return self
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def send(self, request, **kwargs):
+        path = urlparse(request.url).path
+        base_path = urlparse(sleeper_client.SLEEPER_API_BASE).path
+        if path.startswith(base_path):
+            path = path[len(base_path):]
+
+        with self._lock:
+            self.calls[sleeper_cache.classify(path)[0]] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        body = self._bodies.get(path)
+        if body is None:
+            status, data = self.fixtures.route(path)
+            body = (status, json.dumps(data).encode())
+            self._bodies[path] = body
+
+        resp = requests.Response()
+        resp.status_code, resp._content = body
+        resp.headers['Content-Type'] = 'application/json'
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
@@ -0,0 +1,349 @@
+"""Offline benchmarks for the Flask routes against a fake Sleeper API.
+
+Each scale runs in its own subprocess with a throwaway app.db, response
+cache, catalog and session directory, so the numbers (and peak RSS) of one
+scale never leak into the next, and the real app.db is never touched.
+
+    python -m benchmarks.run                      # compare to baseline.json
+    python -m benchmarks.run --scales 5 50        # a subset of scales
+    python -m benchmarks.run --update-baseline    # record new baseline
+
+Exits non-zero if any metric regresses past the baseline's tolerance.
+"""
+import argparse
+import atexit
+import gc
+import json
+import logging
+import os
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'baseline.json')
+DEFAULT_SCALES = [5, 50, 300]
+
+# Allowed growth over the baseline before a metric counts as a regression.
+# Timings get an absolute allowance on top so sub-millisecond routes don't
+# fail on scheduler noise.
+TIME_TOLERANCE = 0.5
+TIME_SLACK_MS = 10.0
+# Cold timings are a single sample and p95 over a handful of samples is
+# close to the max, so both are mostly noise on a shared machine; only flag
+# them when they blow up.
+P95_TOLERANCE = 2.0
+P95_SLACK_MS = 25.0
+SIZE_TOLERANCE = 0.1
+RSS_TOLERANCE = 0.25
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1,
+                max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def scenarios(fixtures):
+    """(name, setup, request) triples; ``request(client)`` returns a response.
+
+    ``setup`` runs untimed before every iteration (e.g. to log in the
+    session a route depends on).
+    """
+    from benchmarks.fake_sleeper import BENCH_USER, RIVAL_USER
+
+    league_id = next(iter(fixtures.leagues))
+    player_id = next(iter(fixtures.players))
+    player_name = fixtures.players[player_id]['full_name']
+    years = [str(year) for year in fixtures.seasons[:2]]
+
+    def search_username(client):
+        return client.post('/search_username', data={'username': BENCH_USER})
+
+    def not_rostered_setup(client):
+        return client.post('/not_rostered_setup',
+                           data={'username': BENCH_USER})
+
+    def consume(response):
+        # Streamed bodies only run while being read.
+        response.get_data()
+        return response
+
+    return [
+        ('search_username', None, search_username),
+        ('search_username_stream', None, lambda client: consume(
+            client.get('/search_username/stream',
+                       query_string={'username': BENCH_USER}))),
+        ('search_player', search_username, lambda client: client.post(
+            '/search_player', data={'player_id': player_id})),
+        ('autocomplete', None, lambda client: client.get(
+            '/api/players/autocomplete', query_string={'q': player_name[:4]})),
+        ('not_rostered_setup', None, not_rostered_setup),
+        ('search_not_rostered', not_rostered_setup, lambda client: client.post(
+            '/search_not_rostered',
+            data={'player_name': f"{player_name}, Nobody Atall"})),
+        ('search_not_rostered_stream', not_rostered_setup,
+         lambda client: consume(
+             client.get('/search_not_rostered/stream',
+                        query_string={'player_name': player_name}))),
+        ('username_compare', None, lambda client: client.post(
+            '/username_compare',
+            data={'username1': BENCH_USER, 'username2': RIVAL_USER,
+                  'years': years})),
+        ('league_compare', None, lambda client: client.post(
+            '/league_compare', data={'league_id': league_id, 'years': years})),
+        ('bulk_exposure', None, lambda client: client.post(
+            '/api/exposure', json={'league_id': league_id})),
+        ('league_compare_stream', None, lambda client: consume(
+            client.get('/league_compare/stream',
+                       query_string={'league_id': league_id,
+                                     'years': years}))),
+    ]
+
+
+def session_bytes(session_dir):
+    """On-disk size of the stored sessions (one client's, see run_scale)."""
+    total = 0
+    for name in os.listdir(session_dir):
+        # cachelib keeps a bookkeeping file next to the sessions.
+        if not name.startswith('__wz_cache'):
+            total += os.path.getsize(os.path.join(session_dir, name))
+    return total
+
+
+def clear_sessions(session_dir):
+    for name in os.listdir(session_dir):
+        os.remove(os.path.join(session_dir, name))
+
+
+def reset_caches(webapp, cache_path, result_path, snapshot_path,
+                 directory_path):
+    """Forget every cached response, result, snapshot and league list.
+
+    Run before each scenario so its first request measures a cold visit
+    rather than riding on what the previous scenario fetched. The player
+    catalog stays loaded, as it would in a long-running worker.
+    """
+    from models import db, LeagueRosterFingerprint
+
+    with sqlite3.connect(cache_path) as conn:
+        conn.execute("DELETE FROM response_cache WHERE path != '/players/nfl'")
+    with sqlite3.connect(result_path) as conn:
+        conn.execute('DELETE FROM result_store')
+    with sqlite3.connect(snapshot_path) as conn:
+        conn.execute('DELETE FROM roster_snapshot')
+    with sqlite3.connect(directory_path) as conn:
+        conn.execute('DELETE FROM user_season')
+    with webapp.app.app_context():
+        db.session.execute(db.delete(LeagueRosterFingerprint))
+        db.session.commit()
+
+
+def peak_rss_kb():
+    # ru_maxrss is KB on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def run_scale(leagues, iterations, latency):
+    """Benchmark every scenario at one scale; runs inside a child process."""
+    workdir = tempfile.mkdtemp(prefix='sleeper-bench-')
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    session_dir = os.path.join(workdir, 'session')
+    cache_path = os.path.join(workdir, 'sleeper_cache.db')
+    result_path = os.path.join(workdir, 'result_store.db')
+    snapshot_path = os.path.join(workdir, 'roster_snapshots.db')
+    directory_path = os.path.join(workdir, 'league_directory.db')
+    os.environ.update({
+        'SESSION_FILE_DIR': session_dir,
+        'SLEEPER_CACHE_PATH': cache_path,
+        'PLAYER_CATALOG_PATH': os.path.join(workdir, 'player_catalog.json'),
+        'SLEEPER_RATE_LIMIT_PATH': os.path.join(workdir, 'ratelimit.db'),
+        'RESULT_STORE_PATH': result_path,
+        'ROSTER_SNAPSHOT_PATH': snapshot_path,
+        'LEAGUE_DIRECTORY_PATH': directory_path,
+        # The fake API never throttles; the limiter would only add noise.
+        'SLEEPER_RATE_LIMIT_ENABLED': '0',
+    })
+    sys.path.insert(0, ROOT)
+
+    from config import Config
+    Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(
+        workdir, 'app.db')
+
+    import app as webapp
+    from benchmarks.fake_sleeper import Fixtures, FakeSleeper
+
+    logging.getLogger().setLevel(logging.ERROR)
+
+    fixtures = Fixtures(leagues=leagues)
+    fake = FakeSleeper(fixtures, latency=latency).install()
+
+    results = {}
+    for name, setup, make_request in scenarios(fixtures):
+        clear_sessions(session_dir)
+        reset_caches(webapp, cache_path, result_path, snapshot_path,
+                     directory_path)
+        client = webapp.app.test_client()
+        timings = []
+        calls = []
+        for _ in range(iterations):
+            if setup:
+                setup(client)
+            fake.reset_calls()
+            # Collect up front so a full GC pass triggered by an earlier
+            # scenario's garbage doesn't land in this one's timings.
+            gc.collect()
+            started = time.perf_counter()
+            response = make_request(client)
+            timings.append((time.perf_counter() - started) * 1000)
+            calls.append(fake.total_calls())
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f"{name} returned {response.status_code} at {leagues} leagues")
+
+        warm = timings[1:] or timings
+        results[name] = {
+            'cold_ms': round(timings[0], 2),
+            'p50_ms': round(percentile(warm, 50), 2),
+            'p95_ms': round(percentile(warm, 95), 2),
+            'calls_cold': calls[0],
+            'calls_warm': max(calls[1:] or calls),
+            'session_bytes': session_bytes(session_dir),
+        }
+    return {'scenarios': results, 'peak_rss_kb': peak_rss_kb()}
+
+
+def run_child(leagues, iterations, latency):
+    """Run one scale in a fresh interpreter and return its results."""
+    cmd = [
+        sys.executable, '-m', 'benchmarks.run', '--child',
+        '--scales', str(leagues), '--iterations', str(iterations),
+        '--latency', str(latency)
+    ]
+    output = subprocess.run(cmd, cwd=ROOT, check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def regressions(baseline, current):
+    """Human-readable list of metrics that got worse than the baseline."""
+    problems = []
+    for scale, base in baseline.get('scales', {}).items():
+        now = current['scales'].get(scale)
+        if now is None:
+            continue
+        limit = base['peak_rss_kb'] * (1 + RSS_TOLERANCE)
+        if now['peak_rss_kb'] > limit:
+            problems.append(f"{scale} leagues: peak RSS {now['peak_rss_kb']} KB "
+                            f"> {base['peak_rss_kb']} KB baseline")
+        for name, before in base['scenarios'].items():
+            after = now['scenarios'].get(name)
+            if after is None:
+                continue
+            for metric in ('cold_ms', 'p50_ms', 'p95_ms'):
+                if metric in ('cold_ms', 'p95_ms'):
+                    limit = before[metric] * (1 + P95_TOLERANCE) + P95_SLACK_MS
+                else:
+                    limit = (before[metric] * (1 + TIME_TOLERANCE) +
+                             TIME_SLACK_MS)
+                if after[metric] > limit:
+                    problems.append(
+                        f"{scale} leagues: {name} {metric} {after[metric]} "
+                        f"> {before[metric]} baseline")
+            for metric in ('calls_cold', 'calls_warm'):
+                if after[metric] > before[metric]:
+                    problems.append(
+                        f"{scale} leagues: {name} {metric} {after[metric]} "
+                        f"> {before[metric]} baseline")
+            limit = before['session_bytes'] * (1 + SIZE_TOLERANCE)
+            if after['session_bytes'] > limit:
+                problems.append(
+                    f"{scale} leagues: {name} session {after['session_bytes']} "
+                    f"bytes > {before['session_bytes']} baseline")
+    return problems
+
+
+def print_report(results):
+    header = (f"{'scenario':<28}{'cold ms':>10}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'calls':>8}{'warm':>6}{'session B':>11}")
+    for scale, data in results['scales'].items():
+        print(f"\n{scale} leagues (peak RSS {data['peak_rss_kb'] // 1024} MB)")
+        print(header)
+        for name, row in data['scenarios'].items():
+            print(f"{name:<28}{row['cold_ms']:>10.1f}{row['p50_ms']:>10.1f}"
+                  f"{row['p95_ms']:>10.1f}{row['calls_cold']:>8}"
+                  f"{row['calls_warm']:>6}{row['session_bytes']:>11}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+',
+                        default=DEFAULT_SCALES,
+                        help='league counts to benchmark')
+    parser.add_argument('--iterations', type=int, default=10,
+                        help='requests per scenario (the first one is cold)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds of injected latency per Sleeper call')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write these results as the new baseline')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_scale(args.scales[0], args.iterations,
+                                   args.latency)))
+        return 0
+
+    results = {
+        'iterations': args.iterations,
+        'latency': args.latency,
+        'scales': {
+            str(scale): run_child(scale, args.iterations, args.latency)
+            for scale in args.scales
+        }
+    }
+    print_report(results)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline.")
+        return 0
+
+    if (baseline.get('iterations'), baseline.get('latency')) != (
+            args.iterations, args.latency):
+        print("\nBaseline was recorded with different --iterations/--latency; "
+              "not comparing.")
+        return 0
+
+    problems = regressions(baseline, results)
+    if problems:
+        print("\nRegressions against baseline:")
+        for problem in problems:
+            print(f"  - {problem}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
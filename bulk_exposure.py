@@ -0,0 +1,79 @@
+import fanout
+import roster_sync
+from exposure import compute_exposure
+from roster_fingerprints import owner_player_ids
+
+
+class BulkExposure:
+    """Exposure for many users from one fetch of each league's rosters.
+
+    ``members`` is a list of (name, user_id) and ``leagues_by_user`` maps
+    user_id -> that user's [{'id', 'name'}] leagues. Users in the same
+    league share one ``/league/{id}/rosters`` call; each owner's players
+    are read out of the shared payload.
+
+    Iterating yields (league_id, finished) as each league's rosters
+    arrive, where ``finished`` lists the (name, user_id) whose last league
+    just came in; their ExposureResult is then in ``results``. Leagues
+    whose rosters failed are listed in ``failed_leagues`` and counted as
+    empty for their users.
+    """
+
+    def __init__(self, members, leagues_by_user):
+        self.members = list(members)
+        self.leagues_by_user = leagues_by_user
+        self.results = {}
+        self.failed_leagues = []
+        self.league_ids = list(
+            dict.fromkeys(league['id']
+                          for _, user_id in self.members
+                          for league in leagues_by_user.get(user_id, ())))
+
+    def __iter__(self):
+        pending = {}
+        users_by_league = {}
+        for name, user_id in self.members:
+            leagues = self.leagues_by_user.get(user_id, [])
+            pending[user_id] = {league['id'] for league in leagues}
+            for league in leagues:
+                users_by_league.setdefault(league['id'], []).append(user_id)
+
+        names = dict((user_id, name) for name, user_id in self.members)
+        players = {user_id: {} for user_id in pending}
+
+        # Users without leagues are done before anything is fetched.
+        finished = [(names[user_id], user_id)
+                    for user_id, waiting in pending.items() if not waiting]
+        for name, user_id in finished:
+            self._finish(user_id, players[user_id])
+        if finished:
+            yield None, finished
+
+        fetches = fanout.iter_map(roster_sync.get_rosters,
+                                  [(league_id, ) for league_id in self.league_ids])
+        for (league_id, ), rosters in fetches:
+            if not isinstance(rosters, list):
+                self.failed_leagues.append(league_id)
+            finished = []
+            for user_id in users_by_league[league_id]:
+                if isinstance(rosters, list):
+                    players[user_id][league_id] = owner_player_ids(
+                        rosters, user_id, league_id)
+                waiting = pending[user_id]
+                waiting.discard(league_id)
+                if not waiting and user_id not in self.results:
+                    self._finish(user_id, players[user_id])
+                    finished.append((names[user_id], user_id))
+            yield league_id, finished
+
+    def _finish(self, user_id, players_by_league):
+        self.results[user_id] = compute_exposure(
+            self.leagues_by_user.get(user_id, []), players_by_league)
+
+
+def compute_bulk_exposure(members, leagues_by_user):
+    """Run a BulkExposure to completion and return it."""
+    bulk = BulkExposure(members, leagues_by_user)
+    for _ in bulk:
+        pass
+    return bulk
@@ -6,3 +6,102 @@ class Config:
     # This will ensure that the database file is created in the PlayerStock directory
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Every in-flight request under gevent workers may hold a connection
+    # while it waits on Sleeper; SQLite connections are cheap, so never
+    # make a request queue for one.
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 10, 'max_overflow': -1}
+
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+    # Per-request phase timings, Server-Timing headers and /metrics
+    # (see metrics.py)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS',
+                                                 2000))
+
+    # Opt-in sampling profiler (see profiling.py). Requests sending
+    # X-Profile-Token: <PROFILE_ADMIN_TOKEN>, and PROFILE_SAMPLE_RATE of all
+    # others, are profiled into PROFILE_DIR. It's off without the token,
+    # which /profiles also requires, even if PROFILE_SAMPLE_RATE is set.
+    PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN') or None
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR',
+                                 os.path.join(basedir, 'profiles'))
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+    # Outbound Sleeper API client (see sleeper_client.py)
+    SLEEPER_POOL_SIZE = int(os.environ.get('SLEEPER_POOL_SIZE', 20))
+    SLEEPER_TIMEOUT = (3.05, float(os.environ.get('SLEEPER_READ_TIMEOUT', 15)))
+    SLEEPER_MAX_RETRIES = int(os.environ.get('SLEEPER_MAX_RETRIES', 3))
+    SLEEPER_BACKOFF_FACTOR = 0.3
+    SLEEPER_FANOUT_WORKERS = int(os.environ.get('SLEEPER_FANOUT_WORKERS', 16))
+    # Max in-flight calls for one request's fan-out (see fanout.py)
+    SLEEPER_FANOUT_CONCURRENCY = int(
+        os.environ.get('SLEEPER_FANOUT_CONCURRENCY', 16))
+
+    # Token bucket shared by every worker for outbound Sleeper calls
+    # (see rate_limiter.py)
+    SLEEPER_RATE_LIMIT_ENABLED = os.environ.get('SLEEPER_RATE_LIMIT_ENABLED',
+                                                '1') == '1'
+    SLEEPER_RATE_LIMIT_PATH = os.environ.get(
+        'SLEEPER_RATE_LIMIT_PATH', os.path.join(basedir, 'sleeper_ratelimit.db'))
+    SLEEPER_RATE_PER_MINUTE = int(os.environ.get('SLEEPER_RATE_PER_MINUTE', 900))
+    SLEEPER_RATE_BURST = int(os.environ.get('SLEEPER_RATE_BURST', 50))
+    SLEEPER_RATE_INTERACTIVE_RESERVE = 10
+
+    # Shared response cache for Sleeper calls (see sleeper_cache.py)
+    SLEEPER_CACHE_ENABLED = os.environ.get('SLEEPER_CACHE_ENABLED', '1') == '1'
+    SLEEPER_CACHE_PATH = os.environ.get(
+        'SLEEPER_CACHE_PATH', os.path.join(basedir, 'sleeper_cache.db'))
+    SLEEPER_CACHE_MAX_BYTES = int(
+        os.environ.get('SLEEPER_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Optional {endpoint_class: (fresh_seconds, stale_seconds)} overrides
+    SLEEPER_CACHE_TTL_OVERRIDES = {}
+
+    # Slim NFL player catalog shared by all workers (see player_catalog.py)
+    PLAYER_CATALOG_PATH = os.environ.get(
+        'PLAYER_CATALOG_PATH', os.path.join(basedir, 'player_catalog.json'))
+    PLAYER_CATALOG_REFRESH_SECONDS = 24 * 3600
+
+    # Seconds a league's roster fingerprint is trusted before refetching
+    # (see roster_fingerprints.py)
+    ROSTER_FINGERPRINT_TTL = int(os.environ.get('ROSTER_FINGERPRINT_TTL', 300))
+
+    # Per-league roster snapshots kept current from Sleeper's transaction
+    # log (see roster_sync.py)
+    ROSTER_SYNC_ENABLED = os.environ.get('ROSTER_SYNC_ENABLED', '1') == '1'
+    ROSTER_SNAPSHOT_PATH = os.environ.get(
+        'ROSTER_SNAPSHOT_PATH', os.path.join(basedir, 'roster_snapshots.db'))
+    ROSTER_SYNC_INTERVAL = int(os.environ.get('ROSTER_SYNC_INTERVAL', 120))
+    ROSTER_FULL_SYNC_INTERVAL = 6 * 3600
+
+    # Slimmed league lists per (user, season), shared by every route that
+    # looks a user's leagues up (see league_directory.py)
+    LEAGUE_DIRECTORY_ENABLED = os.environ.get('LEAGUE_DIRECTORY_ENABLED',
+                                              '1') == '1'
+    LEAGUE_DIRECTORY_PATH = os.environ.get(
+        'LEAGUE_DIRECTORY_PATH', os.path.join(basedir, 'league_directory.db'))
+    LEAGUE_DIRECTORY_TTL = int(os.environ.get('LEAGUE_DIRECTORY_TTL', 15 * 60))
+    LEAGUE_DIRECTORY_MAX_AGE = 7 * 24 * 3600
+
+    # Server-side store for search results, so sessions only hold a key
+    # (see result_store.py)
+    RESULT_STORE_PATH = os.environ.get(
+        'RESULT_STORE_PATH', os.path.join(basedir, 'result_store.db'))
+    RESULT_STORE_TTL = 3600
+    RESULT_STORE_MAX_BYTES = int(
+        os.environ.get('RESULT_STORE_MAX_BYTES', 64 * 1024 * 1024))
+
+    # gzip (or brotli, when installed) for text/JSON responses at least
+    # this big (see http_cache.py)
+    COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+    COMPRESS_LEVEL = 6
+
+    # Most usernames one /api/exposure request may name
+    BULK_EXPOSURE_MAX_USERS = int(os.environ.get('BULK_EXPOSURE_MAX_USERS',
+                                                 50))
+
+    # Background jobs for expensive comparisons (see jobs.py)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 600))
+    JOB_STALE_SECONDS = 300
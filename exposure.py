@@ -0,0 +1,140 @@
+from dataclasses import dataclass, field
+
+import player_catalog
+import roster_bits
+from models import SleeperPlayer
+
+UNKNOWN_PLAYER = ('Unknown Player', 'Unknown Position')
+
+
+@dataclass
+class PlayerExposure:
+    id: str
+    name: str
+    position: str
+    league_count: int
+    percentage: float
+    leagues: list
+
+    @property
+    def percentage_label(self):
+        return f"{self.percentage:.2f}%"
+
+    def to_dict(self):
+        """Plain dict in the shape result.html and the session cache use."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'position': self.position,
+            'percentage': self.percentage_label,
+            'leagues': self.leagues,
+        }
+
+
+@dataclass
+class ExposureResult:
+    """A user's exposure across a set of leagues, most-rostered first."""
+    leagues: list
+    players: list = field(default_factory=list)
+
+    @property
+    def league_names(self):
+        return [league['name'] for league in self.leagues]
+
+    def player_dicts(self):
+        return [player.to_dict() for player in self.players]
+
+    def to_compact(self):
+        """JSON-friendly form with each league name stored once.
+
+        Players refer to their leagues by index into ``leagues``.
+        """
+        index = {}
+        for position, league in enumerate(self.leagues):
+            index.setdefault(league['name'], position)
+        return {
+            'leagues': [[league['id'], league['name']]
+                        for league in self.leagues],
+            'players': [[
+                player.id, player.name, player.position, player.league_count,
+                player.percentage, [index[name] for name in player.leagues]
+            ] for player in self.players],
+        }
+
+    @classmethod
+    def from_compact(cls, data):
+        leagues = [{'id': league_id, 'name': name}
+                   for league_id, name in data['leagues']]
+        names = [league['name'] for league in leagues]
+        players = [
+            PlayerExposure(id=player_id,
+                           name=name,
+                           position=position,
+                           league_count=count,
+                           percentage=percentage,
+                           leagues=[names[i] for i in league_indexes])
+            for player_id, name, position, count, percentage, league_indexes
+            in data['players']
+        ]
+        return cls(leagues=leagues, players=players)
+
+
+def lookup_players(player_ids):
+    """Map player id -> (name, position) for just the given ids.
+
+    Reads the SleeperPlayer table with an IN query (chunked to stay under
+    SQLite's parameter limit) and falls back to the player catalog for ids
+    the table doesn't have yet.
+    """
+    player_ids = list(player_ids)
+    found = {}
+    for start in range(0, len(player_ids), 900):
+        chunk = player_ids[start:start + 900]
+        for player in SleeperPlayer.query.with_entities(
+                SleeperPlayer.id, SleeperPlayer.name,
+                SleeperPlayer.position).filter(SleeperPlayer.id.in_(chunk)):
+            found[player.id] = (player.name, player.position)
+
+    missing = [pid for pid in player_ids if pid not in found]
+    if missing:
+        catalog = player_catalog.get_catalog()
+        for pid in missing:
+            player = catalog.get(pid)
+            if player:
+                found[pid] = (player['full_name'], player['position'])
+    return found
+
+
+def compute_exposure(leagues, players_by_league, counts=None):
+    """Aggregate a user's rosters into an ExposureResult.
+
+    ``leagues`` is the ordered list of {'id', 'name'} dicts and
+    ``players_by_league`` maps league id -> rostered player ids; each
+    player's leagues are kept as a bitset over ``leagues``. ``counts`` may
+    supply precomputed per-player league counts; otherwise they are the
+    bitsets' popcounts.
+    """
+    matrix = roster_bits.RosterMatrix()
+    for league in leagues:
+        matrix.add_roster(league['id'], players_by_league.get(league['id'], ()))
+    if counts is None:
+        counts = matrix.counts()
+    names = {league['id']: league['name'] for league in leagues}
+
+    info = lookup_players(counts)
+    total = len(leagues) or 1
+    players = []
+    for player_id, count in counts.items():
+        name, position = info.get(player_id, UNKNOWN_PLAYER)
+        players.append(
+            PlayerExposure(id=player_id,
+                           name=name,
+                           position=position,
+                           league_count=count,
+                           percentage=count / total * 100,
+                           leagues=[
+                               names[league_id]
+                               for league_id in matrix.leagues_of(player_id)
+                           ]))
+    players.sort(key=lambda player: (-player.league_count, player.name))
+    return ExposureResult(leagues=leagues, players=players)
@@ -0,0 +1,244 @@
+import asyncio
+import contextvars
+import logging
+import sys
+import threading
+
+from flask import current_app, has_app_context
+
+import metrics
+import profiling
+import sleeper_client
+
+# Default cap on in-flight calls per fan-out; overridable via the Flask config.
+_settings = {
+    'SLEEPER_FANOUT_CONCURRENCY': 16,
+}
+
+
+def init_app(app):
+    if 'SLEEPER_FANOUT_CONCURRENCY' in app.config:
+        _settings['SLEEPER_FANOUT_CONCURRENCY'] = app.config[
+            'SLEEPER_FANOUT_CONCURRENCY']
+
+
+class FanOut:
+    """Runs blocking Sleeper calls concurrently under a concurrency limit.
+
+    Calls execute on the shared Sleeper thread pool (so they reuse the
+    pooled HTTP session) while an asyncio semaphore bounds how many of this
+    fan-out's calls are in flight at once.
+    """
+
+    def __init__(self, concurrency):
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(self, fn, *args, priority=sleeper_client.BULK):
+        """Run ``fn(*args)`` on the pool; its Sleeper calls default to BULK."""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            call = metrics.bind(
+                profiling.bind(sleeper_client.call_with_priority))
+            return await loop.run_in_executor(sleeper_client.get_executor(),
+                                              call, priority, fn, *args)
+
+    async def map(self, fn, keys):
+        """Call ``fn(*key)`` for every key tuple concurrently.
+
+        Returns a dict of key -> result. A call that raises is logged and
+        stored as the exception instance, so one failure never cancels the
+        rest of the batch.
+        """
+        keys = list(keys)
+        results = await asyncio.gather(*(self.call(fn, *key) for key in keys),
+                                       return_exceptions=True)
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Fan-out call {fn.__name__}{key} failed: {result}")
+        return dict(zip(keys, results))
+
+    async def gather(self, *coroutines):
+        """Await several coroutines at once; results in argument order."""
+        return await asyncio.gather(*coroutines)
+
+
+def cooperative():
+    """True inside a gevent worker, where blocking I/O already yields.
+
+    asyncio keeps one running loop per OS thread, which every greenlet on
+    that thread shares, so fan-outs there use greenlets instead.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    return bool(monkey and monkey.is_module_patched('socket'))
+
+
+def _spawn(fn, *args):
+    """Start ``fn(*args)`` on its own greenlet with the caller's context.
+
+    It also gets its own app context, and with it its own SQLAlchemy
+    session, since greenlets can't share one the way asyncio tasks do.
+    """
+    import gevent
+
+    def run():
+        if not has_app_context():
+            return fn(*args)
+        with current_app.app_context():
+            return fn(*args)
+
+    return gevent.spawn(contextvars.copy_context().run, profiling.bind(run))
+
+
+def _drive(coroutine):
+    """Run a coroutine that only awaits CooperativeFanOut methods.
+
+    Those never suspend (their I/O blocks, which yields to other
+    greenlets), so the coroutine finishes on its first step.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+    coroutine.close()
+    raise RuntimeError('Cooperative fan-outs cannot await asyncio objects')
+
+
+def _settle(fn, *args):
+    """(False, result) or (True, exception) for ``fn(*args)``."""
+    try:
+        return False, fn(*args)
+    except Exception as e:
+        return True, e
+
+
+class CooperativeFanOut:
+    """FanOut for gevent workers, with the same awaitable interface.
+
+    Calls run inline on the caller's greenlet, and ``map``/``gather``
+    spread their work over one greenlet each. A semaphore bounds how many
+    of this fan-out's calls are in flight at once.
+    """
+
+    def __init__(self, concurrency):
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+
+    def _call(self, fn, *args, priority=sleeper_client.BULK):
+        with self._semaphore:
+            return sleeper_client.call_with_priority(priority, fn, *args)
+
+    def _try_call(self, fn, key):
+        try:
+            return self._call(fn, *key)
+        except Exception as e:
+            logging.warning(f"Fan-out call {fn.__name__}{key} failed: {e}")
+            return e
+
+    async def call(self, fn, *args, priority=sleeper_client.BULK):
+        return self._call(fn, *args, priority=priority)
+
+    async def map(self, fn, keys):
+        keys = list(keys)
+        greenlets = [_spawn(self._try_call, fn, key) for key in keys]
+        return {key: greenlet.get() for key, greenlet in zip(keys, greenlets)}
+
+    async def gather(self, *coroutines):
+        """Like ``asyncio.gather``: the first failure is raised at once.
+
+        The other greenlets are killed rather than left running, and the
+        error is caught on its own greenlet first, so an expected one
+        (e.g. an unknown user) never reaches gevent's traceback printer.
+        """
+        import gevent
+
+        greenlets = [_spawn(_settle, _drive, coroutine)
+                     for coroutine in coroutines]
+        try:
+            for greenlet in gevent.iwait(greenlets):
+                failed, value = greenlet.get()
+                if failed:
+                    raise value
+        finally:
+            gevent.killall(greenlets)
+        return [greenlet.get()[1] for greenlet in greenlets]
+
+
+def _engine(concurrency):
+    concurrency = concurrency or _settings['SLEEPER_FANOUT_CONCURRENCY']
+    if cooperative():
+        return CooperativeFanOut(concurrency)
+    return FanOut(concurrency)
+
+
+def run(main, concurrency=None):
+    """Run ``main(engine)`` to completion on a fresh event loop.
+
+    ``main`` is an async function receiving a FanOut engine; its return
+    value is returned. Safe to call from a regular (sync) Flask view.
+    """
+
+    engine = _engine(concurrency)
+    if isinstance(engine, CooperativeFanOut):
+        return _drive(main(engine))
+
+    async def runner():
+        return await main(engine)
+
+    return asyncio.run(runner())
+
+
+def iter_map(fn, keys, concurrency=None):
+    """Like ``FanOut.map`` but yields (key, result) pairs as calls finish.
+
+    Drives its own event loop one completion at a time, so a sync caller
+    (e.g. a streaming response generator) can act on each result as soon
+    as it arrives. Failed calls yield the exception instance.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    engine = _engine(concurrency)
+    if isinstance(engine, CooperativeFanOut):
+        yield from _iter_cooperative(engine, fn, keys)
+        return
+    loop = asyncio.new_event_loop()
+
+    async def one(key):
+        try:
+            return key, await engine.call(fn, *key)
+        except Exception as e:
+            logging.warning(f"Fan-out call {fn.__name__}{key} failed: {e}")
+            return key, e
+
+    pending = {loop.create_task(one(key)) for key in keys}
+    try:
+        while pending:
+            done, pending = loop.run_until_complete(
+                asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED))
+            for task in done:
+                yield task.result()
+    finally:
+        # The consumer may stop early (e.g. the client disconnected).
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(
+                asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+
+def _iter_cooperative(engine, fn, keys):
+    import gevent
+    from gevent.queue import Queue
+
+    finished = Queue()
+
+    def one(key):
+        finished.put((key, engine._try_call(fn, key)))
+
+    greenlets = [_spawn(one, key) for key in keys]
+    try:
+        for _ in keys:
+            yield finished.get()
+    finally:
+        # The consumer may stop early (e.g. the client disconnected).
+        gevent.killall(greenlets, block=False)
@@ -0,0 +1,21 @@
+import os
+
+# Serving config for `gunicorn app:app` (see Procfile).
+#
+# Workers are cooperative (gevent) by default: a route waiting on Sleeper
+# yields to other requests instead of pinning its worker, so one process
+# keeps hundreds of searches in flight. gevent patches the standard
+# library before the app is imported, so Sleeper calls, pool and lock
+# waits and sleeps all yield without changes to the routes; fan-outs
+# switch to greenlets on their own (fanout.py). SQLite calls still block
+# the worker, so lock waits are kept short there (writers retry from a
+# cooperative sleep, see models.write_with_retry); never hold a write
+# transaction across a Sleeper call.
+#
+# GUNICORN_WORKER_CLASS=sync brings back plain sync workers.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Most requests in flight per gevent worker.
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 500))
+# A cold league_compare can legitimately take a while.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
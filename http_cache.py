@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+import json
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone is fine
+    brotli = None
+
+_settings = {
+    'COMPRESS_MIN_BYTES': 1024,
+    'COMPRESS_LEVEL': 6,
+}
+
+COMPRESSIBLE = {
+    'application/json', 'text/html', 'text/css', 'text/plain',
+    'application/javascript', 'text/javascript'
+}
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+    app.after_request(compress)
+
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(response):
+    """Compress finished text/JSON responses the client accepts encoded.
+
+    Streamed bodies (the SSE routes) and files are left alone.
+    """
+    if (response.status_code not in (200, 201, 202)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding()
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < _settings['COMPRESS_MIN_BYTES']:
+        return response
+    if encoding == 'br':
+        body = brotli.compress(body, quality=_settings['COMPRESS_LEVEL'])
+    else:
+        body = gzip.compress(body, compresslevel=_settings['COMPRESS_LEVEL'])
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def make_etag(*parts):
+    """ETag value for a response derived from ``parts`` (e.g. a roster version)."""
+    raw = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def not_modified(etag):
+    """A 304 for ``etag`` if the client already has it, else None."""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        _validators(response, etag)
+        return response
+    return None
+
+
+def json_response(payload, etag=None):
+    """JSON response carrying ``etag`` as a weak validator.
+
+    Weak because the same result is sent with different encodings.
+    """
+    response = Response(json.dumps(payload, separators=(',', ':')),
+                        mimetype='application/json')
+    if etag:
+        _validators(response, etag)
+    return response
+
+
+def _validators(response, etag):
+    response.set_etag(etag, weak=True)
+    # Per-user results: browsers may keep them but must revalidate.
+    response.headers['Cache-Control'] = 'private, no-cache'
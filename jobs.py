@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, BackgroundJob, write_with_retry
+
+_settings = {
+    'JOB_WORKERS': 2,
+    # How long finished results are reused for identical requests.
+    'JOB_RESULT_TTL': 10 * 60,
+    # An active job with no progress for this long is treated as abandoned
+    # (e.g. its worker process was restarted) and may be resubmitted.
+    'JOB_STALE_SECONDS': 5 * 60,
+}
+
+_handlers = {}
+_app = None
+_executor = None
+_lock = threading.Lock()
+
+
+def init_app(app):
+    global _app
+    _app = app
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+
+
+def handler(kind):
+    """Register ``fn(params, report_progress)`` as the runner for ``kind``.
+
+    The handler's return value must be JSON-serializable; raising marks the
+    job failed with the exception's message.
+    """
+
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+
+    return register
+
+
+def job_key(kind, params):
+    """Stable key for a job kind and its normalized parameters."""
+    payload = json.dumps([kind, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_settings['JOB_WORKERS'],
+                    thread_name_prefix='job')
+    return _executor
+
+
+def _reusable_job(key, now):
+    """An in-flight job or a still-fresh finished one for this key."""
+    active = BackgroundJob.query.filter(
+        BackgroundJob.key == key,
+        BackgroundJob.status.in_(('queued', 'running'))).first()
+    if active:
+        if now - active.updated_at <= _settings['JOB_STALE_SECONDS']:
+            return active
+        active.status = 'failed'
+        active.error = 'Job was abandoned; please try again.'
+        active.finished_at = now
+        db.session.commit()
+
+    return BackgroundJob.query.filter(
+        BackgroundJob.key == key, BackgroundJob.status == 'done',
+        BackgroundJob.finished_at
+        >= now - _settings['JOB_RESULT_TTL']).order_by(
+            BackgroundJob.finished_at.desc()).first()
+
+
+def submit(kind, params):
+    """Return the job for (kind, params), starting one only if needed.
+
+    Identical requests, from any worker process, share one job while it is
+    queued or running, and reuse its result for JOB_RESULT_TTL after.
+    """
+    if kind not in _handlers:
+        raise KeyError(f"No job handler registered for '{kind}'")
+    key = job_key(kind, params)
+    now = time.time()
+
+    existing = _reusable_job(key, now)
+    if existing:
+        return existing
+
+    job = BackgroundJob(id=uuid.uuid4().hex,
+                        key=key,
+                        kind=kind,
+                        params=json.dumps(params),
+                        status='queued',
+                        created_at=now,
+                        updated_at=now)
+
+    def insert():
+        db.session.add(job)
+        db.session.commit()
+
+    try:
+        write_with_retry(insert)
+    except IntegrityError:
+        # Another worker queued the same job between our check and insert.
+        db.session.rollback()
+        return _reusable_job(key, now)
+
+    _get_executor().submit(_run, job.id)
+    _purge_expired(now)
+    return job
+
+
+def get(job_id):
+    return db.session.get(BackgroundJob, job_id)
+
+
+def describe(job):
+    """JSON-friendly status (and result, once done) for a job."""
+    data = {'id': job.id, 'kind': job.kind, 'status': job.status}
+    if job.progress:
+        data['progress'] = json.loads(job.progress)
+    if job.status == 'done':
+        data['result'] = json.loads(job.result)
+    elif job.status == 'failed':
+        data['error'] = job.error
+    return data
+
+
+def _update(job_id, **values):
+    values['updated_at'] = time.time()
+
+    def update():
+        db.session.execute(
+            db.update(BackgroundJob).where(BackgroundJob.id == job_id).values(
+                **values))
+        db.session.commit()
+
+    write_with_retry(update)
+
+
+def _run(job_id):
+    with _app.app_context():
+        job = get(job_id)
+        if job is None:
+            return
+        fn = _handlers[job.kind]
+        params = json.loads(job.params)
+        _update(job_id, status='running')
+
+        last_report = [0.0]
+
+        def report_progress(**progress):
+            # Throttled so a fast fan-out doesn't turn into a write storm.
+            now = time.time()
+            if now - last_report[0] >= 0.5:
+                last_report[0] = now
+                _update(job_id, progress=json.dumps(progress))
+
+        try:
+            result = fn(params, report_progress)
+        except Exception as e:
+            logging.warning(f"Job {job_id} ({job.kind}) failed: {e}")
+            _update(job_id,
+                    status='failed',
+                    error=str(e),
+                    finished_at=time.time())
+            return
+        _update(job_id,
+                status='done',
+                result=json.dumps(result),
+                finished_at=time.time())
+
+
+def _purge_expired(now):
+    cutoff = now - _settings['JOB_RESULT_TTL']
+    db.session.execute(
+        db.delete(BackgroundJob).where(BackgroundJob.finished_at < cutoff))
+    db.session.commit()
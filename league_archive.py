@@ -0,0 +1,103 @@
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import sleeper_client
+from models import db, ArchivedLeague, ArchivedSeason
+
+
+def current_season():
+    return datetime.now().year
+
+
+def is_final(year, leagues):
+    """True once a season's league list can never change again.
+
+    The previous season only counts once all of its leagues are complete
+    (playoffs run into January); anything older is final as fetched.
+    """
+    if not isinstance(leagues, list):
+        return False
+    season = current_season()
+    if year <= season - 2:
+        return True
+    return year == season - 1 and all(
+        league.get('status') == 'complete' for league in leagues)
+
+
+def fetch_season(user_id, year):
+    """A user's leagues for one season straight from Sleeper, or None.
+
+    Bypasses the response cache: the league directory stamps what this
+    returns as fetched now, so a stale cached body would stay "fresh" in
+    the directory for another LEAGUE_DIRECTORY_TTL.
+    """
+    return sleeper_client.get_json(f"/user/{user_id}/leagues/nfl/{year}",
+                                   cache=False)
+
+
+def load(user_ids, years):
+    """Archived seasons for the given users and years.
+
+    Returns a dict of (user_id, year) -> league list for just the pairs
+    that are archived; everything else still has to be fetched.
+    """
+    user_ids = list(user_ids)
+    years = [year for year in years if year < current_season()]
+    found = {}
+    if not user_ids or not years:
+        return found
+    for start in range(0, len(user_ids), 400):
+        chunk = user_ids[start:start + 400]
+        for row in ArchivedSeason.query.filter(
+                ArchivedSeason.user_id.in_(chunk),
+                ArchivedSeason.season.in_(years)):
+            found[(row.user_id, row.season)] = []
+        for league in ArchivedLeague.query.filter(
+                ArchivedLeague.user_id.in_(chunk),
+                ArchivedLeague.season.in_(years)).order_by(
+                    ArchivedLeague.user_id, ArchivedLeague.season,
+                    ArchivedLeague.name):
+            found[(league.user_id, league.season)].append(league.to_dict())
+    return found
+
+
+def save(results):
+    """Archive every (user_id, year) -> leagues entry that is final."""
+    final = {
+        (user_id, year): leagues
+        for (user_id, year), leagues in results.items()
+        if is_final(year, leagues)
+    }
+    if not final:
+        return
+    now = time.time()
+    seasons = [{
+        'user_id': user_id,
+        'season': year,
+        'archived_at': now
+    } for user_id, year in final]
+    leagues = [{
+        'user_id': user_id,
+        'season': year,
+        'league_id': str(league['league_id']),
+        'name': league.get('name') or '',
+        'status': league.get('status'),
+        'best_ball': bool((league.get('settings') or {}).get('best_ball')),
+    } for (user_id, year), year_leagues in final.items()
+               for league in year_leagues if league.get('league_id')]
+    try:
+        if leagues:
+            db.session.execute(
+                sqlite_insert(ArchivedLeague.__table__).on_conflict_do_nothing(),
+                leagues)
+        db.session.execute(
+            sqlite_insert(ArchivedSeason.__table__).on_conflict_do_nothing(),
+            seasons)
+        db.session.commit()
+    except Exception as e:
+        # The archive only saves calls; never fail a comparison over it.
+        db.session.rollback()
+        logging.warning(f"League archive save failed: {e}")
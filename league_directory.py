@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import fanout
+import league_archive
+import sqlite_connections
+
+_settings = {
+    'LEAGUE_DIRECTORY_ENABLED': True,
+    'LEAGUE_DIRECTORY_PATH': 'league_directory.db',
+    # A user's season younger than this is served without asking Sleeper.
+    'LEAGUE_DIRECTORY_TTL': 15 * 60,
+    'LEAGUE_DIRECTORY_MAX_AGE': 7 * 24 * 3600,
+}
+
+_connections = sqlite_connections.ThreadConnections(
+    lambda: _settings['LEAGUE_DIRECTORY_PATH'])
+_lock = threading.Lock()
+_puts_since_evict = 0
+_EVICT_EVERY = 50
+
+# Per-process counters of user seasons served from the 'archive' (final
+# seasons in app.db), the 'directory' (recent fetches) or 'fetched'.
+_stats = {'archive': 0, 'directory': 0, 'fetched': 0}
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+    if _settings['LEAGUE_DIRECTORY_ENABLED']:
+        _create_schema()
+
+
+def _connect():
+    return _connections.connect()
+
+
+def _create_schema():
+    directory = os.path.dirname(_settings['LEAGUE_DIRECTORY_PATH'])
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _connections.connect(sqlite_connections.SETUP_TIMEOUT) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_season (
+                user_id TEXT NOT NULL,
+                season INTEGER NOT NULL,
+                body BLOB NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (user_id, season)
+            )""")
+
+
+def stats():
+    """Snapshot of this process's archive/directory/fetched counters."""
+    return dict(_stats)
+
+
+def slim_league(league):
+    """The subset of Sleeper's league object the app reads.
+
+    Same shape as ``ArchivedLeague.to_dict``, so routes never need to know
+    where a season came from.
+    """
+    return {
+        'league_id': str(league['league_id']),
+        'name': league.get('name') or '',
+        'season': str(league.get('season') or ''),
+        'status': league.get('status'),
+        'settings': {
+            'best_ball':
+            1 if (league.get('settings') or {}).get('best_ball') else 0
+        },
+    }
+
+
+def fetch_season(user_id, year):
+    """A user's slimmed leagues for one season from Sleeper, or None."""
+    leagues = league_archive.fetch_season(user_id, year)
+    if not isinstance(leagues, list):
+        return None
+    return [slim_league(league) for league in leagues
+            if isinstance(league, dict) and league.get('league_id')]
+
+
+def load(pairs):
+    """Fresh directory entries for (user_id, year) pairs.
+
+    Returns a dict of (user_id, year) -> league list for just the pairs
+    fetched within LEAGUE_DIRECTORY_TTL.
+    """
+    pairs = set(pairs)
+    found = {}
+    if not pairs or not _settings['LEAGUE_DIRECTORY_ENABLED']:
+        return found
+    user_ids = sorted({user_id for user_id, _ in pairs})
+    years = sorted({year for _, year in pairs})
+    cutoff = time.time() - _settings['LEAGUE_DIRECTORY_TTL']
+    try:
+        with _connect() as conn:
+            for start in range(0, len(user_ids), 400):
+                chunk = user_ids[start:start + 400]
+                rows = conn.execute(
+                    'SELECT user_id, season, body FROM user_season '
+                    f"WHERE user_id IN ({','.join('?' * len(chunk))}) "
+                    f"AND season IN ({','.join('?' * len(years))}) "
+                    'AND fetched_at >= ?', chunk + years + [cutoff]).fetchall()
+                for user_id, season, body in rows:
+                    if (user_id, season) not in pairs:
+                        continue
+                    try:
+                        found[(user_id, season)] = json.loads(
+                            zlib.decompress(body))
+                    except (zlib.error, ValueError):
+                        logging.warning(
+                            f"League directory entry for {user_id} "
+                            f"({season}) is corrupt")
+    except sqlite3.Error as e:
+        logging.warning(f"League directory read failed: {e}")
+    return found
+
+
+def save(results):
+    """Remember every fetched (user_id, year) -> leagues entry.
+
+    Final seasons go to the league archive instead, where they're kept
+    for good.
+    """
+    global _puts_since_evict
+    league_archive.save(results)
+    if not _settings['LEAGUE_DIRECTORY_ENABLED']:
+        return
+    now = time.time()
+    rows = [(user_id, year,
+             sqlite3.Binary(
+                 zlib.compress(
+                     json.dumps(leagues, separators=(',', ':')).encode())),
+             now) for (user_id, year), leagues in results.items()
+            if isinstance(leagues, list)
+            and not league_archive.is_final(year, leagues)]
+    if not rows:
+        return
+    try:
+        with _connect() as conn:
+            conn.executemany(
+                'INSERT INTO user_season (user_id, season, body, fetched_at) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT(user_id, season) DO UPDATE '
+                'SET body = excluded.body, '
+                'fetched_at = excluded.fetched_at', rows)
+    except sqlite3.Error as e:
+        logging.warning(f"League directory save failed: {e}")
+        return
+
+    with _lock:
+        _puts_since_evict += len(rows)
+        due = _puts_since_evict >= _EVICT_EVERY
+        if due:
+            _puts_since_evict = 0
+    if due:
+        evict()
+
+
+def evict():
+    """Drop seasons nobody has looked up in a long while."""
+    try:
+        with _connect() as conn:
+            conn.execute(
+                'DELETE FROM user_season WHERE fetched_at < ?',
+                (time.time() - _settings['LEAGUE_DIRECTORY_MAX_AGE'], ))
+    except sqlite3.Error as e:
+        logging.warning(f"League directory eviction failed: {e}")
+
+
+def _known(pairs):
+    """Stored seasons for ``pairs``: the archive first, then the directory."""
+    wanted = set(pairs)
+    user_ids = list(dict.fromkeys(user_id for user_id, _ in pairs))
+    years = list(dict.fromkeys(year for _, year in pairs))
+    known = {
+        pair: leagues
+        for pair, leagues in league_archive.load(user_ids, years).items()
+        if pair in wanted
+    }
+    _stats['archive'] += len(known)
+    recent = load(pair for pair in pairs if pair not in known)
+    _stats['directory'] += len(recent)
+    known.update(recent)
+    return known
+
+
+def iter_user_leagues(user_ids, years, concurrency=None):
+    """Yield ((user_id, year), league list or None) for every pair.
+
+    Stored seasons come first; the rest are fetched concurrently and
+    yielded as each call finishes, then saved once every fetch is done.
+    Callers apply their own status and best ball filters.
+    """
+    pairs = [(user_id, year) for user_id in user_ids for year in years]
+    known = _known(pairs)
+    for pair in pairs:
+        if pair in known:
+            yield pair, known[pair]
+
+    missing = [pair for pair in pairs if pair not in known]
+    fetched = {}
+    for pair, result in fanout.iter_map(fetch_season, missing, concurrency):
+        leagues = None if isinstance(result, Exception) else result
+        fetched[pair] = leagues
+        yield pair, leagues
+
+    _stats['fetched'] += len(missing)
+    if missing:
+        logging.info(f"League directory: {len(known)}/{len(pairs)} "
+                     f"user seasons served locally")
+    save(fetched)
+
+
+def fetch_user_leagues(user_ids, years, concurrency=None):
+    """Dict of (user_id, year) -> league list (None where a fetch failed)."""
+    return dict(iter_user_leagues(user_ids, years, concurrency))
+
+
+def user_leagues(user_id, year):
+    """One user's leagues for one season, or None if Sleeper failed."""
+    pair = (user_id, year)
+    known = _known([pair])
+    if pair in known:
+        return known[pair]
+    leagues = fetch_season(user_id, year)
+    _stats['fetched'] += 1
+    save({pair: leagues})
+    return leagues
+
+
+async def fetch_user_seasons(engine, user_id, years):
+    """``iter_user_leagues`` for one user on a running FanOut engine.
+
+    Returns a dict of year -> league list or None.
+    """
+    pairs = [(user_id, year) for year in years]
+    known = _known(pairs)
+    missing = [pair for pair in pairs if pair not in known]
+    fetched = await engine.map(fetch_season, missing)
+    fetched = {
+        pair: (None if isinstance(result, Exception) else result)
+        for pair, result in fetched.items()
+    }
+    _stats['fetched'] += len(missing)
+    save(fetched)
+    known.update(fetched)
+    return {year: known[(user_id, year)] for year in years}
@@ -0,0 +1,468 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import g, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as OrmSession
+
+import rate_limiter
+import roster_sync
+import sleeper_cache
+
+_settings = {
+    'METRICS_ENABLED': True,
+    # Requests slower than this are logged at WARNING instead of INFO.
+    'METRICS_SLOW_REQUEST_MS': 2000,
+}
+
+timing_log = logging.getLogger('timing')
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Per-request phase totals; set for the duration of a request and carried
+# into worker threads by ``bind``.
+_current = ContextVar('request_timings', default=None)
+
+
+class Histogram:
+    """A Prometheus-style cumulative histogram with optional labels."""
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labelnames = labelnames
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [
+                    [0] * (len(self.buckets) + 1), 0.0
+                ]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram"
+        ]
+        with self._lock:
+            series = {labels: (list(counts), total)
+                      for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            base = [f'{name}="{value}"'
+                    for name, value in zip(self.labelnames, labels)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf', ), counts):
+                cumulative += count
+                label_text = ','.join(base + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{label_text}}} {cumulative}")
+            suffix = f"{{{','.join(base)}}}" if base else ''
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+HTTP_DURATION = Histogram('http_request_duration_seconds',
+                          'Request handling time, including streamed bodies.',
+                          DURATION_BUCKETS, ('route', 'method', 'status'))
+SLEEPER_DURATION = Histogram('sleeper_request_duration_seconds',
+                             'Outbound Sleeper API round trips.',
+                             DURATION_BUCKETS, ('endpoint', 'status'))
+RATE_LIMIT_WAIT = Histogram('sleeper_rate_limit_wait_seconds',
+                            'Time outbound calls waited for a token.',
+                            DURATION_BUCKETS, ('priority', ))
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds',
+                              'SQL statement execution time.',
+                              DURATION_BUCKETS)
+DB_COMMIT_DURATION = Histogram('db_commit_duration_seconds',
+                               'ORM session commit time, including flush.',
+                               DURATION_BUCKETS)
+SESSION_DURATION = Histogram('flask_session_duration_seconds',
+                             'Server-side session load/save time.',
+                             DURATION_BUCKETS, ('op', ))
+SESSION_BYTES = Histogram('flask_session_bytes',
+                          'Serialized server-side session size.',
+                          SIZE_BUCKETS, ('op', ))
+RENDER_DURATION = Histogram('template_render_duration_seconds',
+                            'Jinja template render time.', DURATION_BUCKETS,
+                            ('template', ))
+
+HISTOGRAMS = [
+    HTTP_DURATION, SLEEPER_DURATION, RATE_LIMIT_WAIT, DB_QUERY_DURATION,
+    DB_COMMIT_DURATION, SESSION_DURATION, SESSION_BYTES, RENDER_DURATION
+]
+
+
+class RequestTimings:
+    """Phase totals (seconds and counts) for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.sizes = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds, count=1):
+        with self._lock:
+            totals = self.phases.setdefault(phase, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += count
+
+    def add_size(self, name, size):
+        with self._lock:
+            self.sizes[name] = self.sizes.get(name, 0) + size
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Value for the Server-Timing response header."""
+        with self._lock:
+            phases = sorted(self.phases.items())
+        parts = [
+            f'{phase};dur={seconds * 1000:.1f};desc="{count}x"'
+            for phase, (seconds, count) in phases
+        ]
+        parts.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(parts)
+
+    def log_fields(self):
+        with self._lock:
+            phases = dict(self.phases)
+        fields = {}
+        for phase, (seconds, count) in sorted(phases.items()):
+            fields[f'{phase}_ms'] = round(seconds * 1000, 1)
+            fields[f'{phase}_count'] = count
+        with self._lock:
+            fields.update(self.sizes)
+        return fields
+
+
+def enabled():
+    return _settings['METRICS_ENABLED']
+
+
+def _add(phase, seconds, count=1):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds, count)
+
+
+def _add_size(name, size):
+    timings = _current.get()
+    if timings is not None:
+        timings.add_size(name, size)
+
+
+def current_timings():
+    """This request's RequestTimings, or None outside a timed request."""
+    return _current.get()
+
+
+def bind(fn):
+    """Wrap ``fn`` so calls from a worker thread count toward this request."""
+    timings = _current.get()
+    if timings is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        token = _current.set(timings)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return bound
+
+
+def observe_sleeper(path, status, seconds):
+    """Record one outbound Sleeper round trip."""
+    if not _settings['METRICS_ENABLED']:
+        return
+    SLEEPER_DURATION.observe(seconds, sleeper_cache.classify(path)[0],
+                             str(status))
+    _add('sleeper', seconds)
+
+
+def observe_rate_limit_wait(priority, seconds):
+    if not _settings['METRICS_ENABLED']:
+        return
+    RATE_LIMIT_WAIT.observe(seconds,
+                            rate_limiter.PRIORITY_NAMES.get(priority, 'bulk'))
+    if seconds:
+        _add('ratelimit', seconds)
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+    if not _settings['METRICS_ENABLED']:
+        # Nothing is hooked in, so a disabled build pays only for the
+        # enabled() checks in observe_*.
+        return
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_clear_request)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+    _instrument_session(app)
+    _instrument_db()
+
+
+def _start_request():
+    timings = RequestTimings()
+    session_load = g.pop('metrics_session_load', None)
+    if session_load:
+        seconds, size = session_load
+        timings.started -= seconds
+        timings.add('session_load', seconds)
+        if size is not None:
+            timings.add_size('session_load_bytes', size)
+    g.metrics_token = _current.set(timings)
+
+
+def _finish_request(response):
+    timings = _current.get()
+    if timings is not None:
+        # Session save (and any streamed body) happen after this, so they
+        # only show up in the timing log and histograms, not the header.
+        response.headers['Server-Timing'] = timings.server_timing()
+        g.metrics_status = response.status_code
+    return response
+
+
+def _clear_request(exc):
+    token = g.pop('metrics_token', None)
+    if token is None:
+        return
+    timings = _current.get()
+    _current.reset(token)
+
+    elapsed = timings.elapsed()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = g.pop('metrics_status', 500)
+    HTTP_DURATION.observe(elapsed, route, request.method, str(status))
+
+    fields = {
+        'method': request.method,
+        'route': route,
+        'status': status,
+        'total_ms': round(elapsed * 1000, 1),
+    }
+    fields.update(timings.log_fields())
+    level = (logging.WARNING
+             if elapsed * 1000 >= _settings['METRICS_SLOW_REQUEST_MS'] else
+             logging.INFO)
+    timing_log.log(level, json.dumps(fields))
+
+
+def _render_started(sender, template, context, **extra):
+    g.setdefault('metrics_render_started', []).append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra):
+    started = g.get('metrics_render_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    RENDER_DURATION.observe(seconds, template.name or 'string')
+    _add('render', seconds)
+
+
+_session_io = threading.local()
+
+
+def _instrument_session(app):
+    """Time session load/save and measure the serialized payloads."""
+    interface = app.session_interface
+    interface.open_session = _timed_session_op(interface.open_session, 'load')
+    interface.save_session = _timed_session_op(interface.save_session, 'save')
+
+    # Flask-Session (0.6+) serializes through ``interface.serializer``,
+    # except the filesystem backend, which hands dicts to cachelib's
+    # FileSystemCache and its pickle-to-file serializer.
+    serializer = getattr(interface, 'serializer', None)
+    if serializer is not None and hasattr(serializer, 'encode'):
+        encode = serializer.encode
+        decode = serializer.decode
+
+        def measured_encode(session):
+            data = encode(session)
+            _note_session_bytes(len(data))
+            return data
+
+        def measured_decode(data):
+            _note_session_bytes(len(data))
+            return decode(data)
+
+        serializer.encode = measured_encode
+        serializer.decode = measured_decode
+
+    file_serializer = getattr(getattr(interface, 'cache', None), 'serializer',
+                              None)
+    if file_serializer is not None and hasattr(file_serializer, 'dump'):
+        dump = file_serializer.dump
+        load = file_serializer.load
+
+        def measured_dump(value, f, *args, **kwargs):
+            start = f.tell()
+            result = dump(value, f, *args, **kwargs)
+            _note_session_bytes(f.tell() - start)
+            return result
+
+        def measured_load(f, *args, **kwargs):
+            start = f.tell()
+            result = load(f, *args, **kwargs)
+            _note_session_bytes(f.tell() - start)
+            return result
+
+        file_serializer.dump = measured_dump
+        file_serializer.load = measured_load
+
+
+def _timed_session_op(fn, op):
+
+    def timed(*args):
+        _session_io.sizes = []
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            seconds = time.perf_counter() - started
+            SESSION_DURATION.observe(seconds, op)
+            # cachelib also reads/writes a tiny bookkeeping file during
+            # session I/O; the session itself is the largest payload.
+            sizes = _session_io.sizes
+            _session_io.sizes = None
+            size = max(sizes) if sizes else None
+            if size is not None:
+                SESSION_BYTES.observe(size, op)
+
+            if op == 'load':
+                # The session opens before before_request starts this
+                # request's timings; hand the numbers over through g.
+                g.metrics_session_load = (seconds, size)
+            else:
+                _add('session_save', seconds)
+                if size is not None:
+                    _add_size('session_save_bytes', size)
+
+    return timed
+
+
+def _note_session_bytes(size):
+    sizes = getattr(_session_io, 'sizes', None)
+    if sizes is not None:
+        sizes.append(size)
+
+
+_db_instrumented = False
+
+
+def _instrument_db():
+    global _db_instrumented
+    if _db_instrumented:
+        return
+    _db_instrumented = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        conn.info.setdefault('metrics_query_started',
+                             []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context,
+                             executemany):
+        started = conn.info.get('metrics_query_started')
+        if started:
+            seconds = time.perf_counter() - started.pop()
+            DB_QUERY_DURATION.observe(seconds)
+            _add('db', seconds)
+
+    @event.listens_for(Engine, 'handle_error')
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('metrics_query_started'):
+            conn.info['metrics_query_started'].pop()
+
+    @event.listens_for(OrmSession, 'before_commit')
+    def before_commit(session):
+        session.info['metrics_commit_started'] = time.perf_counter()
+
+    @event.listens_for(OrmSession, 'after_commit')
+    def after_commit(session):
+        started = session.info.pop('metrics_commit_started', None)
+        if started is not None:
+            seconds = time.perf_counter() - started
+            DB_COMMIT_DURATION.observe(seconds)
+            _add('db_commit', seconds)
+
+
+def _sample_lines(name, help_text, kind, samples):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else
+                     f"{name} {value}")
+    return lines
+
+
+def render():
+    """All metrics for this worker process in Prometheus text format."""
+    # Not imported at the top: league_directory -> fanout -> sleeper_client
+    # -> metrics would be circular.
+    import league_directory
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    limiter = rate_limiter.stats()
+    lines.extend(
+        _sample_lines('sleeper_rate_limit_queue_depth',
+                      'Outbound calls waiting for a token right now.', 'gauge',
+                      [({'priority': name}, depth) for name, depth in
+                       sorted(limiter['queue_depth'].items())]))
+    lines.extend(
+        _sample_lines('sleeper_rate_limited_total',
+                      'Responses Sleeper answered with 429.', 'counter',
+                      [({}, limiter['rate_limited'])]))
+
+    cache_samples = []
+    for endpoint, counters in sorted(sleeper_cache.stats().items()):
+        for outcome, count in sorted(counters.items()):
+            cache_samples.append(({'endpoint': endpoint,
+                                   'outcome': outcome}, count))
+    lines.extend(
+        _sample_lines('sleeper_cache_lookups_total',
+                      'Response cache lookups by endpoint class and outcome.',
+                      'counter', cache_samples))
+    lines.extend(
+        _sample_lines('roster_snapshot_lookups_total',
+                      'Roster lookups by how the league snapshot was served.',
+                      'counter', [({'outcome': outcome}, count)
+                                  for outcome, count in sorted(
+                                      roster_sync.stats().items())]))
+    lines.extend(
+        _sample_lines('league_directory_lookups_total',
+                      'User seasons by where their league list came from.',
+                      'counter', [({'source': source}, count)
+                                  for source, count in sorted(
+                                      league_directory.stats().items())]))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,68 @@
+"""Idempotent schema upgrades for databases created by older versions.
+
+``db.create_all()`` creates missing tables but never touches existing ones,
+so an ``app.db`` from before the indexes were added needs this pass. It is
+safe to run on every start-up; each step checks before it acts.
+
+Run manually with ``python migrations.py``.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+from models import db, PlayerLeagueAssociation, UserSearch
+
+
+def _dedupe_user_search(conn):
+    # Keep the newest row per username so the unique index can be built.
+    result = conn.execute(
+        text("""
+        DELETE FROM user_search
+        WHERE id NOT IN (SELECT MAX(id) FROM user_search GROUP BY username)
+        """))
+    return result.rowcount
+
+
+def _dedupe_associations(conn):
+    result = conn.execute(
+        text("""
+        DELETE FROM player_league_association
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM player_league_association
+            GROUP BY user_id, league_id, player_id)
+        """))
+    return result.rowcount
+
+
+def upgrade(engine):
+    """Bring an existing database up to the current models' indexes."""
+    with engine.begin() as conn:
+        existing = {
+            table: {index['name'] for index in inspect(conn).get_indexes(table)}
+            for table in ('user_search', 'player_league_association')
+        }
+        for table, model, dedupe in (
+            ('user_search', UserSearch, _dedupe_user_search),
+            ('player_league_association', PlayerLeagueAssociation,
+             _dedupe_associations),
+        ):
+            missing = [
+                index for index in model.__table__.indexes
+                if index.name not in existing[table]
+            ]
+            if not missing:
+                continue
+            if any(index.unique for index in missing):
+                removed = dedupe(conn)
+                if removed:
+                    logging.info(f"Removed {removed} duplicate rows from {table}")
+            for index in missing:
+                index.create(conn)
+                logging.info(f"Created index {index.name}")
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        upgrade(db.engine)
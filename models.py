@@ -1,7 +1,63 @@
+import sqlite3
+import time
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+import sqlite_connections
 
 db = SQLAlchemy()
 
+# Longest a writer waits on app.db's lock. SQLite's busy handler sleeps in
+# C, which under gevent stalls the whole worker, so there it only waits
+# _COOPERATIVE_TIMEOUT and write_with_retry() keeps trying from a
+# cooperative sleep.
+WRITE_TIMEOUT = 5
+_COOPERATIVE_TIMEOUT = 0.05
+_LOCKED_RETRY = 0.05
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent web traffic.
+
+    WAL lets readers proceed while a search is writing, and busy_timeout
+    makes writers wait for the lock instead of failing immediately.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    timeout = (_COOPERATIVE_TIMEOUT
+               if sqlite_connections.cooperative() else WRITE_TIMEOUT)
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={int(timeout * 1000)}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-16000')
+    cursor.close()
+
+
+def write_with_retry(write, *args):
+    """Run ``write(*args)``, a whole transaction including its commit.
+
+    Retried (after a rollback) while app.db is locked, for up to
+    WRITE_TIMEOUT seconds; the sleep between attempts yields under gevent.
+    """
+    deadline = time.monotonic() + WRITE_TIMEOUT
+    while True:
+        try:
+            return write(*args)
+        except OperationalError as e:
+            db.session.rollback()
+            if (not sqlite_connections.is_locked(e.orig)
+                    or time.monotonic() >= deadline):
+                raise
+        time.sleep(_LOCKED_RETRY)
+
+
 class SleeperPlayer(db.Model):
     id = db.Column(db.String, primary_key=True)
     name = db.Column(db.String(100))
@@ -11,14 +67,113 @@ class SleeperPlayer(db.Model):
         return f'<SleeperPlayer {self.name}>'
 
 class UserSearch(db.Model):
+    __table_args__ = (db.Index('ix_user_search_username',
+                               'username',
+                               unique=True), )
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String)
     user_id = db.Column(db.String)
 
+    @classmethod
+    def upsert(cls, username, user_id):
+        """Insert or update the user_id for a username (no commit)."""
+        stmt = sqlite_insert(cls.__table__).values(username=username,
+                                                   user_id=user_id)
+        stmt = stmt.on_conflict_do_update(index_elements=['username'],
+                                          set_={'user_id': user_id})
+        db.session.execute(stmt)
+
 class PlayerLeagueAssociation(db.Model):
+    __table_args__ = (
+        db.Index('ix_player_league_association_user_player', 'user_id',
+                 'player_id'),
+        db.Index('ix_player_league_association_user_league_player',
+                 'user_id',
+                 'league_id',
+                 'player_id',
+                 unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String)
     league_id = db.Column(db.String)
     player_id = db.Column(db.String, db.ForeignKey('sleeper_player.id'))
 
     player = db.relationship('SleeperPlayer', backref=db.backref('leagues', lazy=True))
+
+
+class LeagueRosterFingerprint(db.Model):
+    """Hash of a user's roster in one league, as of the last fetch."""
+    user_id = db.Column(db.String, primary_key=True)
+    league_id = db.Column(db.String, primary_key=True)
+    fingerprint = db.Column(db.String(40), nullable=False)
+    checked_at = db.Column(db.Float, nullable=False)
+
+
+class PlayerExposureCount(db.Model):
+    """Number of a user's associated leagues that roster each player.
+
+    Kept in step with PlayerLeagueAssociation by applying deltas, so a
+    refresh that changes one league only touches that league's players.
+    """
+    user_id = db.Column(db.String, primary_key=True)
+    player_id = db.Column(db.String, primary_key=True)
+    league_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class BackgroundJob(db.Model):
+    """A queued or finished background computation (see jobs.py)."""
+    __table_args__ = (
+        # At most one active job per key, so identical requests coalesce.
+        db.Index('ix_background_job_active_key',
+                 'key',
+                 unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'running')")),
+        db.Index('ix_background_job_key_finished', 'key', 'finished_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    key = db.Column(db.String(40), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    progress = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)
+    finished_at = db.Column(db.Float)
+
+
+class ArchivedSeason(db.Model):
+    """Marks a user's completed season as archived (see league_archive.py).
+
+    Kept separately from the leagues so a season with no leagues is still
+    known to be archived.
+    """
+    user_id = db.Column(db.String, primary_key=True)
+    season = db.Column(db.Integer, primary_key=True)
+    archived_at = db.Column(db.Float, nullable=False)
+
+
+class ArchivedLeague(db.Model):
+    """One league a user was in for a completed season."""
+    user_id = db.Column(db.String, primary_key=True)
+    season = db.Column(db.Integer, primary_key=True)
+    league_id = db.Column(db.String, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    status = db.Column(db.String(20))
+    best_ball = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        """The subset of Sleeper's league object the app reads."""
+        return {
+            'league_id': self.league_id,
+            'name': self.name,
+            'season': str(self.season),
+            'status': self.status,
+            'settings': {
+                'best_ball': 1 if self.best_ball else 0
+            },
+        }
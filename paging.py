@@ -0,0 +1,83 @@
+import base64
+import binascii
+import json
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class PagingError(ValueError):
+    """A sort, limit or cursor parameter the endpoint can't honour."""
+
+
+def encode_cursor(key):
+    raw = json.dumps(list(key), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise PagingError('Invalid cursor')
+    if not isinstance(key, list):
+        raise PagingError('Invalid cursor')
+    return tuple(key)
+
+
+def parse_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise PagingError('limit must be a number')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def parse_sort(args, sorts, default):
+    """(key function, descending) for the ``sort`` argument.
+
+    ``sorts`` maps sort names to key functions; a leading '-' sorts
+    descending. Keys must be unique per row (end them with an id) and
+    JSON-friendly, since the last one on a page becomes the cursor.
+    """
+    sort = args.get('sort') or default
+    descending = sort.startswith('-')
+    key = sorts.get(sort.lstrip('-'))
+    if key is None:
+        raise PagingError(f"sort must be one of: {', '.join(sorted(sorts))}")
+    return key, descending
+
+
+def paginate(rows, key, descending=False, cursor=None, limit=DEFAULT_LIMIT):
+    """One keyset page of ``rows``: (page, next cursor or None, total).
+
+    The cursor names the last row served rather than an offset, so
+    paging stays stable if the rows are rebuilt between requests.
+    """
+    rows = sorted(rows, key=key, reverse=descending)
+    start = 0
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            for row in rows:
+                row_key = key(row)
+                if (row_key < after) if descending else (row_key > after):
+                    break
+                start += 1
+        except TypeError:
+            # A cursor from a different sort order.
+            raise PagingError('Invalid cursor')
+    page = rows[start:start + limit]
+    next_cursor = None
+    if start + limit < len(rows):
+        next_cursor = encode_cursor(key(page[-1]))
+    return page, next_cursor, len(rows)
+
+
+def parse_list(args, name):
+    """Values of a repeatable and/or comma-separated argument."""
+    values = []
+    for value in args.getlist(name):
+        values.extend(part.strip() for part in value.split(',') if part.strip())
+    return values
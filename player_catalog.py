@@ -0,0 +1,270 @@
+import fcntl
+import json
+import logging
+import os
+import sys
+import re
+import threading
+import time
+import unicodedata
+from array import array
+
+import sleeper_client
+
+_settings = {
+    'PLAYER_CATALOG_PATH': 'player_catalog.json',
+    'PLAYER_CATALOG_REFRESH_SECONDS': 24 * 3600,
+}
+
+_catalog = None
+_load_lock = threading.Lock()
+_refresher = None
+
+
+class PlayerCatalog:
+    """Read-only, column-oriented view of the NFL player list.
+
+    Only id, full name, position and team are kept. Positions and teams are
+    stored as small integer codes into shared symbol tables, and every
+    string is interned, so the whole catalog is a few MB instead of the
+    tens of MB the raw /players/nfl JSON takes once decoded.
+    """
+
+    def __init__(self, ids, names, positions, teams, fetched_at):
+        self.fetched_at = fetched_at
+        self.ids = [sys.intern(pid) for pid in ids]
+        self.names = [sys.intern(name) for name in names]
+        self._position_symbols, self._position_codes = _encode(positions)
+        self._team_symbols, self._team_codes = _encode(teams)
+        self._row_by_id = {pid: row for row, pid in enumerate(self.ids)}
+        self._ids_by_name = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, player_id):
+        return player_id in self._row_by_id
+
+    def row(self, player_id):
+        return self._row_by_id.get(player_id)
+
+    def position(self, row):
+        return self._position_symbols[self._position_codes[row]]
+
+    def team(self, row):
+        return self._team_symbols[self._team_codes[row]]
+
+    def get(self, player_id):
+        """Return {'id', 'full_name', 'position', 'team'} or None."""
+        row = self._row_by_id.get(player_id)
+        if row is None:
+            return None
+        return {
+            'id': self.ids[row],
+            'full_name': self.names[row],
+            'position': self.position(row),
+            'team': self.team(row),
+        }
+
+    def ids_for_name(self, name):
+        """Return the set of player ids whose normalized name matches."""
+        if self._ids_by_name is None:
+            index = {}
+            for pid, full_name in zip(self.ids, self.names):
+                index.setdefault(normalize_name(full_name), set()).add(pid)
+            self._ids_by_name = index
+        return self._ids_by_name.get(normalize_name(name), set())
+
+    def to_columns(self):
+        return {
+            'fetched_at': self.fetched_at,
+            'ids': self.ids,
+            'names': self.names,
+            'positions': [self.position(row) for row in range(len(self))],
+            'teams': [self.team(row) for row in range(len(self))],
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        return cls(columns['ids'], columns['names'], columns['positions'],
+                   columns['teams'], columns['fetched_at'])
+
+    @classmethod
+    def from_sleeper(cls, raw_players, fetched_at=None):
+        """Build a catalog from the raw /players/nfl payload."""
+        ids, names, positions, teams = [], [], [], []
+        for player_id, data in raw_players.items():
+            if not isinstance(data, dict):
+                continue
+            ids.append(str(player_id))
+            names.append(_full_name(data))
+            positions.append(data.get('position') or 'Unknown')
+            teams.append(data.get('team') or '')
+        return cls(ids, names, positions, teams, fetched_at or time.time())
+
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(name):
+    """Fold case, accents and punctuation: "D'Andre Swift" -> "dandre swift"."""
+    folded = unicodedata.normalize('NFKD', name or '')
+    folded = ''.join(c for c in folded if not unicodedata.combining(c))
+    folded = folded.lower().replace("'", '').replace('.', '')
+    return _NON_ALNUM.sub(' ', folded).strip()
+
+
+def _encode(values):
+    symbols = []
+    codes_by_symbol = {}
+    codes = array('H')
+    for value in values:
+        code = codes_by_symbol.get(value)
+        if code is None:
+            code = codes_by_symbol[value] = len(symbols)
+            symbols.append(sys.intern(value))
+        codes.append(code)
+    return symbols, codes
+
+
+def _full_name(data):
+    name = data.get('full_name')
+    if name:
+        return name
+    name = ' '.join(
+        part for part in (data.get('first_name'), data.get('last_name'))
+        if part)
+    return name or data.get('name') or 'Unknown Player'
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+
+
+def _is_fresh(fetched_at):
+    return time.time() - fetched_at < _settings['PLAYER_CATALOG_REFRESH_SECONDS']
+
+
+def _read_file():
+    path = _settings['PLAYER_CATALOG_PATH']
+    try:
+        with open(path, encoding='utf-8') as f:
+            return PlayerCatalog.from_columns(json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Ignoring unreadable player catalog {path}: {e}")
+        return None
+
+
+def _write_file(catalog):
+    path = _settings['PLAYER_CATALOG_PATH']
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog.to_columns(), f, separators=(',', ':'))
+    # Atomic on POSIX: other workers see either the old or the new file.
+    os.replace(tmp_path, path)
+
+
+def _download():
+    resp = sleeper_client.get('/players/nfl', cache=False)
+    if resp.status_code != 200:
+        raise ValueError(f"Error fetching player list: {resp.status_code}")
+    return PlayerCatalog.from_sleeper(resp.json())
+
+
+def _lock_exclusive(lock_file):
+    # Poll rather than block in flock(): a gevent worker would otherwise
+    # stall every request while another worker downloads the catalog.
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            time.sleep(0.1)
+
+
+def _load(force_refresh=False):
+    """Return a fresh catalog, from the shared file if possible.
+
+    Only one worker downloads at a time; the others wait on the file lock
+    and then pick up the file it wrote.
+    """
+    catalog = _read_file()
+    if catalog and not force_refresh and _is_fresh(catalog.fetched_at):
+        return catalog
+    seen = catalog.fetched_at if catalog else 0
+
+    lock_path = f"{_settings['PLAYER_CATALOG_PATH']}.lock"
+    with open(lock_path, 'w') as lock_file:
+        _lock_exclusive(lock_file)
+        try:
+            # Another worker may have refreshed the file while we waited.
+            on_disk = _read_file()
+            if on_disk and _is_fresh(on_disk.fetched_at) and (
+                    not force_refresh or on_disk.fetched_at > seen):
+                return on_disk
+            fresh = _download()
+            _write_file(fresh)
+            logging.info(f"Player catalog refreshed ({len(fresh)} players)")
+            return fresh
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_catalog():
+    """Return the process-wide catalog, loading it on first use.
+
+    Falls back to an empty catalog if nothing is on disk and Sleeper is
+    unreachable, so lookups simply miss instead of failing the request.
+    """
+    global _catalog
+    if _catalog is None:
+        with _load_lock:
+            if _catalog is None:
+                try:
+                    _catalog = _load()
+                except Exception as e:
+                    logging.error(f"Error loading player catalog: {e}")
+                    # Serve what we have; the refresher retries shortly.
+                    _catalog = _read_file() or PlayerCatalog([], [], [], [],
+                                                             0)
+                _start_refresher()
+    return _catalog
+
+
+def refresh(force=True):
+    """Rebuild the catalog and swap it in; readers never see a partial one."""
+    global _catalog
+    new_catalog = _load(force_refresh=force)
+    _catalog = new_catalog
+    return new_catalog
+
+
+def _refresh_loop():
+    interval = _settings['PLAYER_CATALOG_REFRESH_SECONDS']
+    while True:
+        catalog = _catalog
+        age = time.time() - catalog.fetched_at if catalog else interval
+        time.sleep(max(60, interval - age))
+        try:
+            # Pick up a newer file written by another worker, or download.
+            refresh(force=False)
+        except Exception as e:
+            logging.error(f"Background player catalog refresh failed: {e}")
+
+
+def _start_refresher():
+    global _refresher
+    if _refresher is None:
+        _refresher = threading.Thread(target=_refresh_loop,
+                                      name='player-catalog-refresh',
+                                      daemon=True)
+        _refresher.start()
+
+
+def get_player(player_id):
+    """Look up one player by Sleeper id."""
+    return get_catalog().get(str(player_id))
@@ -0,0 +1,224 @@
+import codecs
+import json
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import sleeper_client
+from models import db, SleeperPlayer
+
+_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = ' \t\n\r'
+
+
+class _JsonObjectStream:
+    """Incrementally walks the members of one top-level JSON object.
+
+    Only the current member's text is buffered, so a dump of any size is
+    parsed in roughly constant memory.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self):
+        if self._eof:
+            return False
+        # Drop what's already been consumed before growing the buffer.
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self._buf += self._text.decode(chunk)
+                return True
+        self._buf += self._text.decode(b'', final=True)
+        self._eof = True
+        return False
+
+    def _peek(self):
+        """Next non-whitespace character (not consumed), or '' at the end."""
+        while True:
+            while (self._pos < len(self._buf)
+                   and self._buf[self._pos] in _WHITESPACE):
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read_more():
+                return ''
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in player dump, got {found!r}")
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._read_more():
+                    raise
+                continue
+            # A number or literal cut off at the buffer's edge may still
+            # continue in the next chunk.
+            if end == len(self._buf) and not self._eof:
+                self._read_more()
+                continue
+            self._pos = end
+            return value
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            yield key, self._value()
+            if self._peek() == ',':
+                self._pos += 1
+                continue
+            self._expect('}')
+            return
+
+
+def iter_json_object(chunks):
+    """Yield (key, value) for each member of a JSON object given as bytes chunks."""
+    return iter(_JsonObjectStream(chunks))
+
+
+def player_row(player_id, data):
+    """(name, position) as stored in SleeperPlayer for one dump record."""
+    data = data or {}
+    name = data.get('full_name') or ' '.join(
+        part for part in (data.get('first_name'), data.get('last_name'))
+        if part)
+    return (name or 'Unknown Player')[:100], (data.get('position') or '')[:50]
+
+
+@dataclass
+class IngestReport:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        return (f"{self.inserted} inserted, {self.updated} updated, "
+                f"{self.deleted} deleted, {self.unchanged} unchanged "
+                f"in {self.seconds:.1f}s")
+
+
+def _apply_batch(batch, report):
+    """Diff one batch of {id: (name, position)} against the table."""
+    table = SleeperPlayer.__table__
+    existing = {
+        row.id: (row.name, row.position)
+        for row in db.session.execute(
+            db.select(table.c.id, table.c.name, table.c.position).where(
+                table.c.id.in_(list(batch))))
+    }
+    changed = []
+    for player_id, row in batch.items():
+        stored = existing.get(player_id)
+        if stored == row:
+            report.unchanged += 1
+            continue
+        if stored is None:
+            report.inserted += 1
+        else:
+            report.updated += 1
+        changed.append({
+            'id': player_id,
+            'name': row[0],
+            'position': row[1]
+        })
+    if not changed:
+        return
+    stmt = sqlite_insert(table)
+    db.session.execute(
+        stmt.on_conflict_do_update(index_elements=['id'],
+                                   set_={
+                                       'name': stmt.excluded.name,
+                                       'position': stmt.excluded.position
+                                   }), changed)
+    db.session.commit()
+
+
+def _delete_missing(seen, batch_size, report):
+    table = SleeperPlayer.__table__
+    stored_ids = [
+        player_id for (player_id, ) in db.session.execute(db.select(table.c.id))
+    ]
+    missing = [player_id for player_id in stored_ids if player_id not in seen]
+    for start in range(0, len(missing), batch_size):
+        chunk = missing[start:start + batch_size]
+        db.session.execute(table.delete().where(table.c.id.in_(chunk)))
+        db.session.commit()
+    report.deleted = len(missing)
+
+
+def ingest_players(records, batch_size=500, delete_missing=True):
+    """Bring SleeperPlayer in line with an iterable of (player_id, record).
+
+    Records are compared against the stored rows a batch at a time and
+    only inserts, updates and deletes are written, each batch in its own
+    short transaction so readers (and other writers) are never blocked
+    for long. Rows missing from ``records`` are deleted at the end, only
+    once the whole input has been read.
+    """
+    started = time.perf_counter()
+    report = IngestReport()
+    seen = set()
+    batch = {}
+    try:
+        for player_id, data in records:
+            player_id = str(player_id)
+            seen.add(player_id)
+            batch[player_id] = player_row(player_id, data)
+            if len(batch) >= batch_size:
+                _apply_batch(batch, report)
+                batch = {}
+        if batch:
+            _apply_batch(batch, report)
+        if delete_missing and seen:
+            _delete_missing(seen, batch_size, report)
+    except Exception:
+        db.session.rollback()
+        raise
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def ingest_from_sleeper(batch_size=500):
+    """Stream ``/players/nfl`` straight from Sleeper into SleeperPlayer."""
+    resp = sleeper_client.get('/players/nfl', cache=False, stream=True)
+    try:
+        resp.raise_for_status()
+        report = ingest_players(
+            iter_json_object(resp.iter_content(chunk_size=_CHUNK_SIZE)),
+            batch_size)
+    finally:
+        resp.close()
+    logging.info(f"Player ingest from Sleeper: {report}")
+    return report
+
+
+def ingest_from_file(path, batch_size=500):
+    """Ingest a saved ``/players/nfl`` dump from disk."""
+    with open(path, 'rb') as f:
+        report = ingest_players(
+            iter_json_object(iter(lambda: f.read(_CHUNK_SIZE), b'')),
+            batch_size)
+    logging.info(f"Player ingest from {path}: {report}")
+    return report
@@ -0,0 +1,136 @@
+import bisect
+import threading
+from array import array
+from collections import Counter
+from itertools import chain
+
+import player_catalog
+from player_catalog import normalize_name
+
+_lock = threading.Lock()
+_index = None
+
+
+class PlayerSearchIndex:
+    """Prefix and trigram index over the player catalog's names.
+
+    Names are normalized with ``normalize_name`` (case, accent and
+    punctuation folded), so "ja'marr" finds "Ja'Marr Chase" and "mahomes"
+    finds "Patrick Mahomes".
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.normalized = [normalize_name(name) for name in catalog.names]
+        # Sorted (token, row) pairs for prefix lookups on any name token,
+        # plus the whole normalized name so "patrick ma" also matches.
+        keys = []
+        trigrams = {}
+        self._gram_counts = array('H')
+        for row, name in enumerate(self.normalized):
+            grams = _trigrams(name) if name else ()
+            self._gram_counts.append(len(grams))
+            if not name:
+                continue
+            keys.append((name, row))
+            for token in name.split()[1:]:
+                keys.append((token, row))
+            for gram in grams:
+                trigrams.setdefault(gram, []).append(row)
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._rows = [row for _, row in keys]
+        self._trigrams = trigrams
+        self._common_gram_limit = max(200, len(catalog) // 20)
+
+    def _prefix_rows(self, prefix, max_rows=200):
+        rows = set()
+        start = bisect.bisect_left(self._keys, prefix)
+        for i in range(start, len(self._keys)):
+            if not self._keys[i].startswith(prefix) or len(rows) >= max_rows:
+                break
+            rows.add(self._rows[i])
+        return rows
+
+    def _fuzzy_rows(self, query, min_similarity=0.3):
+        grams = _trigrams(query)
+        if not grams:
+            return {}
+        # Grams shared by a large slice of the catalog (" ma", "es ") add
+        # little signal and dominate the cost, so skip them.
+        postings = [
+            self._trigrams.get(gram, ()) for gram in grams
+            if len(self._trigrams.get(gram, ())) <= self._common_gram_limit
+        ]
+        shared = Counter(chain.from_iterable(postings))
+        scores = {}
+        for row, count in shared.items():
+            similarity = count / (len(grams) + self._gram_counts[row] - count)
+            if similarity >= min_similarity:
+                scores[row] = similarity
+        return scores
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` ranked matches as player dicts.
+
+        Exact names rank first, then full-name prefixes, then token
+        prefixes. Trigram (typo tolerant) matches are used when nothing
+        matches by prefix. Ties prefer players currently on an NFL team.
+        """
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        ranked = {}
+        prefix = query
+        rows = self._prefix_rows(prefix)
+        if not rows and ' ' in query:
+            # "ja marr" -> "jamarr" for names whose punctuation was dropped.
+            prefix = query.replace(' ', '')
+            rows = self._prefix_rows(prefix)
+        for row in rows:
+            name = self.normalized[row]
+            if name == prefix:
+                ranked[row] = 0
+            elif name.startswith(prefix):
+                ranked[row] = 1
+            else:
+                ranked[row] = 2
+        if not ranked:
+            # Nothing starts with the query; treat it as a typo.
+            for row, similarity in self._fuzzy_rows(query).items():
+                if row not in ranked:
+                    ranked[row] = 3 + (1 - similarity)
+
+        catalog = self.catalog
+        best = sorted(ranked,
+                      key=lambda row: (ranked[row], not catalog.team(row),
+                                       len(self.normalized[row])))[:limit]
+        return [{
+            'id': catalog.ids[row],
+            'name': catalog.names[row],
+            'position': catalog.position(row),
+            'team': catalog.team(row),
+        } for row in best]
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def get_index():
+    """Index for the current catalog; rebuilt after the catalog refreshes."""
+    global _index
+    catalog = player_catalog.get_catalog()
+    index = _index
+    if index is None or index.catalog is not catalog:
+        with _lock:
+            if _index is None or _index.catalog is not catalog:
+                _index = PlayerSearchIndex(catalog)
+            index = _index
+    return index
+
+
+def search(query, limit=10):
+    return get_index().search(query, limit)
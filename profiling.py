@@ -0,0 +1,317 @@
+import hmac
+import importlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+
+from flask import current_app, g, request
+
+import metrics
+
+_settings = {
+    # Requests sending this in X-Profile-Token are profiled, and only they
+    # may list and download profiles. None turns the header off.
+    'PROFILE_ADMIN_TOKEN': None,
+    # Fraction of all other requests profiled at random. Only takes effect
+    # with PROFILE_ADMIN_TOKEN set, since only it can read the profiles.
+    'PROFILE_SAMPLE_RATE': 0.0,
+    'PROFILE_DIR': 'profiles',
+    # Oldest profiles are deleted beyond this many.
+    'PROFILE_MAX_FILES': 50,
+    # Seconds between stack samples.
+    'PROFILE_INTERVAL': 0.01,
+}
+
+HEADER = 'X-Profile-Token'
+# Stop sampling a profile (e.g. a long SSE stream) after this many.
+_MAX_SAMPLES = 30000
+_PROFILE_ID = re.compile(r'\d{8}T\d{6}-[0-9a-f]{8}')
+
+_active = ContextVar('profile', default=None)
+_exempt = set()
+_profiles = set()
+_sampler = {'lock': None, 'running': False}
+_labels = {}
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+    if _settings['PROFILE_SAMPLE_RATE'] > 0 and not enabled():
+        logging.warning("PROFILE_SAMPLE_RATE is set without "
+                        "PROFILE_ADMIN_TOKEN; profiling stays off, since "
+                        "nothing could list or download the profiles")
+    if not enabled():
+        # Nothing is hooked in, so unprofiled builds pay nothing.
+        return
+
+    _sampler['lock'] = _original('_thread', 'allocate_lock')()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_clear_request)
+
+
+def enabled():
+    # Without the token nobody could read the profiles, sampled or not.
+    return bool(_settings['PROFILE_ADMIN_TOKEN'])
+
+
+def authorized():
+    """True if this request carries the admin profiling token."""
+    token = _settings['PROFILE_ADMIN_TOKEN']
+    sent = request.headers.get(HEADER)
+    return bool(token and sent and hmac.compare_digest(sent, token))
+
+
+def exempt(view):
+    """Never profile ``view`` (e.g. the endpoints that serve profiles)."""
+    _exempt.add(view)
+    return view
+
+
+def _original(module, name):
+    """``module.name`` as it was before any gevent monkey-patching.
+
+    The sampler has to be a real OS thread sleeping a real sleep, or it
+    would only ever run when the greenlets it's watching yield.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None:
+        return monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
+
+
+def _current_greenlet():
+    greenlet = sys.modules.get('greenlet')
+    return greenlet.getcurrent() if greenlet is not None else None
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = (f"{code.co_name} "
+                                 f"({os.path.basename(code.co_filename)}"
+                                 f":{code.co_firstlineno})")
+    return label
+
+
+def _fold(frame):
+    """A stack as 'outermost;...;innermost' function labels."""
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class Profile:
+    """Wall-clock stack samples of everything one request runs.
+
+    The request's own thread (or greenlet) is attached for the whole
+    request; fan-out calls attach theirs while they run (see ``bind``).
+    """
+
+    def __init__(self, trigger):
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.samples = 0
+        self.stacks = {}
+        self._tasks = {}
+        self._get_ident = _original('_thread', 'get_ident')
+
+    def attach(self):
+        """Sample the calling thread/greenlet until ``detach(key)``."""
+        key = object()
+        self._tasks[key] = (self._get_ident(), _current_greenlet())
+        return key
+
+    def detach(self, key):
+        self._tasks.pop(key, None)
+
+    def sample(self, frames):
+        if self.samples >= _MAX_SAMPLES:
+            return
+        self.samples += 1
+        stacks = self.stacks
+        for ident, task in tuple(self._tasks.values()):
+            # A suspended greenlet keeps its stack in gr_frame; a running
+            # one (or a plain thread) is whatever its thread is running.
+            frame = getattr(task, 'gr_frame', None)
+            if frame is None:
+                frame = frames.get(ident)
+            if frame is not None:
+                stack = _fold(frame)
+                stacks[stack] = stacks.get(stack, 0) + 1
+
+
+def bind(fn):
+    """Wrap ``fn`` so its samples count toward this request's profile."""
+    profile = _active.get()
+    if profile is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        key = profile.attach()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.detach(key)
+
+    return bound
+
+
+def _sample_loop():
+    lock = _sampler['lock']
+    sleep = _original('time', 'sleep')
+    while True:
+        with lock:
+            profiles = tuple(_profiles)
+            if not profiles:
+                _sampler['running'] = False
+                return
+        try:
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+            del frames
+        except Exception as e:
+            logging.warning(f"Profiler sample failed: {e}")
+        sleep(_settings['PROFILE_INTERVAL'])
+
+
+def _watch(profile):
+    with _sampler['lock']:
+        _profiles.add(profile)
+        if _sampler['running']:
+            return
+        _sampler['running'] = True
+    _original('_thread', 'start_new_thread')(_sample_loop, ())
+
+
+def _unwatch(profile):
+    with _sampler['lock']:
+        _profiles.discard(profile)
+
+
+def _start_request():
+    view = current_app.view_functions.get(request.endpoint)
+    if view is None or view in _exempt or request.endpoint == 'static':
+        return
+    if authorized():
+        trigger = 'header'
+    elif random.random() < _settings['PROFILE_SAMPLE_RATE']:
+        trigger = 'sampled'
+    else:
+        return
+    profile = Profile(trigger)
+    g.profile_token = _active.set(profile)
+    g.profile_task = profile.attach()
+    _watch(profile)
+
+
+def _finish_request(response):
+    profile = _active.get()
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile.id
+        g.profile_status = response.status_code
+    return response
+
+
+def _clear_request(exc):
+    token = g.pop('profile_token', None)
+    if token is None:
+        return
+    profile = _active.get()
+    _active.reset(token)
+    profile.detach(g.pop('profile_task'))
+    _unwatch(profile)
+
+    # Registered after metrics, so this teardown runs before its own and
+    # the phase totals are still there.
+    timings = metrics.current_timings()
+    _save({
+        'id': profile.id,
+        'trigger': profile.trigger,
+        'started_at': profile.started_at,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'route': request.url_rule.rule if request.url_rule else 'unmatched',
+        'status': g.pop('profile_status', 500),
+        'total_ms': round((time.time() - profile.started_at) * 1000, 1),
+        'interval_ms': _settings['PROFILE_INTERVAL'] * 1000,
+        'samples': profile.samples,
+        'phases': timings.log_fields() if timings else {},
+        'stacks': dict(profile.stacks),
+    })
+
+
+def _save(data):
+    directory = _settings['PROFILE_DIR']
+    path = os.path.join(directory, f"{data['id']}.json")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logging.warning(f"Saving profile {data['id']} failed: {e}")
+        return
+    logging.info(f"Saved profile {data['id']} for {data['method']} "
+                 f"{data['path']} ({data['total_ms']} ms)")
+    _trim(directory)
+
+
+def _trim(directory):
+    """Keep only the newest PROFILE_MAX_FILES profiles."""
+    names = sorted(name for name in os.listdir(directory)
+                   if name.endswith('.json'))
+    for name in names[:-_settings['PROFILE_MAX_FILES']]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Another worker trimmed it first.
+            pass
+
+
+def list_profiles():
+    """Newest-first summaries of the stored profiles."""
+    directory = _settings['PROFILE_DIR']
+    if not os.path.isdir(directory):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        data = load(name[:-len('.json')])
+        if data is None:
+            continue
+        data.pop('stacks')
+        summaries.append(data)
+    return summaries
+
+
+def load(profile_id):
+    """A stored profile's dict, or None."""
+    if not _PROFILE_ID.fullmatch(profile_id):
+        return None
+    path = os.path.join(_settings['PROFILE_DIR'], f"{profile_id}.json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def folded(data):
+    """Profile stacks in the folded format flame graph tools read."""
+    return ''.join(f"{stack} {count}\n"
+                   for stack, count in sorted(data['stacks'].items()))
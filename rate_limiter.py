@@ -0,0 +1,222 @@
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+
+import sqlite_connections
+
+# Call priorities; lower values are served first.
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+_settings = {
+    'SLEEPER_RATE_LIMIT_ENABLED': True,
+    'SLEEPER_RATE_LIMIT_PATH': 'sleeper_ratelimit.db',
+    # Sleeper starts throttling at roughly 1000 requests/minute per client;
+    # stay comfortably under it across every worker process.
+    'SLEEPER_RATE_PER_MINUTE': 900,
+    'SLEEPER_RATE_BURST': 50,
+    # Tokens only interactive calls may spend, so a large fan-out in one
+    # worker can't starve user lookups in another.
+    'SLEEPER_RATE_INTERACTIVE_RESERVE': 10,
+}
+
+# Token draws are tiny transactions; rather than let SQLite's busy handler
+# block the thread (every greenlet on it, under gevent), a locked bucket
+# is retried from the scheduler's wait after _LOCKED_RETRY seconds.
+_connections = sqlite_connections.ThreadConnections(
+    lambda: _settings['SLEEPER_RATE_LIMIT_PATH'], timeout=0.05)
+_LOCKED_RETRY = 0.02
+_BUCKET = 'sleeper'
+# Longest a queued caller sleeps before re-checking the bucket, so a newly
+# queued interactive call is never stuck behind a long bulk wait.
+_MAX_POLL = 0.25
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+    if _settings['SLEEPER_RATE_LIMIT_ENABLED']:
+        _create_schema()
+
+
+def _connect():
+    return _connections.connect()
+
+
+def _create_schema():
+    with _connections.connect(sqlite_connections.SETUP_TIMEOUT) as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS token_bucket (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                blocked_until REAL NOT NULL DEFAULT 0
+            )''')
+
+
+def _take(priority):
+    """Try to spend one token from the shared bucket.
+
+    Returns 0 if a token was taken, otherwise the number of seconds until
+    one should be available for this priority. The read-refill-spend runs
+    in one IMMEDIATE transaction, so every worker process sees one bucket.
+    """
+    rate = _settings['SLEEPER_RATE_PER_MINUTE'] / 60.0
+    burst = _settings['SLEEPER_RATE_BURST']
+    floor = 0 if priority == INTERACTIVE else min(
+        _settings['SLEEPER_RATE_INTERACTIVE_RESERVE'], burst - 1)
+    with _connect() as conn:
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated_at, blocked_until FROM token_bucket '
+                'WHERE name = ?', (_BUCKET, )).fetchone()
+            tokens, updated_at, blocked_until = row or (burst, now, 0)
+            tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif tokens >= floor + 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (floor + 1 - tokens) / rate
+
+            conn.execute(
+                'INSERT OR REPLACE INTO token_bucket '
+                '(name, tokens, updated_at, blocked_until) '
+                'VALUES (?, ?, ?, ?)', (_BUCKET, tokens, now, blocked_until))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    return wait
+
+
+def penalize(seconds):
+    """Pause every worker's outbound calls for ``seconds`` (e.g. after a 429)."""
+    if not _settings['SLEEPER_RATE_LIMIT_ENABLED']:
+        return
+    until = time.time() + seconds
+    try:
+        # One upsert, so it needs no explicit transaction.
+        with _connect() as conn:
+            conn.execute(
+                'INSERT INTO token_bucket '
+                '(name, tokens, updated_at, blocked_until) '
+                'VALUES (?, 0, ?, ?) ON CONFLICT(name) DO UPDATE SET '
+                'tokens = 0, updated_at = excluded.updated_at, '
+                'blocked_until = MAX(blocked_until, excluded.blocked_until)',
+                (_BUCKET, time.time(), until))
+    except sqlite3.Error as e:
+        logging.warning(f"Rate limiter penalize failed: {e}")
+
+
+class _Stats:
+    """Per-process queue depth and wait-time counters."""
+
+    def __init__(self):
+        self.acquired = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_total = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.wait_max = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.rate_limited = 0
+
+
+class Scheduler:
+    """Orders this process's outbound calls by priority, then arrival.
+
+    Only the caller at the head of the queue draws from the shared token
+    bucket, so a queued interactive call always goes before any bulk call
+    still waiting in the same process.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._stats = _Stats()
+
+    def acquire(self, priority=INTERACTIVE):
+        """Block until this call may go out; returns the seconds waited."""
+        ticket = (priority, next(self._seq))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    if self._queue[0] == ticket:
+                        wait = self._take(priority)
+                        if wait <= 0:
+                            break
+                        self._cond.wait(min(wait, _MAX_POLL))
+                    else:
+                        self._cond.wait(_MAX_POLL)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            name = PRIORITY_NAMES.get(priority, 'bulk')
+            self._stats.acquired[name] += 1
+            self._stats.wait_total[name] += waited
+            self._stats.wait_max[name] = max(self._stats.wait_max[name], waited)
+
+        if waited > 5:
+            logging.warning(
+                f"Sleeper {name} call waited {waited:.2f}s for the rate limiter"
+            )
+        return waited
+
+    def _take(self, priority):
+        try:
+            return _take(priority)
+        except sqlite3.Error as e:
+            if sqlite_connections.is_locked(e):
+                # Another process is drawing a token; try again shortly.
+                return _LOCKED_RETRY
+            # Never let a broken limiter file take the whole app down.
+            logging.warning(f"Rate limiter unavailable, not throttling: {e}")
+            return 0
+
+    def record_rate_limited(self):
+        with self._cond:
+            self._stats.rate_limited += 1
+
+    def stats(self):
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                depth[PRIORITY_NAMES.get(priority, 'bulk')] += 1
+            return {
+                'queue_depth': depth,
+                'acquired': dict(self._stats.acquired),
+                'wait_seconds_total': dict(self._stats.wait_total),
+                'wait_seconds_max': dict(self._stats.wait_max),
+                'rate_limited': self._stats.rate_limited,
+            }
+
+
+_scheduler = Scheduler()
+
+
+def acquire(priority=INTERACTIVE):
+    """Wait for a slot to make one outbound Sleeper call."""
+    if not _settings['SLEEPER_RATE_LIMIT_ENABLED']:
+        return 0
+    return _scheduler.acquire(priority)
+
+
+def record_rate_limited():
+    _scheduler.record_rate_limited()
+
+
+def stats():
+    """Snapshot of this process's queue depth and wait times by priority."""
+    return _scheduler.stats()
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import sqlite_connections
+
+_settings = {
+    'RESULT_STORE_PATH': 'result_store.db',
+    # Matches the session lifetime; older results are never asked for.
+    'RESULT_STORE_TTL': 60 * 60,
+    'RESULT_STORE_MAX_BYTES': 64 * 1024 * 1024,
+}
+
+_connections = sqlite_connections.ThreadConnections(
+    lambda: _settings['RESULT_STORE_PATH'])
+_lock = threading.Lock()
+_puts_since_evict = 0
+_EVICT_EVERY = 50
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+    _create_schema()
+
+
+def _connect():
+    return _connections.connect()
+
+
+def _create_schema():
+    directory = os.path.dirname(_settings['RESULT_STORE_PATH'])
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _connections.connect(sqlite_connections.SETUP_TIMEOUT) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS result_store (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS ix_result_store_scope
+            ON result_store (scope, created_at)""")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS ix_result_store_accessed
+            ON result_store (accessed_at)""")
+
+
+def scope(user_id, filter_label):
+    """Short reference to a user's latest result for a filter.
+
+    This is what goes in the session; it stays valid as new roster
+    versions are stored under it.
+    """
+    return f"{user_id}:{filter_label}"
+
+
+def result_key(user_id, filter_label, version):
+    raw = f"{scope(user_id, filter_label)}:{version}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _encode(payload):
+    return zlib.compress(
+        json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def _decode(body):
+    return json.loads(zlib.decompress(body))
+
+
+def put(user_id, filter_label, version, payload):
+    """Store a JSON-serializable result for (user, filter, roster version)."""
+    global _puts_since_evict
+    body = _encode(payload)
+    now = time.time()
+    try:
+        with _connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO result_store '
+                '(key, scope, body, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (result_key(user_id, filter_label, version),
+                 scope(user_id, filter_label), sqlite3.Binary(body), len(body),
+                 now, now))
+    except sqlite3.Error as e:
+        logging.warning(f"Result store put failed for {user_id}: {e}")
+        return
+
+    with _lock:
+        _puts_since_evict += 1
+        due = _puts_since_evict >= _EVICT_EVERY
+        if due:
+            _puts_since_evict = 0
+    if due:
+        evict()
+
+
+def _fetch_one(where, params):
+    cutoff = time.time() - _settings['RESULT_STORE_TTL']
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                f'SELECT key, body FROM result_store WHERE {where} '
+                'AND created_at >= ? ORDER BY created_at DESC LIMIT 1',
+                params + (cutoff, )).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE result_store SET accessed_at = ? WHERE key = ?',
+                (time.time(), row[0]))
+            return _decode(row[1])
+    except (sqlite3.Error, zlib.error, ValueError) as e:
+        logging.warning(f"Result store read failed: {e}")
+        return None
+
+
+def get(user_id, filter_label, version):
+    """The result stored for exactly this roster version, or None."""
+    return _fetch_one('key = ?', (result_key(user_id, filter_label,
+                                             version), ))
+
+
+def latest(scope_ref):
+    """The newest unexpired result under a ``scope()`` reference, or None."""
+    if not scope_ref:
+        return None
+    return _fetch_one('scope = ?', (scope_ref, ))
+
+
+def latest_key(scope_ref):
+    """Key of the newest unexpired result under ``scope_ref``, or None.
+
+    Reads no result body, so it's cheap enough to revalidate with.
+    """
+    if not scope_ref:
+        return None
+    cutoff = time.time() - _settings['RESULT_STORE_TTL']
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                'SELECT key FROM result_store WHERE scope = ? '
+                'AND created_at >= ? ORDER BY created_at DESC LIMIT 1',
+                (scope_ref, cutoff)).fetchone()
+    except sqlite3.Error as e:
+        logging.warning(f"Result store read failed: {e}")
+        return None
+    return row[0] if row else None
+
+
+def load(key):
+    """The unexpired result stored under ``key``, or None."""
+    return _fetch_one('key = ?', (key, ))
+
+
+def content_version(payload):
+    """A version for a result that has no roster version to key it by."""
+    return hashlib.sha1(_encode(payload)).hexdigest()
+
+
+def evict():
+    """Drop expired results, then least recently used ones over budget."""
+    budget = _settings['RESULT_STORE_MAX_BYTES']
+    try:
+        with _connect() as conn:
+            conn.execute('DELETE FROM result_store WHERE created_at < ?',
+                         (time.time() - _settings['RESULT_STORE_TTL'], ))
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) '
+                                 'FROM result_store').fetchone()[0]
+            if total <= budget:
+                return
+            removed = 0
+            for key, size in conn.execute(
+                    'SELECT key, size FROM result_store ORDER BY accessed_at'
+            ).fetchall():
+                if total <= budget:
+                    break
+                conn.execute('DELETE FROM result_store WHERE key = ?', (key, ))
+                total -= size
+                removed += 1
+            logging.info(f"Result store evicted {removed} entries")
+    except sqlite3.Error as e:
+        logging.warning(f"Result store eviction failed: {e}")
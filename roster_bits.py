@@ -0,0 +1,94 @@
+"""Dense integer ids and int bitsets for roster math.
+
+Player, league and user ids are interned to consecutive integers, and
+memberships are stored as Python ints used as bitsets, so overlap,
+counting and "is anyone rostering this" checks are single bitwise
+operations instead of set building over id strings.
+"""
+
+
+class Interner:
+    """Maps string ids to dense integers (0, 1, 2, ...) and back."""
+
+    def __init__(self, keys=()):
+        self.index = {}
+        self.keys = []
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        position = self.index.get(key)
+        if position is None:
+            position = self.index[key] = len(self.keys)
+            self.keys.append(key)
+        return position
+
+    def bit(self, key):
+        return 1 << self.add(key)
+
+    def mask(self, keys):
+        """Bitset with every key in ``keys`` set (interning new ones)."""
+        mask = 0
+        for key in keys:
+            mask |= 1 << self.add(key)
+        return mask
+
+    def known_mask(self, keys):
+        """Like ``mask`` but ignores keys that haven't been interned."""
+        mask = 0
+        index = self.index
+        for key in keys:
+            position = index.get(key)
+            if position is not None:
+                mask |= 1 << position
+        return mask
+
+    def members(self, mask):
+        """Keys whose bits are set in ``mask``, in interning order."""
+        return [self.keys[position] for position in iter_bits(mask)]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def iter_bits(mask):
+    """Positions of the set bits in ``mask``, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class RosterMatrix:
+    """Which leagues each player is rostered in, as one bitset per player.
+
+    Leagues get bits in the order they're added, so ``leagues_of`` keeps
+    the caller's league order.
+    """
+
+    def __init__(self):
+        self.leagues = Interner()
+        self.players = Interner()
+        self.player_leagues = []
+
+    def add_roster(self, league_id, player_ids):
+        league_bit = self.leagues.bit(league_id)
+        player_leagues = self.player_leagues
+        for player_id in player_ids:
+            position = self.players.add(player_id)
+            if position == len(player_leagues):
+                player_leagues.append(0)
+            player_leagues[position] |= league_bit
+
+    def counts(self):
+        """player_id -> number of leagues the player is rostered in."""
+        return {
+            player_id: mask.bit_count()
+            for player_id, mask in zip(self.players.keys, self.player_leagues)
+        }
+
+    def leagues_of(self, player_id):
+        position = self.players.index.get(player_id)
+        if position is None:
+            return []
+        return self.leagues.members(self.player_leagues[position])
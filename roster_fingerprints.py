@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import time
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import fanout
+import roster_sync
+from models import (db, LeagueRosterFingerprint, PlayerExposureCount,
+                    PlayerLeagueAssociation, write_with_retry)
+
+_settings = {
+    # How long a league's fingerprint is trusted before its rosters are
+    # fetched again.
+    'ROSTER_FINGERPRINT_TTL': 5 * 60,
+}
+
+
+def init_app(app):
+    if 'ROSTER_FINGERPRINT_TTL' in app.config:
+        _settings['ROSTER_FINGERPRINT_TTL'] = app.config[
+            'ROSTER_FINGERPRINT_TTL']
+
+
+def fingerprint(player_ids):
+    """Order-independent hash of a roster's player ids."""
+    return hashlib.sha1(','.join(sorted(player_ids)).encode()).hexdigest()
+
+
+def owner_player_ids(roster_data, user_id, league_id):
+    """Player ids on ``user_id``'s roster in one league's roster list."""
+    user_roster = next(
+        (roster for roster in roster_data if roster.get('owner_id') == user_id),
+        None)
+    if user_roster and user_roster.get('players'):
+        return list(user_roster['players'])
+    logging.warning(
+        f"No valid roster data found for user_id {user_id} in league {league_id}"
+    )
+    return []
+
+
+class RosterRefresh:
+    """Bring a user's associations and exposure counts up to date.
+
+    Only leagues whose fingerprint is missing or older than the TTL are
+    fetched. A fetched league whose fingerprint is unchanged just has its
+    timestamp bumped; a changed one has its (league, player) pairs diffed
+    and only the affected players' counts updated. Leagues that dropped
+    out of ``league_ids`` are removed. If a fetch fails, the league's
+    previous roster is kept.
+
+    Iterating yields (league_id, player_ids) for each league as soon as it
+    is known: leagues with fresh fingerprints first, then fetched ones in
+    completion order. Once iteration finishes the changes are committed and
+    ``result`` holds (players_by_league, counts): league_id -> sorted player
+    ids for every league, and player_id -> number of leagues.
+    """
+
+    def __init__(self, user_id, league_ids):
+        self.user_id = user_id
+        self.league_ids = list(league_ids)
+        self.result = None
+
+    def __iter__(self):
+        user_id = self.user_id
+        league_ids = self.league_ids
+        now = time.time()
+        ttl = _settings['ROSTER_FINGERPRINT_TTL']
+
+        prints = {
+            fp.league_id: fp
+            for fp in LeagueRosterFingerprint.query.filter_by(user_id=user_id)
+        }
+        current = {}
+        for league_id, player_id in db.session.execute(
+                db.select(PlayerLeagueAssociation.league_id,
+                          PlayerLeagueAssociation.player_id).filter_by(
+                              user_id=user_id)):
+            current.setdefault(league_id, set()).add(player_id)
+
+        stale = [
+            league_id for league_id in league_ids if league_id not in prints
+            or now - prints[league_id].checked_at > ttl
+        ]
+        stale_set = set(stale)
+        for league_id in league_ids:
+            if league_id not in stale_set:
+                yield league_id, sorted(current.get(league_id, ()))
+
+        added, removed = [], []
+        touched_prints = []
+        fetches = fanout.iter_map(roster_sync.get_rosters,
+                                  [(league_id, ) for league_id in stale])
+        for (league_id, ), roster_data in fetches:
+            if not isinstance(roster_data, list):
+                yield league_id, sorted(current.get(league_id, ()))
+                continue
+            player_ids = owner_player_ids(roster_data, user_id, league_id)
+            new_print = fingerprint(player_ids)
+            touched_prints.append({
+                'user_id': user_id,
+                'league_id': league_id,
+                'fingerprint': new_print,
+                'checked_at': now
+            })
+            old_print = prints.get(league_id)
+            if not (old_print and old_print.fingerprint == new_print):
+                new_ids = set(player_ids)
+                old_ids = current.get(league_id, set())
+                added.extend((league_id, pid) for pid in new_ids - old_ids)
+                removed.extend((league_id, pid) for pid in old_ids - new_ids)
+                current[league_id] = new_ids
+            yield league_id, sorted(current.get(league_id, ()))
+
+        dropped = (set(current) | set(prints)) - set(league_ids)
+        for league_id in dropped:
+            removed.extend(
+                (league_id, pid) for pid in current.pop(league_id, ()))
+
+        write_with_retry(_apply, user_id, added, removed, touched_prints,
+                         dropped, not prints)
+
+        counts = {
+            row.player_id: row.league_count
+            for row in PlayerExposureCount.query.filter_by(user_id=user_id)
+        }
+        players_by_league = {
+            league_id: sorted(current.get(league_id, ()))
+            for league_id in league_ids
+        }
+        logging.info(
+            f"Roster refresh for {user_id}: {len(stale)}/{len(league_ids)} "
+            f"leagues fetched, +{len(added)}/-{len(removed)} players")
+        self.result = (players_by_league, counts)
+
+
+def roster_version(user_id, league_ids, require_fresh=True):
+    """Hash of the user's roster fingerprints across ``league_ids``.
+
+    Changes whenever any of those rosters does, so it can key results
+    derived from them. Returns None if a league has no fingerprint, or
+    (with ``require_fresh``) one older than the TTL.
+    """
+    league_ids = list(league_ids)
+    prints = {
+        fp.league_id: fp
+        for fp in LeagueRosterFingerprint.query.filter_by(user_id=user_id)
+    }
+    cutoff = time.time() - _settings['ROSTER_FINGERPRINT_TTL']
+    parts = []
+    for league_id in league_ids:
+        fp = prints.get(league_id)
+        if fp is None or (require_fresh and fp.checked_at < cutoff):
+            return None
+        parts.append(f"{league_id}:{fp.fingerprint}")
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def refresh_user_rosters(user_id, league_ids):
+    """Run a RosterRefresh to completion and return its result."""
+    refresh = RosterRefresh(user_id, league_ids)
+    for _ in refresh:
+        pass
+    return refresh.result
+
+
+def _apply(user_id, added, removed, touched_prints, dropped, rebuild_counts):
+    assoc = PlayerLeagueAssociation.__table__
+    counts = PlayerExposureCount.__table__
+    prints = LeagueRosterFingerprint.__table__
+    try:
+        if dropped:
+            db.session.execute(assoc.delete().where(
+                assoc.c.user_id == user_id,
+                assoc.c.league_id.in_(list(dropped))))
+        for league_id, player_id in removed:
+            if league_id in dropped:
+                continue
+            db.session.execute(assoc.delete().where(
+                assoc.c.user_id == user_id, assoc.c.league_id == league_id,
+                assoc.c.player_id == player_id))
+        if added:
+            db.session.execute(
+                sqlite_insert(assoc).on_conflict_do_nothing(),
+                [{
+                    'user_id': user_id,
+                    'league_id': league_id,
+                    'player_id': player_id
+                } for league_id, player_id in added])
+        if dropped:
+            db.session.execute(prints.delete().where(
+                prints.c.user_id == user_id,
+                prints.c.league_id.in_(list(dropped))))
+        if touched_prints:
+            stmt = sqlite_insert(prints)
+            db.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=['user_id', 'league_id'],
+                    set_={
+                        'fingerprint': stmt.excluded.fingerprint,
+                        'checked_at': stmt.excluded.checked_at
+                    }), touched_prints)
+
+        if rebuild_counts:
+            # First refresh for this user (or data from before counts were
+            # tracked): derive the counts from the associations once.
+            db.session.execute(counts.delete().where(
+                counts.c.user_id == user_id))
+            db.session.execute(
+                counts.insert().from_select(
+                    ['user_id', 'player_id', 'league_count'],
+                    db.select(assoc.c.user_id, assoc.c.player_id,
+                              db.func.count()).where(
+                                  assoc.c.user_id == user_id).group_by(
+                                      assoc.c.user_id, assoc.c.player_id)))
+        else:
+            _recount_players(
+                user_id, {player_id for _, player_id in added + removed})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _recount_players(user_id, player_ids):
+    """Recount only the given players' leagues from the associations.
+
+    Counting the touched players' rows (via the user/player index) instead
+    of adding +1/-1 deltas keeps the counts correct even if two searches
+    for the same user race each other.
+    """
+    player_ids = list(player_ids)
+    if not player_ids:
+        return
+    assoc = PlayerLeagueAssociation.__table__
+    counts = PlayerExposureCount.__table__
+    for start in range(0, len(player_ids), 500):
+        chunk = player_ids[start:start + 500]
+        db.session.execute(counts.delete().where(
+            counts.c.user_id == user_id, counts.c.player_id.in_(chunk)))
+        db.session.execute(
+            counts.insert().from_select(
+                ['user_id', 'player_id', 'league_count'],
+                db.select(assoc.c.user_id, assoc.c.player_id,
+                          db.func.count()).where(
+                              assoc.c.user_id == user_id,
+                              assoc.c.player_id.in_(chunk)).group_by(
+                                  assoc.c.user_id, assoc.c.player_id)))
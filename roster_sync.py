@@ -0,0 +1,365 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+
+import sleeper_client
+import sqlite_connections
+
+_settings = {
+    'ROSTER_SYNC_ENABLED': True,
+    'ROSTER_SNAPSHOT_PATH': 'roster_snapshots.db',
+    # A snapshot younger than this is served without asking Sleeper at all.
+    'ROSTER_SYNC_INTERVAL': 2 * 60,
+    # Transactions don't cover drafts or ownership changes, so snapshots
+    # are rebuilt from a full fetch at least this often.
+    'ROSTER_FULL_SYNC_INTERVAL': 6 * 3600,
+    'ROSTER_SNAPSHOT_TTL': 30 * 24 * 3600,
+}
+
+# The only roster fields anything in the app reads.
+ROSTER_FIELDS = ('roster_id', 'owner_id', 'co_owners', 'players')
+
+_connections = sqlite_connections.ThreadConnections(
+    lambda: _settings['ROSTER_SNAPSHOT_PATH'])
+_lock = threading.Lock()
+_puts_since_evict = 0
+_EVICT_EVERY = 50
+# Seconds of transactions replayed after a full fetch (see _full_sync).
+_CURSOR_MARGIN = 10 * 60
+
+_week_lock = threading.Lock()
+_week = {'value': None, 'checked_at': 0}
+_WEEK_TTL = 60
+
+# Per-process counters: 'fresh', 'synced' (advanced by transactions) and
+# 'full' (rebuilt from /rosters).
+_stats = {'fresh': 0, 'synced': 0, 'full': 0}
+
+
+class SnapshotMismatch(Exception):
+    """A snapshot can't be trusted and has to be rebuilt from /rosters."""
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+    if _settings['ROSTER_SYNC_ENABLED']:
+        _create_schema()
+
+
+def _connect():
+    return _connections.connect()
+
+
+def _create_schema():
+    directory = os.path.dirname(_settings['ROSTER_SNAPSHOT_PATH'])
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _connections.connect(sqlite_connections.SETUP_TIMEOUT) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS roster_snapshot (
+                league_id TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                checksum TEXT NOT NULL,
+                season TEXT,
+                week INTEGER NOT NULL,
+                cursor INTEGER NOT NULL,
+                full_at REAL NOT NULL,
+                synced_at REAL NOT NULL
+            )""")
+
+
+def stats():
+    """Snapshot of this process's fresh/synced/full counters."""
+    return dict(_stats)
+
+
+def checksum(rosters):
+    """Stable hash of a slimmed roster list."""
+    raw = json.dumps(rosters, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def slim(rosters):
+    return [{
+        field: roster.get(field)
+        for field in ROSTER_FIELDS
+    } for roster in rosters]
+
+
+def _load(league_id):
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                'SELECT body, checksum, season, week, cursor, full_at, '
+                'synced_at FROM roster_snapshot WHERE league_id = ?',
+                (league_id, )).fetchone()
+    except sqlite3.Error as e:
+        logging.warning(f"Roster snapshot read failed for {league_id}: {e}")
+        return None
+    if row is None:
+        return None
+    body, stored_checksum, season, week, cursor, full_at, synced_at = row
+    try:
+        rosters = json.loads(zlib.decompress(body))
+    except (zlib.error, ValueError):
+        rosters = None
+    if rosters is None or checksum(rosters) != stored_checksum:
+        logging.warning(f"Roster snapshot for {league_id} failed its checksum")
+        return None
+    return {
+        'rosters': rosters,
+        'season': season,
+        'week': week,
+        'cursor': cursor,
+        'full_at': full_at,
+        'synced_at': synced_at,
+    }
+
+
+def _save(league_id, snapshot):
+    global _puts_since_evict
+    rosters = snapshot['rosters']
+    body = zlib.compress(
+        json.dumps(rosters, separators=(',', ':')).encode('utf-8'))
+    try:
+        # Never let a slower, older sync overwrite a newer one.
+        with _connect() as conn:
+            conn.execute(
+                'INSERT INTO roster_snapshot '
+                '(league_id, body, checksum, season, week, cursor, full_at, '
+                'synced_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(league_id) DO UPDATE SET body = excluded.body, '
+                'checksum = excluded.checksum, season = excluded.season, '
+                'week = excluded.week, cursor = excluded.cursor, '
+                'full_at = excluded.full_at, synced_at = excluded.synced_at '
+                'WHERE excluded.synced_at >= roster_snapshot.synced_at',
+                (league_id, sqlite3.Binary(body), checksum(rosters),
+                 snapshot['season'], snapshot['week'], snapshot['cursor'],
+                 snapshot['full_at'], snapshot['synced_at']))
+    except sqlite3.Error as e:
+        logging.warning(f"Roster snapshot save failed for {league_id}: {e}")
+        return
+
+    with _lock:
+        _puts_since_evict += 1
+        due = _puts_since_evict >= _EVICT_EVERY
+        if due:
+            _puts_since_evict = 0
+    if due:
+        evict()
+
+
+def evict():
+    """Drop snapshots of leagues nobody has looked at in a long while."""
+    try:
+        with _connect() as conn:
+            conn.execute(
+                'DELETE FROM roster_snapshot WHERE synced_at < ?',
+                (time.time() - _settings['ROSTER_SNAPSHOT_TTL'], ))
+    except sqlite3.Error as e:
+        logging.warning(f"Roster snapshot eviction failed: {e}")
+
+
+def _current_week():
+    """(season, week) Sleeper is on now, or None if unknown.
+
+    Looked up at most once a minute per process; concurrent syncs wait on
+    the one lookup rather than each asking for it.
+    """
+    with _week_lock:
+        if time.time() - _week['checked_at'] < _WEEK_TTL:
+            return _week['value']
+        state = sleeper_client.get_json('/state/nfl')
+        value = None
+        if isinstance(state, dict):
+            week = state.get('leg') or state.get('week') or 0
+            # Offseason moves are filed under week 1.
+            value = str(state.get('season')), max(int(week), 1)
+        _week.update(value=value, checked_at=time.time() if value else 0)
+        return value
+
+
+def _fetch_transactions(league_id, week):
+    resp = sleeper_client.get(f"/league/{league_id}/transactions/{week}",
+                              cache=False)
+    if resp.status_code != 200:
+        raise SnapshotMismatch(
+            f"transactions for week {week} returned {resp.status_code}")
+    transactions = resp.json()
+    if not isinstance(transactions, list):
+        raise SnapshotMismatch(f"transactions for week {week} unreadable")
+    return transactions
+
+
+def _completed(transactions, cursor):
+    """Completed transactions after ``cursor``, oldest first."""
+    done = [
+        txn for txn in transactions if txn.get('status') == 'complete'
+        and (txn.get('status_updated') or 0) > cursor
+    ]
+    done.sort(key=lambda txn: txn.get('status_updated') or 0)
+    return done
+
+
+def apply_transaction(rosters, txn):
+    """Apply one transaction's drops then adds to ``rosters`` in place.
+
+    Re-applying a transaction is harmless, so a snapshot that already
+    reflects it stays the same.
+    """
+    by_id = {roster['roster_id']: roster for roster in rosters}
+    moves = [(player_id, roster_id, False)
+             for player_id, roster_id in (txn.get('drops') or {}).items()]
+    moves += [(player_id, roster_id, True)
+              for player_id, roster_id in (txn.get('adds') or {}).items()]
+    for player_id, roster_id, add in moves:
+        roster = by_id.get(roster_id)
+        if roster is None:
+            raise SnapshotMismatch(f"unknown roster_id {roster_id}")
+        players = roster.get('players') or []
+        if add and player_id not in players:
+            roster['players'] = players + [player_id]
+        elif not add and player_id in players:
+            roster['players'] = [pid for pid in players if pid != player_id]
+
+
+def _full_sync(league_id, now):
+    """Rebuild a snapshot from ``/rosters``; None if Sleeper has no answer.
+
+    The cursor starts a margin before the fetch, so the next sync replays
+    the last few minutes of transactions. Replaying a run of transactions
+    the rosters already reflect leaves them unchanged, which covers any
+    clock skew between us and Sleeper.
+    """
+    current = _current_week()
+    cursor = int((now - _CURSOR_MARGIN) * 1000)
+    resp = sleeper_client.get(f"/league/{league_id}/rosters", cache=False)
+    if resp.status_code != 200:
+        logging.warning(f"Failed to fetch rosters for {league_id}: "
+                        f"{resp.status_code}")
+        return None
+    try:
+        rosters = resp.json()
+    except ValueError:
+        logging.warning(f"Invalid JSON received from Sleeper for {league_id} "
+                        f"rosters")
+        return None
+    if not isinstance(rosters, list):
+        return None
+
+    season, week = current or (None, 0)
+    snapshot = {
+        'rosters': slim(rosters),
+        'season': season,
+        'week': week,
+        'cursor': cursor,
+        'full_at': now,
+        'synced_at': now,
+    }
+    # Without a known week there's nothing to advance from next time.
+    if current:
+        _save(league_id, snapshot)
+    _stats['full'] += 1
+    return snapshot
+
+
+def _advance(league_id, snapshot, now):
+    """Bring a snapshot forward with the transactions since its cursor."""
+    current = _current_week()
+    if current is None:
+        raise SnapshotMismatch('NFL state unavailable')
+    season, week = current
+    if season != snapshot['season'] or week < snapshot['week']:
+        raise SnapshotMismatch('season rolled over')
+
+    rosters = snapshot['rosters']
+    cursor = snapshot['cursor']
+    applied = 0
+    for txn_week in range(snapshot['week'], week + 1):
+        for txn in _completed(_fetch_transactions(league_id, txn_week),
+                              snapshot['cursor']):
+            apply_transaction(rosters, txn)
+            cursor = max(cursor, txn.get('status_updated') or 0)
+            applied += 1
+
+    snapshot.update(week=week, cursor=cursor, synced_at=now)
+    _save(league_id, snapshot)
+    _stats['synced'] += 1
+    if applied:
+        logging.info(
+            f"Roster snapshot for {league_id}: applied {applied} transactions")
+    return snapshot
+
+
+def version(league_ids):
+    """Hash of the stored snapshots for ``league_ids``.
+
+    Changes whenever any of those leagues' rosters does, so it can key
+    results derived from them. None if a league has no snapshot.
+    """
+    if not _settings['ROSTER_SYNC_ENABLED']:
+        return None
+    # Sorted: callers often pass ids in fetch-completion order.
+    league_ids = sorted(set(league_ids))
+    checksums = {}
+    try:
+        with _connect() as conn:
+            for start in range(0, len(league_ids), 500):
+                chunk = league_ids[start:start + 500]
+                checksums.update(conn.execute(
+                    'SELECT league_id, checksum FROM roster_snapshot '
+                    f"WHERE league_id IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall())
+    except sqlite3.Error as e:
+        logging.warning(f"Roster snapshot version lookup failed: {e}")
+        return None
+    if len(checksums) < len(league_ids):
+        return None
+    parts = [f"{league_id}:{checksums[league_id]}" for league_id in league_ids]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def get_rosters(league_id):
+    """Rosters for one league, or None if they could not be fetched.
+
+    Served from the league's shared snapshot, which is brought forward
+    with Sleeper's transaction log rather than refetched. A full
+    ``/rosters`` fetch only happens when there's no usable snapshot (none
+    yet, failed checksum, new season, an inconsistent transaction, or one
+    older than ROSTER_FULL_SYNC_INTERVAL).
+    """
+    if not _settings['ROSTER_SYNC_ENABLED']:
+        return sleeper_client.get_rosters(league_id)
+
+    now = time.time()
+    snapshot = _load(league_id)
+    try:
+        if snapshot is None:
+            snapshot = _full_sync(league_id, now)
+        elif now - snapshot['synced_at'] < _settings['ROSTER_SYNC_INTERVAL']:
+            _stats['fresh'] += 1
+        elif (now - snapshot['full_at'] > _settings['ROSTER_FULL_SYNC_INTERVAL']
+              or not any(roster.get('players')
+                         for roster in snapshot['rosters'])):
+            # Empty rosters usually mean a draft is still to come, and
+            # drafts don't show up as transactions.
+            snapshot = _full_sync(league_id, now)
+        else:
+            try:
+                snapshot = _advance(league_id, snapshot, now)
+            except (SnapshotMismatch, ValueError) as e:
+                logging.info(f"Roster snapshot for {league_id} rebuilt: {e}")
+                snapshot = _full_sync(league_id, now)
+    except requests.RequestException as e:
+        logging.warning(f"Error syncing rosters for {league_id}: {e}")
+        return None
+    return snapshot['rosters'] if snapshot else None
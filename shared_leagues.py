@@ -0,0 +1,66 @@
+import roster_bits
+
+
+class SharedLeagueTally:
+    """Accumulates league memberships to find leagues shared by members.
+
+    Feed it one (member, year, leagues) result at a time, in any order;
+    ``add`` reports which labels just became shared so callers can stream
+    partial results. ``duplicates`` and ``summary`` give the final view
+    used by league_compare.html.
+
+    Members and "{name} ({year})" labels are interned to dense integers
+    and each label keeps a bitset of the members in it, so checking and
+    counting shared leagues is bitwise rather than set building.
+    """
+
+    def __init__(self, member_names=()):
+        self.members = roster_bits.Interner(member_names)
+        self.labels = roster_bits.Interner()
+        self.label_members = []
+
+    def add(self, name, year, year_leagues):
+        """Record ``name``'s leagues for ``year``; return newly shared labels."""
+        member_bit = self.members.bit(name)
+        label_members = self.label_members
+        newly_shared = []
+        for league in year_leagues:
+            label = f"{league['name']} ({year})"
+            position = self.labels.add(label)
+            if position == len(label_members):
+                label_members.append(0)
+            mask = label_members[position]
+            if mask & member_bit:
+                continue
+            label_members[position] = mask | member_bit
+            if mask:
+                newly_shared.append(label)
+        return newly_shared
+
+    def _shared(self):
+        for label, mask in zip(self.labels.keys, self.label_members):
+            # More than one bit set.
+            if mask & (mask - 1):
+                yield label, mask
+
+    def users_sharing(self, label):
+        position = self.labels.index.get(label)
+        if position is None:
+            return []
+        return self.members.members(self.label_members[position])
+
+    def duplicates(self):
+        return {
+            label: self.members.members(mask)
+            for label, mask in self._shared()
+        }
+
+    def summary(self):
+        counts = [0] * len(self.members)
+        for _, mask in self._shared():
+            for position in roster_bits.iter_bits(mask):
+                counts[position] += 1
+
+        return sorted(zip(self.members.keys, counts),
+                      key=lambda x: x[1],
+                      reverse=True)
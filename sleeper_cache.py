@@ -0,0 +1,205 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import sqlite_connections
+
+# Endpoint classes: (name, path pattern, fresh seconds, stale-while-revalidate seconds)
+ENDPOINT_CLASSES = [
+    ('user', re.compile(r'^/user/[^/]+$'), 24 * 3600, 7 * 24 * 3600),
+    ('user_leagues', re.compile(r'^/user/[^/]+/leagues/nfl/\d+$'), 15 * 60, 60 * 60),
+    ('league_users', re.compile(r'^/league/[^/]+/users$'), 60 * 60, 6 * 3600),
+    ('rosters', re.compile(r'^/league/[^/]+/rosters$'), 2 * 60, 10 * 60),
+    ('transactions', re.compile(r'^/league/[^/]+/transactions/\d+$'), 60, 0),
+    ('state', re.compile(r'^/state/nfl$'), 5 * 60, 60 * 60),
+    ('players', re.compile(r'^/players/nfl$'), 24 * 3600, 24 * 3600),
+]
+DEFAULT_CLASS = ('other', None, 5 * 60, 0)
+
+_settings = {
+    'SLEEPER_CACHE_ENABLED': True,
+    'SLEEPER_CACHE_PATH': 'sleeper_cache.db',
+    'SLEEPER_CACHE_MAX_BYTES': 256 * 1024 * 1024,
+    'SLEEPER_CACHE_TTL_OVERRIDES': {},
+}
+
+_connections = sqlite_connections.ThreadConnections(
+    lambda: _settings['SLEEPER_CACHE_PATH'])
+_lock = threading.Lock()
+_refreshing = set()
+_puts_since_evict = 0
+_EVICT_EVERY = 50
+
+# Per-process counters, keyed by endpoint class.
+_stats = {}
+
+
+def init_app(app):
+    for key in _settings:
+        if key in app.config:
+            _settings[key] = app.config[key]
+    if _settings['SLEEPER_CACHE_ENABLED']:
+        _create_schema()
+
+
+def enabled():
+    return _settings['SLEEPER_CACHE_ENABLED']
+
+
+def _connect():
+    return _connections.connect()
+
+
+def _create_schema():
+    directory = os.path.dirname(_settings['SLEEPER_CACHE_PATH'])
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _connections.connect(sqlite_connections.SETUP_TIMEOUT) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                path TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS ix_response_cache_accessed
+            ON response_cache (accessed_at)""")
+
+
+def classify(path):
+    """Return (endpoint_class, fresh_seconds, stale_seconds) for a path."""
+    for name, pattern, fresh, stale in ENDPOINT_CLASSES:
+        if pattern.match(path):
+            break
+    else:
+        name, _, fresh, stale = DEFAULT_CLASS
+    override = _settings['SLEEPER_CACHE_TTL_OVERRIDES'].get(name)
+    if override:
+        fresh, stale = override
+    return name, fresh, stale
+
+
+def _count(endpoint, outcome):
+    counters = _stats.setdefault(endpoint, {'hit': 0, 'stale': 0, 'miss': 0})
+    counters[outcome] += 1
+
+
+def stats():
+    """Snapshot of this process's hit/stale/miss counters per endpoint class."""
+    return {endpoint: dict(counters) for endpoint, counters in _stats.items()}
+
+
+def lookup(path):
+    """Look a path up in the cache.
+
+    Returns (body, state) where state is 'hit', 'stale' or 'miss'. Body is
+    None on a miss. Stale entries are still inside their revalidate window;
+    the caller should serve them and refresh in the background.
+    """
+    endpoint, fresh, stale = classify(path)
+    now = time.time()
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                'SELECT body, fetched_at FROM response_cache WHERE path = ?',
+                (path, )).fetchone()
+            if row is None:
+                _count(endpoint, 'miss')
+                return None, 'miss'
+            body, fetched_at = row
+            age = now - fetched_at
+            if age > fresh + stale:
+                _count(endpoint, 'miss')
+                return None, 'miss'
+            conn.execute(
+                'UPDATE response_cache SET accessed_at = ? WHERE path = ?',
+                (now, path))
+    except sqlite3.Error as e:
+        logging.warning(f"Sleeper cache lookup failed for {path}: {e}")
+        return None, 'miss'
+
+    state = 'hit' if age <= fresh else 'stale'
+    _count(endpoint, state)
+    return bytes(body), state
+
+
+def store(path, body):
+    """Store a successful response body for a path.
+
+    Sleeper answers an unknown username with 200 and ``null``. That is
+    never cached (and replaces any older body), so a typo'd or brand new
+    username isn't "not found" for the user class's whole lifetime.
+    """
+    global _puts_since_evict
+    endpoint, _, _ = classify(path)
+    now = time.time()
+    try:
+        with _connect() as conn:
+            if body.strip() == b'null':
+                conn.execute('DELETE FROM response_cache WHERE path = ?',
+                             (path, ))
+                return
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache '
+                '(path, endpoint, body, size, fetched_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (path, endpoint, sqlite3.Binary(body), len(body), now, now))
+    except sqlite3.Error as e:
+        logging.warning(f"Sleeper cache store failed for {path}: {e}")
+        return
+
+    with _lock:
+        _puts_since_evict += 1
+        due = _puts_since_evict >= _EVICT_EVERY or len(
+            body) > _settings['SLEEPER_CACHE_MAX_BYTES'] // _EVICT_EVERY
+        if due:
+            _puts_since_evict = 0
+    if due:
+        evict()
+
+
+def evict():
+    """Drop least recently used entries until the cache fits its byte budget."""
+    budget = _settings['SLEEPER_CACHE_MAX_BYTES']
+    try:
+        with _connect() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) '
+                                 'FROM response_cache').fetchone()[0]
+            if total <= budget:
+                return
+            removed = 0
+            for path, size in conn.execute(
+                    'SELECT path, size FROM response_cache '
+                    'ORDER BY accessed_at').fetchall():
+                if total <= budget:
+                    break
+                conn.execute('DELETE FROM response_cache WHERE path = ?',
+                             (path, ))
+                total -= size
+                removed += 1
+        logging.info(f"Sleeper cache evicted {removed} entries")
+    except sqlite3.Error as e:
+        logging.warning(f"Sleeper cache eviction failed: {e}")
+
+
+def claim_refresh(path):
+    """Return True if the caller should revalidate ``path`` in the background.
+
+    Only one refresh per path runs at a time in this process.
+    """
+    with _lock:
+        if path in _refreshing:
+            return False
+        _refreshing.add(path)
+        return True
+
+
+def release_refresh(path):
+    with _lock:
+        _refreshing.discard(path)
@@ -0,0 +1,230 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+import rate_limiter
+import sleeper_cache
+from rate_limiter import INTERACTIVE, BULK
+
+SLEEPER_API_BASE = "https://api.sleeper.app/v1"
+
+# Defaults, overridable through the Flask config (see Config).
+_settings = {
+    'SLEEPER_POOL_SIZE': 20,
+    'SLEEPER_TIMEOUT': (3.05, 15),
+    'SLEEPER_MAX_RETRIES': 3,
+    'SLEEPER_BACKOFF_FACTOR': 0.3,
+    'SLEEPER_FANOUT_WORKERS': 16,
+}
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+_local = threading.local()
+
+
+def init_app(app):
+    """Pick up client settings from the Flask config."""
+    global _session, _executor
+    with _lock:
+        for key in _settings:
+            if key in app.config:
+                _settings[key] = app.config[key]
+        # Settings changed, so rebuild the pool and executor on next use.
+        _session = None
+        _executor = None
+
+
+class _Retry(Retry):
+    """urllib3 retries that leave every 429 to ``_fetch``.
+
+    A plain Retry still retries a 429 that carries Retry-After, even with
+    429 out of status_forcelist. Those retries would bypass the shared
+    rate limiter.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _build_session():
+    # 429s are retried in _fetch instead, so every retry goes back through
+    # the shared rate limiter.
+    retry = _Retry(total=_settings['SLEEPER_MAX_RETRIES'],
+                  backoff_factor=_settings['SLEEPER_BACKOFF_FACTOR'],
+                  status_forcelist=(500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']),
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=4,
+                          pool_maxsize=_settings['SLEEPER_POOL_SIZE'],
+                          pool_block=True,
+                          max_retries=retry)
+    s = requests.Session()
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+    return s
+
+
+def get_session():
+    """Process-wide pooled session; connections are kept alive between calls."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get_executor():
+    """Process-wide bounded thread pool used for concurrent Sleeper calls."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_settings['SLEEPER_FANOUT_WORKERS'],
+                    thread_name_prefix='sleeper')
+    return _executor
+
+
+def current_priority():
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """Run this thread's Sleeper calls at ``level`` (INTERACTIVE or BULK)."""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def call_with_priority(level, fn, *args):
+    """``fn(*args)`` with this thread's Sleeper calls at ``level``."""
+    with priority(level):
+        return fn(*args)
+
+
+def _retry_delay(resp, attempt):
+    """Jittered backoff for a 429, never shorter than its Retry-After."""
+    backoff = _settings['SLEEPER_BACKOFF_FACTOR'] * (2**attempt)
+    delay = random.uniform(backoff / 2, backoff * 1.5)
+    try:
+        return max(delay, float(resp.headers.get('Retry-After', 0)))
+    except ValueError:
+        return delay
+
+
+def _fetch(path, **kwargs):
+    kwargs.setdefault('timeout', _settings['SLEEPER_TIMEOUT'])
+    level = current_priority()
+    attempts = _settings['SLEEPER_MAX_RETRIES'] + 1
+    for attempt in range(attempts):
+        metrics.observe_rate_limit_wait(level, rate_limiter.acquire(level))
+        started = time.perf_counter()
+        try:
+            resp = get_session().get(f"{SLEEPER_API_BASE}{path}", **kwargs)
+        except requests.RequestException:
+            metrics.observe_sleeper(path, 'error',
+                                    time.perf_counter() - started)
+            raise
+        metrics.observe_sleeper(path, resp.status_code,
+                                time.perf_counter() - started)
+        if resp.status_code != 429:
+            return resp
+        rate_limiter.record_rate_limited()
+        if attempt == attempts - 1:
+            break
+        delay = _retry_delay(resp, attempt)
+        logging.warning(
+            f"Sleeper rate limited {path}; retrying in {delay:.2f}s")
+        # Hold back every worker, not just this call.
+        rate_limiter.penalize(delay)
+        time.sleep(delay)
+    return resp
+
+
+def _cached_response(path, body):
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = body
+    resp.headers['Content-Type'] = 'application/json'
+    resp.headers['X-Sleeper-Cache'] = 'hit'
+    resp.url = f"{SLEEPER_API_BASE}{path}"
+    resp.encoding = 'utf-8'
+    return resp
+
+
+def _revalidate(path):
+    try:
+        with priority(BULK):
+            resp = _fetch(path)
+        if resp.status_code == 200:
+            sleeper_cache.store(path, resp.content)
+    except requests.RequestException as e:
+        logging.warning(f"Background refresh of {path} failed: {e}")
+    finally:
+        sleeper_cache.release_refresh(path)
+
+
+def get(path, cache=True, **kwargs):
+    """GET a Sleeper API path (e.g. '/user/foo') and return the Response.
+
+    Plain GETs are served through the shared response cache; pass
+    ``cache=False`` (or any request kwargs) to go straight to Sleeper.
+    """
+    if not cache or kwargs or not sleeper_cache.enabled():
+        return _fetch(path, **kwargs)
+
+    body, state = sleeper_cache.lookup(path)
+    if body is not None:
+        if state == 'stale' and sleeper_cache.claim_refresh(path):
+            get_executor().submit(_revalidate, path)
+        return _cached_response(path, body)
+
+    resp = _fetch(path)
+    if resp.status_code == 200:
+        sleeper_cache.store(path, resp.content)
+    return resp
+
+
+def get_json(path, cache=True):
+    """GET a Sleeper API path and return the decoded JSON body.
+
+    Returns None (after logging a warning) on network errors, non-200
+    responses or undecodable bodies. ``cache`` is passed on to ``get``.
+    """
+    try:
+        resp = get(path, cache=cache)
+    except requests.RequestException as e:
+        logging.warning(f"Error fetching {path}: {e}")
+        return None
+
+    if resp.status_code != 200:
+        logging.warning(f"Error fetching {path}: {resp.status_code}")
+        return None
+
+    try:
+        return resp.json()
+    except ValueError:
+        logging.warning(f"Invalid JSON received from Sleeper for {path}")
+        return None
+
+
+def get_rosters(league_id):
+    """Rosters for one league, or None if they could not be fetched."""
+    return get_json(f"/league/{league_id}/rosters")
@@ -0,0 +1,91 @@
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+# Seconds SQLite's busy handler may wait for another process's write lock.
+# It sleeps in C, so under gevent it stalls every greenlet on the thread;
+# callers treat "database is locked" as a miss (or retry cooperatively).
+BUSY_TIMEOUT = 0.25
+# Opening a connection and creating schemas happen at startup, off the
+# request path, so they may wait longer.
+SETUP_TIMEOUT = 10
+
+
+def cooperative():
+    """True once gevent has patched threading, as in a gevent worker."""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def _thread_ident():
+    """The OS thread's id, even where gevent has patched ``_thread``."""
+    if cooperative():
+        return sys.modules['gevent.monkey'].get_original(
+            '_thread', 'get_ident')()
+    return threading.get_ident()
+
+
+def is_locked(error):
+    return isinstance(error, sqlite3.OperationalError) and (
+        'locked' in str(error) or 'busy' in str(error))
+
+
+class ThreadConnections:
+    """SQLite connections to one side-store file, one per OS thread.
+
+    ``threading.local`` is per greenlet under gevent workers, which would
+    open (and never close) a connection for every fan-out greenlet.
+    Greenlets sharing a thread take turns on its connection instead,
+    through a lock that is gevent-aware once threading is patched.
+    """
+
+    def __init__(self, path, timeout=BUSY_TIMEOUT):
+        # ``path`` is a callable, so init_app can still change the setting.
+        self._path = path
+        self._timeout = timeout
+        self._entries = {}
+        self._guard = threading.Lock()
+
+    def _entry(self):
+        ident = _thread_ident()
+        path = self._path()
+        entry = self._entries.get(ident)
+        if entry is not None and entry[0] == path:
+            return entry
+        with self._guard:
+            entry = self._entries.get(ident)
+            if entry is not None and entry[0] == path:
+                return entry
+            if entry is not None:
+                with entry[2]:
+                    entry[1].close()
+            conn = sqlite3.connect(path, timeout=SETUP_TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            _set_timeout(conn, self._timeout)
+            entry = self._entries[ident] = (path, conn, threading.RLock())
+            return entry
+
+    @contextmanager
+    def connect(self, timeout=None):
+        """This thread's connection, held exclusively for the block.
+
+        ``timeout`` overrides the busy timeout for just this block.
+        """
+        _, conn, lock = self._entry()
+        with lock:
+            if timeout is None:
+                yield conn
+                return
+            _set_timeout(conn, timeout)
+            try:
+                yield conn
+            finally:
+                _set_timeout(conn, self._timeout)
+
+
+def _set_timeout(conn, seconds):
+    conn.execute(f'PRAGMA busy_timeout = {int(seconds * 1000)}')
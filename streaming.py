@@ -0,0 +1,24 @@
+import json
+
+from flask import Response, stream_with_context
+
+
+def sse(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(events):
+    """Stream an iterable of ``sse()`` strings as a text/event-stream."""
+    return Response(stream_with_context(events),
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        # Stop nginx-style proxies from buffering the stream.
+                        'X-Accel-Buffering': 'no',
+                    })
+
+
+def error_stream(message):
+    """A stream carrying a single 'failed' event for the page to display."""
+    return event_stream(iter([sse('failed', {'message': message})]))
@@ -0,0 +1,120 @@
+import os
+import sys
+import unittest
+
+from werkzeug.datastructures import MultiDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import paging  # noqa: E402
+
+EXPOSURE = {
+    'exposure': lambda row: (-row['count'], row['name'], row['id']),
+    'name': lambda row: (row['name'], row['id']),
+}
+
+
+def _rows():
+    # Several ties on count and on name, so only the id breaks them.
+    return [{
+        'id': str(i),
+        'name': ('Smith', 'Jones', 'Brown')[i % 3],
+        'count': i % 4
+    } for i in range(23)]
+
+
+def _all_pages(rows, key, descending=False, limit=4):
+    served, cursor, pages = [], None, 0
+    while True:
+        page, cursor, total = paging.paginate(rows, key, descending, cursor,
+                                              limit)
+        served.extend(page)
+        pages += 1
+        if cursor is None:
+            return served, pages, total
+
+
+class PaginateTest(unittest.TestCase):
+
+    def test_pages_cover_every_row_once_despite_ties(self):
+        rows = _rows()
+        key = EXPOSURE['exposure']
+        served, pages, total = _all_pages(rows, key)
+
+        self.assertEqual(served, sorted(rows, key=key))
+        self.assertEqual(total, len(rows))
+        self.assertEqual(pages, 6)
+
+    def test_descending_round_trip(self):
+        rows = _rows()
+        key = EXPOSURE['name']
+        served, _, _ = _all_pages(rows, key, descending=True, limit=5)
+
+        self.assertEqual(served, sorted(rows, key=key, reverse=True))
+
+    def test_cursor_survives_rows_changing_between_requests(self):
+        rows = _rows()
+        key = EXPOSURE['name']
+        first, cursor, _ = paging.paginate(rows, key, limit=5)
+        # A row already served disappears and a new one sorts before the
+        # cursor; neither shifts the next page the way an offset would.
+        rows = [row for row in rows if row is not first[0]]
+        rows.append({'id': '99', 'name': 'Adams', 'count': 0})
+        second, _, _ = paging.paginate(rows, key, cursor=cursor, limit=5)
+
+        expected = sorted(_rows(), key=key)[5:10]
+        self.assertEqual(second, expected)
+
+    def test_last_page_has_no_cursor(self):
+        page, cursor, total = paging.paginate(_rows(), EXPOSURE['name'],
+                                              limit=23)
+        self.assertEqual(len(page), 23)
+        self.assertIsNone(cursor)
+        self.assertEqual(total, 23)
+
+    def test_garbage_cursor(self):
+        for cursor in ('not a cursor!', paging.encode_cursor(['x'])[:-2],
+                       'eyJhIjoxfQ'):  # the last is {"a":1}
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(paging.PagingError):
+                    paging.paginate(_rows(), EXPOSURE['name'], cursor=cursor)
+
+    def test_cursor_from_another_sort(self):
+        _, cursor, _ = paging.paginate(_rows(), EXPOSURE['exposure'],
+                                       limit=2)
+        with self.assertRaises(paging.PagingError):
+            paging.paginate(_rows(), EXPOSURE['name'], cursor=cursor)
+
+
+class ArgumentsTest(unittest.TestCase):
+
+    def test_parse_sort(self):
+        key, descending = paging.parse_sort(MultiDict({'sort': '-name'}),
+                                            EXPOSURE, 'exposure')
+        self.assertIs(key, EXPOSURE['name'])
+        self.assertTrue(descending)
+
+        key, descending = paging.parse_sort(MultiDict(), EXPOSURE, 'exposure')
+        self.assertIs(key, EXPOSURE['exposure'])
+        self.assertFalse(descending)
+
+        with self.assertRaises(paging.PagingError):
+            paging.parse_sort(MultiDict({'sort': 'team'}), EXPOSURE, 'name')
+
+    def test_parse_limit(self):
+        self.assertEqual(paging.parse_limit(MultiDict()), paging.DEFAULT_LIMIT)
+        self.assertEqual(paging.parse_limit(MultiDict({'limit': '0'})), 1)
+        self.assertEqual(paging.parse_limit(MultiDict({'limit': '9999'})),
+                         paging.MAX_LIMIT)
+        with self.assertRaises(paging.PagingError):
+            paging.parse_limit(MultiDict({'limit': 'ten'}))
+
+    def test_parse_list(self):
+        args = MultiDict([('position', 'QB, wr'), ('position', 'TE'),
+                          ('position', ',')])
+        self.assertEqual(paging.parse_list(args, 'position'),
+                         ['QB', 'wr', 'TE'])
+
+
+if __name__ == '__main__':
+    unittest.main()
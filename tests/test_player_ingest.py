@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import player_ingest  # noqa: E402
+
+# Escapes, multi-byte UTF-8, nesting, numbers and literals, with uneven
+# whitespace between tokens.
+DUMP = (
+    '{ "4046" : {"full_name": "Patrick \\"Pat\\" Mahomes", "position": "QB",'
+    ' "team": "KC", "age": 29, "injury": null, "active": true},\n'
+    '"7564": {"full_name": "José Ramírez \\\\ Jr.",'
+    ' "fantasy_positions": ["WR", "KR"], "height": 6.25e0},'
+    '"DEF": {"full_name": "Caf\\u00e9 ☃", "depth": {"a": [1, {"b": false}]}},'
+    '  "9999": "",  "10": -12 }').encode('utf-8')
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class IterJsonObjectTest(unittest.TestCase):
+
+    def test_every_chunk_size_parses_the_same(self):
+        expected = list(json.loads(DUMP).items())
+        # Size 1 splits every string, escape and multi-byte character.
+        for size in list(range(1, 40)) + [len(DUMP)]:
+            with self.subTest(size=size):
+                self.assertEqual(
+                    list(player_ingest.iter_json_object(_chunks(DUMP, size))),
+                    expected)
+
+    def test_empty_chunks_are_skipped(self):
+        chunks = [b'', b'{"a"', b'', b': 1', b'', b'}', b'']
+        self.assertEqual(list(player_ingest.iter_json_object(chunks)),
+                         [('a', 1)])
+
+    def test_empty_object(self):
+        self.assertEqual(list(player_ingest.iter_json_object([b' {  } '])),
+                         [])
+
+    def test_truncated_dump_raises(self):
+        for cut in range(len(DUMP)):
+            with self.subTest(cut=cut):
+                with self.assertRaises(ValueError):
+                    list(player_ingest.iter_json_object(_chunks(DUMP[:cut], 7)))
+
+    def test_not_an_object(self):
+        for data in (b'[1, 2]', b'"players"', b'{"a" 1}', b'{"a": 1 "b": 2}'):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    list(player_ingest.iter_json_object([data]))
+
+
+class PlayerRowTest(unittest.TestCase):
+
+    def test_name_falls_back_to_first_and_last(self):
+        self.assertEqual(
+            player_ingest.player_row('1', {'first_name': 'Tom',
+                                           'last_name': 'Brady'}),
+            ('Tom Brady', ''))
+        self.assertEqual(player_ingest.player_row('2', None),
+                         ('Unknown Player', ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fanout  # noqa: E402
+import roster_fingerprints  # noqa: E402
+import roster_sync  # noqa: E402
+from models import (db, LeagueRosterFingerprint, PlayerExposureCount,  # noqa: E402
+                    PlayerLeagueAssociation)
+
+USER = 'u1'
+
+
+def _sequential_map(fn, keys, concurrency=None):
+    for key in keys:
+        yield key, fn(*key)
+
+
+class RosterRefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = (
+            'sqlite:///' + os.path.join(directory.name, 'app.db'))
+        db.init_app(app)
+        context = app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        db.create_all()
+        self.addCleanup(db.engine.dispose)
+        self.addCleanup(db.session.remove)
+
+        # league_id -> the user's players, or None for a failed fetch.
+        self.rosters = {}
+        self.fetched = []
+        self._patch(mock.patch.object(fanout, 'iter_map', _sequential_map))
+        self._patch(
+            mock.patch.object(roster_sync, 'get_rosters', self._get_rosters))
+        # Every league is stale, so every refresh fetches them all.
+        self._patch(
+            mock.patch.dict(roster_fingerprints._settings,
+                            ROSTER_FINGERPRINT_TTL=-1))
+
+    def _patch(self, patcher):
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _get_rosters(self, league_id):
+        self.fetched.append(league_id)
+        players = self.rosters.get(league_id)
+        if players is None:
+            return None
+        return [{'owner_id': 'someone else', 'players': ['zz']},
+                {'owner_id': USER, 'players': players}]
+
+    def _refresh(self, league_ids):
+        self.fetched = []
+        refresh = roster_fingerprints.RosterRefresh(USER, league_ids)
+        yielded = dict(refresh)
+        players_by_league, counts = refresh.result
+        self.assertEqual(yielded, players_by_league)
+        return players_by_league, counts
+
+    def _stored(self):
+        pairs = {(row.league_id, row.player_id)
+                 for row in PlayerLeagueAssociation.query.filter_by(
+                     user_id=USER)}
+        counts = {row.player_id: row.league_count
+                  for row in PlayerExposureCount.query.filter_by(
+                      user_id=USER)}
+        prints = {row.league_id: row.fingerprint
+                  for row in LeagueRosterFingerprint.query.filter_by(
+                      user_id=USER)}
+        return pairs, counts, prints
+
+    def test_first_refresh_builds_associations_and_counts(self):
+        self.rosters = {'L1': ['a', 'b'], 'L2': ['b', 'c']}
+        players_by_league, counts = self._refresh(['L1', 'L2'])
+
+        self.assertEqual(players_by_league, {'L1': ['a', 'b'],
+                                             'L2': ['b', 'c']})
+        self.assertEqual(counts, {'a': 1, 'b': 2, 'c': 1})
+        pairs, stored_counts, prints = self._stored()
+        self.assertEqual(pairs, {('L1', 'a'), ('L1', 'b'), ('L2', 'b'),
+                                 ('L2', 'c')})
+        self.assertEqual(stored_counts, counts)
+        self.assertEqual(prints, {
+            'L1': roster_fingerprints.fingerprint(['b', 'a']),
+            'L2': roster_fingerprints.fingerprint(['c', 'b']),
+        })
+
+    def test_changed_roster_applies_only_the_diff(self):
+        self.rosters = {'L1': ['a', 'b'], 'L2': ['b', 'c']}
+        self._refresh(['L1', 'L2'])
+        self.rosters['L1'] = ['a', 'd']
+        players_by_league, counts = self._refresh(['L1', 'L2'])
+
+        self.assertEqual(players_by_league['L1'], ['a', 'd'])
+        self.assertEqual(counts, {'a': 1, 'b': 1, 'c': 1, 'd': 1})
+        pairs, stored_counts, prints = self._stored()
+        self.assertEqual(pairs, {('L1', 'a'), ('L1', 'd'), ('L2', 'b'),
+                                 ('L2', 'c')})
+        self.assertEqual(stored_counts, counts)
+        self.assertEqual(prints['L1'],
+                         roster_fingerprints.fingerprint(['a', 'd']))
+
+    def test_player_leaving_every_league_loses_its_count(self):
+        self.rosters = {'L1': ['a', 'b'], 'L2': ['b']}
+        self._refresh(['L1', 'L2'])
+        self.rosters = {'L1': ['a'], 'L2': ['c']}
+        _, counts = self._refresh(['L1', 'L2'])
+
+        self.assertEqual(counts, {'a': 1, 'c': 1})
+        self.assertEqual(self._stored()[1], counts)
+
+    def test_dropped_league_is_removed(self):
+        self.rosters = {'L1': ['a', 'b'], 'L2': ['b', 'c']}
+        self._refresh(['L1', 'L2'])
+        players_by_league, counts = self._refresh(['L1'])
+
+        self.assertEqual(players_by_league, {'L1': ['a', 'b']})
+        self.assertEqual(counts, {'a': 1, 'b': 1})
+        pairs, stored_counts, prints = self._stored()
+        self.assertEqual(pairs, {('L1', 'a'), ('L1', 'b')})
+        self.assertEqual(stored_counts, counts)
+        self.assertEqual(set(prints), {'L1'})
+
+    def test_failed_fetch_keeps_the_previous_roster(self):
+        self.rosters = {'L1': ['a', 'b'], 'L2': ['b', 'c']}
+        self._refresh(['L1', 'L2'])
+        before = self._stored()
+        self.rosters['L2'] = None
+        players_by_league, counts = self._refresh(['L1', 'L2'])
+
+        self.assertEqual(players_by_league['L2'], ['b', 'c'])
+        self.assertEqual(counts, {'a': 1, 'b': 2, 'c': 1})
+        self.assertEqual(self._stored(), before)
+
+    def test_fresh_fingerprints_are_not_fetched(self):
+        self.rosters = {'L1': ['a'], 'L2': ['b']}
+        self._refresh(['L1', 'L2'])
+        with mock.patch.dict(roster_fingerprints._settings,
+                             ROSTER_FINGERPRINT_TTL=3600):
+            players_by_league, _ = self._refresh(['L1', 'L2', 'L3'])
+
+        self.assertEqual(self.fetched, ['L3'])
+        self.assertEqual(players_by_league, {'L1': ['a'], 'L2': ['b'],
+                                             'L3': []})
+
+    def test_roster_version_follows_fingerprints(self):
+        self.rosters = {'L1': ['a'], 'L2': ['b']}
+        self._refresh(['L1', 'L2'])
+        version = roster_fingerprints.roster_version(USER, ['L1', 'L2'],
+                                                     require_fresh=False)
+        self.rosters['L2'] = ['c']
+        self._refresh(['L1', 'L2'])
+
+        self.assertNotEqual(
+            roster_fingerprints.roster_version(USER, ['L1', 'L2'],
+                                               require_fresh=False), version)
+        self.assertIsNone(
+            roster_fingerprints.roster_version(USER, ['L1', 'L9'],
+                                               require_fresh=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import copy
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import roster_sync  # noqa: E402
+
+
+def _rosters():
+    return [
+        {'roster_id': 1, 'owner_id': 'u1', 'players': ['a', 'b', 'c']},
+        {'roster_id': 2, 'owner_id': 'u2', 'players': ['d', 'e']},
+        {'roster_id': 3, 'owner_id': 'u3', 'players': []},
+    ]
+
+
+def _players(rosters):
+    return {roster['roster_id']: roster['players'] for roster in rosters}
+
+
+def _txn(updated, adds=None, drops=None, status='complete', kind='waiver'):
+    return {
+        'type': kind,
+        'status': status,
+        'status_updated': updated,
+        'adds': adds,
+        'drops': drops,
+    }
+
+
+class ApplyTransactionTest(unittest.TestCase):
+
+    def test_waiver_claim(self):
+        rosters = _rosters()
+        roster_sync.apply_transaction(rosters, _txn(1, {'x': 1}, {'b': 1}))
+        self.assertEqual(_players(rosters)[1], ['a', 'c', 'x'])
+
+    def test_trade_moves_players_across_rosters(self):
+        rosters = _rosters()
+        roster_sync.apply_transaction(
+            rosters,
+            _txn(1, {'a': 2, 'd': 1, 'e': 3}, {'a': 1, 'd': 2, 'e': 2},
+                 kind='trade'))
+        self.assertEqual(_players(rosters), {
+            1: ['b', 'c', 'd'],
+            2: ['a'],
+            3: ['e'],
+        })
+
+    def test_free_agent_add_to_empty_roster(self):
+        rosters = _rosters()
+        rosters[2]['players'] = None
+        roster_sync.apply_transaction(rosters, _txn(1, {'z': 3}))
+        self.assertEqual(_players(rosters)[3], ['z'])
+
+    def test_reapplying_is_harmless(self):
+        rosters = _rosters()
+        trade = _txn(1, {'a': 2, 'd': 1}, {'a': 1, 'd': 2}, kind='trade')
+        roster_sync.apply_transaction(rosters, trade)
+        once = copy.deepcopy(rosters)
+        roster_sync.apply_transaction(rosters, trade)
+        self.assertEqual(rosters, once)
+
+    def test_unknown_roster_is_a_mismatch(self):
+        with self.assertRaises(roster_sync.SnapshotMismatch):
+            roster_sync.apply_transaction(_rosters(), _txn(1, {'x': 9}))
+
+
+class AdvanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transactions = {}
+        self.save = self._patch(mock.patch.object(roster_sync, '_save'))
+        self._patch(
+            mock.patch.object(roster_sync, '_current_week',
+                              return_value=('2026', 3)))
+        self._patch(
+            mock.patch.object(
+                roster_sync, '_fetch_transactions',
+                side_effect=lambda league_id, week: self.transactions.get(
+                    week, [])))
+        self._patch(mock.patch.dict(roster_sync._stats))
+
+    def _patch(self, patcher):
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _snapshot(self):
+        return {
+            'rosters': _rosters(),
+            'season': '2026',
+            'week': 2,
+            'cursor': 1000,
+            'full_at': 0,
+            'synced_at': 0,
+        }
+
+    def test_replays_completed_transactions_in_order(self):
+        self.transactions = {
+            2: [
+                # Already reflected in the snapshot (before its cursor).
+                _txn(900, {'old': 1}),
+                _txn(1200, {'f': 1}, {'a': 1}),
+                # Failed and pending moves never happened.
+                _txn(1300, {'g': 2}, {'d': 2}, status='failed'),
+                _txn(1400, {'h': 3}, status='pending'),
+            ],
+            3: [
+                # Newest first, as Sleeper lists them: the drop of 'f'
+                # must still come after the claim that added it.
+                _txn(2500, drops={'f': 2}),
+                _txn(2000, {'f': 2, 'e': 1}, {'f': 1, 'e': 2}, kind='trade'),
+            ],
+        }
+        snapshot = roster_sync._advance('L1', self._snapshot(), now=50)
+
+        self.assertEqual(_players(snapshot['rosters']), {
+            1: ['b', 'c', 'e'],
+            2: ['d'],
+            3: [],
+        })
+        self.assertEqual(snapshot['cursor'], 2500)
+        self.assertEqual(snapshot['week'], 3)
+        self.assertEqual(snapshot['synced_at'], 50)
+        self.save.assert_called_once_with('L1', snapshot)
+        self.assertEqual(roster_sync._stats['synced'], 1)
+
+    def test_no_new_transactions_only_bumps_sync_time(self):
+        self.transactions = {2: [_txn(900, {'old': 1})]}
+        snapshot = roster_sync._advance('L1', self._snapshot(), now=50)
+
+        self.assertEqual(snapshot['rosters'], _rosters())
+        self.assertEqual(snapshot['cursor'], 1000)
+        self.assertEqual(snapshot['synced_at'], 50)
+
+    def test_season_rollover_is_a_mismatch(self):
+        snapshot = self._snapshot()
+        snapshot['season'] = '2025'
+        with self.assertRaises(roster_sync.SnapshotMismatch):
+            roster_sync._advance('L1', snapshot, now=50)
+        self.save.assert_not_called()
+
+    def test_inconsistent_transaction_is_a_mismatch(self):
+        self.transactions = {3: [_txn(2000, {'x': 7})]}
+        with self.assertRaises(roster_sync.SnapshotMismatch):
+            roster_sync._advance('L1', self._snapshot(), now=50)
+        self.save.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limiter  # noqa: E402
+import sleeper_client  # noqa: E402
+
+
+class _FakeSleeper(BaseHTTPRequestHandler):
+    """Answers every GET with ``status`` (and Retry-After) and counts hits."""
+    status = 429
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        self.send_response(self.status)
+        self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        _FakeSleeper.hits = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeSleeper)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        base = f'http://127.0.0.1:{self.server.server_port}'
+        settings = dict(sleeper_client._settings,
+                        SLEEPER_MAX_RETRIES=1,
+                        SLEEPER_BACKOFF_FACTOR=0)
+        self._patch(mock.patch.object(sleeper_client, 'SLEEPER_API_BASE', base))
+        self._patch(mock.patch.dict(sleeper_client._settings, settings))
+        self._patch(mock.patch.object(sleeper_client, '_session', None))
+        self.penalize = self._patch(mock.patch.object(rate_limiter, 'penalize'))
+        self.acquire = self._patch(
+            mock.patch.object(rate_limiter, 'acquire', return_value=0))
+
+    def _patch(self, patcher):
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_429_with_retry_after_only_retried_through_limiter(self):
+        _FakeSleeper.status = 429
+        resp = sleeper_client._fetch('/user/someone')
+
+        self.assertEqual(resp.status_code, 429)
+        # One request per _fetch attempt, each after taking a token.
+        self.assertEqual(_FakeSleeper.hits, 2)
+        self.assertEqual(self.acquire.call_count, 2)
+        self.assertEqual(self.penalize.call_count, 1)
+
+    def test_server_errors_still_retried_by_urllib3(self):
+        _FakeSleeper.status = 503
+        resp = sleeper_client._fetch('/user/someone')
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(_FakeSleeper.hits, 2)
+        self.assertEqual(self.acquire.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()